@@ -0,0 +1,213 @@
+# assets.py
+"""
+Arquivos estáticos com hash no nome e versões pré-comprimidas.
+
+`construir_assets()` copia cada arquivo de static/ para static/dist/ com o hash do conteúdo
+no nome (css/login.css -> css/login.3f2a1b9c0d.css), grava ao lado as versões .gz e .br
+(brotli só se o pacote `brotli` estiver instalado) e o manifest.json com o mapeamento.
+Como o nome muda junto com o conteúdo, esses arquivos podem ficar em cache para sempre.
+
+Nos templates, `{{ asset('css/login.css') }}` resolve o nome com hash; sem o manifesto
+(build não rodado) cai no caminho original, servido com revalidação por ETag.
+"""
+import os
+import json
+import gzip
+import stat
+import hashlib
+import mimetypes
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from fastapi.templating import Jinja2Templates
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, só gzip
+    brotli = None
+
+PASTA_STATIC = "static"
+PASTA_DIST = "dist"
+URL_STATIC = "/static"
+MANIFESTO = "manifest.json"
+# tipos de texto; imagens e fontes já vêm comprimidas
+COMPRIMIVEIS = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+# (Content-Encoding, sufixo do arquivo), na ordem de preferência
+CODIFICACOES = (("br", ".br"), ("gzip", ".gz"))
+# respostas que o GZip dinâmico deixa passar: SSE e formatos que já são comprimidos (o .xlsx é um zip)
+NAO_COMPRIMIR = (
+    "text/event-stream",
+    "application/vnd.openxmlformats-officedocument.",
+    "application/zip",
+    "application/gzip",
+    "image/png",
+    "image/jpeg",
+    "image/gif",
+    "image/webp",
+    "font/woff",
+)
+
+
+def aceita_codificacao(accept_encoding: str, codificacao: str) -> bool:
+    """Se o Accept-Encoding aceita a codificação: "gzip;q=0" recusa, "*" vale para as não listadas."""
+    qualidades = {}
+    for item in accept_encoding.split(","):
+        nome, _, parametros = item.partition(";")
+        nome = nome.strip().lower()
+        if not nome:
+            continue
+        qualidade = 1.0
+        for parametro in parametros.split(";"):
+            chave, _, valor = parametro.partition("=")
+            if chave.strip().lower() == "q":
+                try:
+                    qualidade = float(valor)
+                except ValueError:
+                    qualidade = 0.0
+        qualidades[nome] = qualidade
+    return qualidades.get(codificacao, qualidades.get("*", 0.0)) > 0
+
+
+def _com_hash(caminho: str, conteudo: bytes) -> str:
+    raiz, extensao = os.path.splitext(caminho)
+    return f"{raiz}.{hashlib.sha256(conteudo).hexdigest()[:10]}{extensao}"
+
+
+def _gravar(caminho: str, conteudo: bytes):
+    # grava ao lado e renomeia: quem estiver servindo o arquivo nunca vê um pedaço dele
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(conteudo)
+    os.replace(temporario, caminho)
+
+
+def construir_assets(origem: str = PASTA_STATIC) -> dict:
+    """
+    Gera static/dist/ e retorna o manifesto {caminho original: caminho com hash}.
+    Não apaga nada: o nome depende só do conteúdo, então rodar de novo (ou dois servidores
+    subindo juntos do mesmo diretório) regrava os mesmos arquivos, e páginas já abertas
+    continuam achando a versão anterior.
+    """
+    destino = os.path.join(origem, PASTA_DIST)
+    manifesto = {}
+    for pasta, subpastas, arquivos in os.walk(origem):
+        if os.path.abspath(pasta) == os.path.abspath(origem) and PASTA_DIST in subpastas:
+            subpastas.remove(PASTA_DIST)
+        for nome in sorted(arquivos):
+            relativo = os.path.relpath(os.path.join(pasta, nome), origem).replace(os.sep, "/")
+            with open(os.path.join(origem, relativo), "rb") as arquivo:
+                conteudo = arquivo.read()
+            final = _com_hash(relativo, conteudo)
+            caminho_final = os.path.join(destino, final)
+            _gravar(caminho_final, conteudo)
+            if relativo.endswith(COMPRIMIVEIS):
+                # mtime=0: o mesmo conteúdo gera sempre o mesmo .gz
+                variantes = {".gz": gzip.compress(conteudo, compresslevel=9, mtime=0)}
+                if brotli is not None:
+                    variantes[".br"] = brotli.compress(conteudo, quality=11)
+                for sufixo, comprimido in variantes.items():
+                    if len(comprimido) < len(conteudo):
+                        _gravar(caminho_final + sufixo, comprimido)
+            manifesto[relativo] = final
+    _gravar(os.path.join(destino, MANIFESTO), json.dumps(manifesto, indent=2, sort_keys=True).encode())
+    _manifesto_carregado.clear()
+    return manifesto
+
+
+_manifesto_carregado: dict = {}
+
+
+def _manifesto() -> dict:
+    # lido uma vez por processo; o build roda antes de os workers subirem
+    if not _manifesto_carregado:
+        try:
+            with open(os.path.join(PASTA_STATIC, PASTA_DIST, MANIFESTO), encoding="utf-8") as arquivo:
+                _manifesto_carregado.update(json.load(arquivo))
+        except FileNotFoundError:
+            _manifesto_carregado[None] = None  # marca "já procurei", para não abrir o arquivo a cada página
+    return _manifesto_carregado
+
+
+def versao_assets() -> str:
+    """Hash do manifesto (vazio sem build): entra no ETag das páginas que apontam para os assets."""
+    manifesto = _manifesto()
+    if None in manifesto:
+        return ""
+    return hashlib.sha1(json.dumps(manifesto, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def asset(caminho: str) -> str:
+    final = _manifesto().get(caminho)
+    if final is None:
+        return f"{URL_STATIC}/{caminho}"
+    return f"{URL_STATIC}/{PASTA_DIST}/{final}"
+
+
+def configurar_templates(templates):
+    templates.env.globals["asset"] = asset
+    return templates
+
+
+# um ambiente Jinja para a aplicação toda: páginas e trechos em cache (cédula) usam os mesmos globais
+templates = configurar_templates(Jinja2Templates(directory="templates"))
+
+
+class StaticPrecomprimido(StaticFiles):
+    """
+    StaticFiles que, em static/dist/, entrega a variante .br/.gz aceita pelo cliente
+    com Cache-Control immutable. O resto de static/ sai com no-cache (revalida pelo ETag).
+    """
+
+    async def get_response(self, path: str, scope):
+        if not path.startswith(PASTA_DIST + "/"):
+            resposta = await super().get_response(path, scope)
+            resposta.headers.setdefault("Cache-Control", "no-cache")
+            return resposta
+
+        aceitas = Headers(scope=scope).get("accept-encoding", "")
+        resposta = None
+        for codificacao, sufixo in CODIFICACOES:
+            if not aceita_codificacao(aceitas, codificacao):
+                continue
+            caminho, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + sufixo)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                resposta = self.file_response(caminho, stat_result, scope)
+                resposta.headers["Content-Encoding"] = codificacao
+                # o tipo é o do arquivo original, não application/gzip
+                tipo, _ = mimetypes.guess_type(path)
+                if tipo and resposta.status_code == 200:
+                    resposta.headers["Content-Type"] = tipo + ("; charset=utf-8" if tipo.startswith("text/") else "")
+                break
+        if resposta is None:
+            resposta = await super().get_response(path, scope)
+        resposta.headers["Cache-Control"] = CACHE_IMUTAVEL
+        resposta.headers["Vary"] = "Accept-Encoding"
+        return resposta
+
+
+class _GZipSeletivo(GZipResponder):
+    async def send_with_compression(self, message):
+        await super().send_with_compression(message)
+        if message["type"] == "http.response.start":
+            tipo = Headers(raw=message["headers"]).get("content-type", "")
+            self.content_type_is_excluded = tipo.startswith(NAO_COMPRIMIR)
+
+
+class CompressaoMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware que lê o Accept-Encoding direito (gzip;q=0 não recebe gzip) e não
+    recomprime o que já vem comprimido (NAO_COMPRIMIR: xlsx, imagens, ...).
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if aceita_codificacao(Headers(scope=scope).get("accept-encoding", ""), "gzip"):
+            responder = _GZipSeletivo(self.app, self.minimum_size, compresslevel=self.compresslevel)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
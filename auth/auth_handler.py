@@ -1,5 +1,7 @@
 # auth_handler.py
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any
 
@@ -13,7 +15,14 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 # minutos para expirar o token
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12")) # custo do bcrypt (hashes antigos continuam válidos)
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2")) # threads dedicadas ao bcrypt
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt libera o GIL, então threads bastam para tirá-lo do event loop;
+# o tamanho do pool limita quanta CPU os logins podem tomar dos votos
+_pool_senhas = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
 
 
 # ---------- Password utils ----------
@@ -25,6 +34,16 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_senhas, verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_senhas, get_password_hash, password)
+
+
 # ---------- JWT utils ----------
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
@@ -39,5 +58,7 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
 
 
 def decode_access_token(token: str) -> dict:
-    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    # sem "exp" o token nunca venceria (e não teria prazo no cache de tokens): recusa com
+    # MissingRequiredClaimError, que é um PyJWTError como os demais
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp"]})
     return payload
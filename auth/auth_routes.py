@@ -9,16 +9,18 @@ from starlette.status import HTTP_303_SEE_OTHER, HTTP_400_BAD_REQUEST
 from sqlalchemy.future import select
 from dotenv import load_dotenv
 
-from fastapi.templating import Jinja2Templates
 from datetime import timedelta
 
-from .auth_handler import create_access_token, get_password_hash, verify_password
-from .dependencies import get_current_user
+from .auth_handler import create_access_token, get_password_hash_async, verify_password_async
+from .dependencies import get_current_user, get_current_active_user
+from .cache import invalidar_usuario, estatisticas_cache
 from database import get_db
 from models import User
 from schemas import UserCreate, UserResponse, TokenData
+from metricas import auth_etapa_segundos
+from assets import templates
+from limitacao import limite_login_ip, limite_login_usuario, limite_registro_ip, ip_cliente
 
-templates = Jinja2Templates(directory="templates")
 router = APIRouter()
 
 async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
@@ -26,7 +28,9 @@ async def authenticate_user(db: AsyncSession, username: str, password: str) -> O
     user = result.scalars().first()
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    with auth_etapa_segundos.medir("bcrypt"):
+        senha_ok = await verify_password_async(password, user.hashed_password)
+    if not senha_ok:
         return None
     return user
 
@@ -59,11 +63,18 @@ async def login_action(
     remember_me: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_db),
 ):
+    # antes do bcrypt: cada tentativa custa dezenas de ms de CPU. O balde do usuário é por
+    # (IP, usuário) e só a senha errada gasta ficha, lá embaixo: tentativas de outra máquina
+    # não bloqueiam o mesário
+    ip = ip_cliente(request)
+    limite_login_ip.exigir(ip)
+    limite_login_usuario.exigir((ip, username), cobrar=False)
     if int(admin_password) != int(ADMIN_PASSWORD):
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="tá tentando hackear meu site é?")
     
     user = await authenticate_user(db, username, password)
     if not user:
+        limite_login_usuario.consumir((ip, username))
         return templates.TemplateResponse(
             "login.html",
             {"request": request, "error_message": "Usuário ou senha inválidos."}
@@ -102,7 +113,8 @@ async def logout_action():
 
 
 @router.post("/register", response_class=JSONResponse)
-async def register_api(user: UserCreate, db: AsyncSession = Depends(get_db)):
+async def register_api(request: Request, user: UserCreate, db: AsyncSession = Depends(get_db)):
+    limite_registro_ip.exigir(ip_cliente(request))
     if user.admin_password != int(ADMIN_PASSWORD):
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="tá tentando hackear meu site é?")
 
@@ -117,7 +129,7 @@ async def register_api(user: UserCreate, db: AsyncSession = Depends(get_db)):
     if len(user.password) < 6:
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="A senha deve ter pelo menos 6 caracteres.")
 
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     db_user = User(username=user.username, hashed_password=hashed_password)
 
     try:
@@ -127,6 +139,14 @@ async def register_api(user: UserCreate, db: AsyncSession = Depends(get_db)):
     except IntegrityError:
         await db.rollback()
         raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Erro ao criar usuário.")
+    invalidar_usuario(db_user.username)
 
     access_token = create_access_token(data={"sub": db_user.username})
     return {"message":"registro feito com sucesso"}
+
+
+@router.get("/cache", response_class=JSONResponse)
+async def cache_stats(current_user: Optional[User] = Depends(get_current_active_user)):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    return estatisticas_cache()
@@ -0,0 +1,88 @@
+# cache.py
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from sqlalchemy import event, inspect
+
+from models import User
+
+USER_CACHE_MAX = int(os.getenv("USER_CACHE_MAX", "256"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # segundos
+TOKEN_CACHE_MAX = int(os.getenv("TOKEN_CACHE_MAX", "1024"))
+
+
+class CacheTTL:
+    """LRU limitado em que cada entrada expira após `ttl` segundos (ou em `expira_em`)."""
+
+    def __init__(self, maximo: int, ttl: Optional[float] = None):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._itens: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def obter(self, chave):
+        item = self._itens.get(chave)
+        if item is None:
+            self.misses += 1
+            return None
+        expira_em, valor = item
+        if expira_em <= time.time():
+            del self._itens[chave]
+            self.misses += 1
+            return None
+        self._itens.move_to_end(chave)
+        self.hits += 1
+        return valor
+
+    def guardar(self, chave, valor, expira_em: Optional[float] = None):
+        if expira_em is None:
+            expira_em = time.time() + self.ttl
+        self._itens[chave] = (expira_em, valor)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.maximo:
+            self._itens.popitem(last=False)
+
+    def invalidar(self, chave):
+        self._itens.pop(chave, None)
+
+    def limpar(self):
+        self._itens.clear()
+
+    def estatisticas(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "itens": len(self._itens),
+            "maximo": self.maximo,
+            "hits": self.hits,
+            "misses": self.misses,
+            "taxa_acerto": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# username -> User (desanexado da sessão; só leitura)
+cache_usuarios = CacheTTL(USER_CACHE_MAX, USER_CACHE_TTL)
+# token JWT -> payload já verificado, válido até o "exp" do próprio token
+cache_tokens = CacheTTL(TOKEN_CACHE_MAX)
+
+
+def invalidar_usuario(username: str):
+    cache_usuarios.invalidar(username)
+
+
+# Qualquer alteração/remoção de User pelo ORM (ex.: desativar mesário) tira o usuário do cache
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _ao_alterar_usuario(mapper, connection, target):
+    invalidar_usuario(target.username)
+    for username_antigo in inspect(target).attrs.username.history.deleted or ():
+        invalidar_usuario(username_antigo)
+
+
+def estatisticas_cache() -> dict:
+    return {
+        "usuarios": cache_usuarios.estatisticas(),
+        "tokens": cache_tokens.estatisticas(),
+    }
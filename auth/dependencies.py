@@ -8,6 +8,8 @@ from database import get_db
 from models import User
 from schemas import TokenData
 from .auth_handler import SECRET_KEY  # apenas para referência se necessário
+from .cache import cache_usuarios, cache_tokens
+from metricas import auth_etapa_segundos
 import jwt
 
 async def _get_token_from_request(request: Request) -> Optional[str]:
@@ -38,7 +40,12 @@ async def get_current_user(
         return None
 
     try:
-        payload = decode_access_token(token)
+        # mesmo token repetido (terminal em uso) não refaz a verificação HMAC até o "exp"
+        payload = cache_tokens.obter(token)
+        if payload is None:
+            with auth_etapa_segundos.medir("jwt_decode"):
+                payload = decode_access_token(token)
+            cache_tokens.guardar(token, payload, expira_em=payload.get("exp"))
         username: str = payload.get("sub")
         if username is None:
             return None
@@ -48,11 +55,21 @@ async def get_current_user(
     except jwt.PyJWTError:
         return None
 
+    user = cache_usuarios.obter(token_data.username)
+    if user is not None:
+        return user
+
     # Busca usuário no banco
-    result = await db.execute(
-        select(User).filter(User.username == token_data.username)
-    )
-    user = result.scalars().first()
+    with auth_etapa_segundos.medir("busca_usuario"):
+        result = await db.execute(
+            select(User).filter(User.username == token_data.username)
+        )
+        user = result.scalars().first()
+    if user:
+        # fora da sessão da requisição: um rollback dela expiraria o objeto que o cache
+        # entrega às próximas (DetachedInstanceError em is_active)
+        db.expunge(user)
+        cache_usuarios.guardar(user.username, user)
     return user
 
 async def get_current_active_user(
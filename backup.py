@@ -0,0 +1,200 @@
+# backup.py
+"""
+Cópias do banco SQLite com a eleição em andamento, pela API de backup online do SQLite.
+
+A cópia roda numa thread. Em WAL (perfis "eleicao" e "seguro") quem lê não bloqueia quem
+grava, então ela sai de uma vez, de um retrato consistente do banco, sem travar os votos.
+No journal tradicional (perfil "padrao") cada passo segura um lock de leitura que impede
+commits: a cópia anda em passos de BACKUP_PAGINAS páginas, com BACKUP_PAUSA segundos entre
+eles, e os votos commitam nos intervalos. Se alguém grava entre dois passos o SQLite recomeça
+a cópia; quando isso se repete, os passos ficam maiores até ela terminar.
+"""
+import os
+import time
+import sqlite3
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.engine import make_url
+
+from database import DATABASE_URL
+from models import Chapa, Voto, ContagemChapa
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+BACKUP_INTERVALO = float(os.getenv("BACKUP_INTERVALO", "0"))  # minutos entre cópias automáticas; 0 desliga
+BACKUP_MANTER = int(os.getenv("BACKUP_MANTER", "24"))  # cópias automáticas guardadas
+BACKUP_PAGINAS = int(os.getenv("BACKUP_PAGINAS", "256"))  # páginas por passo (4 KB cada)
+BACKUP_PAUSA = float(os.getenv("BACKUP_PAUSA", "0.005"))  # segundos entre passos
+_TENTATIVAS = 4  # a cada cópia recomeçada, passos 8x maiores; a última é de uma vez
+
+
+class BackupIndisponivel(Exception):
+    pass
+
+
+class _CopiaRecomecou(Exception):
+    pass
+
+
+def arquivo_banco(url: str = DATABASE_URL) -> str:
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        raise BackupIndisponivel("cópia online só para SQLite em arquivo; no PostgreSQL use pg_dump")
+    return url.database
+
+
+def _copiar(origem: str, destino: str, paginas: int, pausa: float) -> dict:
+    """Copia origem -> destino; síncrono (roda numa thread)."""
+    passos = reinicios = 0
+    inicio = time.perf_counter()
+    fonte = sqlite3.connect(origem, timeout=30)
+    try:
+        if fonte.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            paginas = -1
+        for tentativa in range(_TENTATIVAS):
+            ultima = tentativa == _TENTATIVAS - 1
+            restantes_antes = None
+
+            def progresso(status, restantes, total):
+                nonlocal passos, restantes_antes
+                passos += 1
+                if restantes_antes is not None and restantes > restantes_antes and not ultima:
+                    raise _CopiaRecomecou()
+                restantes_antes = restantes
+
+            alvo = sqlite3.connect(destino)
+            try:
+                fonte.backup(alvo, pages=-1 if ultima else paginas, progress=progresso, sleep=pausa)
+                break
+            except _CopiaRecomecou:
+                reinicios += 1
+                paginas *= 8
+            finally:
+                alvo.close()
+    finally:
+        fonte.close()
+    return {"passos": passos, "reinicios": reinicios, "segundos": round(time.perf_counter() - inicio, 3)}
+
+
+def verificar_backup(caminho: str) -> dict:
+    """
+    Abre a cópia só para leitura, roda o integrity_check e confere a contagem por chapa
+    (ContagemChapa) com os votos da tabela Voto.
+    """
+    conexao = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+    try:
+        integridade = conexao.execute("PRAGMA integrity_check").fetchone()[0]
+        votos = dict(conexao.execute(
+            f'SELECT chapa_id, COUNT(*) FROM "{Voto.__tablename__}" GROUP BY chapa_id'
+        ).fetchall())
+        chapas = conexao.execute(
+            f'SELECT c.chapa_id, c.chapa_nome, COALESCE(t.total_votos, 0) FROM "{Chapa.__tablename__}" c '
+            f'LEFT JOIN "{ContagemChapa.__tablename__}" t ON t.chapa_id = c.chapa_id ORDER BY c.chapa_id'
+        ).fetchall()
+    finally:
+        conexao.close()
+
+    problemas = [] if integridade == "ok" else [f"integrity_check: {integridade}"]
+    contagens = []
+    for chapa_id, chapa_nome, contagem in chapas:
+        contados = votos.pop(chapa_id, 0)
+        contagens.append({"chapa_id": chapa_id, "chapa_nome": chapa_nome, "contagem": contagem, "votos": contados})
+        if contados != contagem:
+            problemas.append(f"chapa {chapa_id}: contagem {contagem}, votos {contados}")
+    for chapa_id, contados in votos.items():
+        problemas.append(f"{contados} votos na chapa {chapa_id}, que não existe")
+    return {"arquivo": caminho, "contagens": contagens, "total": sum(c["votos"] for c in contagens), "problemas": problemas}
+
+
+def restaurar_backup(caminho: str, destino: Optional[str] = None) -> dict:
+    """
+    Verifica a cópia e a grava por cima do banco (também pela API de backup, que lida com o WAL).
+    Usar com o servidor parado.
+    """
+    verificacao = verificar_backup(caminho)
+    if verificacao["problemas"]:
+        raise BackupIndisponivel("cópia inconsistente: " + "; ".join(verificacao["problemas"]))
+    _copiar(caminho, destino or arquivo_banco(), -1, 0)
+    return verificacao
+
+
+def aplicar_retencao(pasta: str = BACKUP_DIR, manter: int = BACKUP_MANTER) -> list[str]:
+    """Apaga as cópias automáticas mais antigas além de `manter`; as manuais ficam."""
+    automaticas = sorted(nome for nome in os.listdir(pasta) if nome.startswith("auto-") and nome.endswith(".db"))
+    removidas = automaticas[:max(len(automaticas) - manter, 0)]
+    for nome in removidas:
+        os.remove(os.path.join(pasta, nome))
+    return removidas
+
+
+_em_andamento = asyncio.Lock()
+
+
+async def fazer_backup(
+    prefixo: str = "manual", pasta: str = BACKUP_DIR, agora: Optional[datetime] = None, origem: Optional[str] = None,
+) -> dict:
+    """Cópia online para <pasta>/<prefixo>-<data>.db; o arquivo só aparece com o nome final quando está completo."""
+    origem = origem or arquivo_banco()
+    os.makedirs(pasta, exist_ok=True)
+    nome = f"{prefixo}-{(agora or datetime.now()).strftime('%Y%m%dT%H%M%S')}.db"
+    destino = os.path.join(pasta, nome)
+    temporario = destino + ".parcial"
+    if os.path.exists(destino):
+        raise BackupIndisponivel(f"a cópia {nome} já existe")
+    try:
+        # O_EXCL: com vários workers, só um faz a cópia agendada para o mesmo instante
+        os.close(os.open(temporario, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        raise BackupIndisponivel(f"já há uma cópia em andamento para {nome}")
+    async with _em_andamento:
+        try:
+            resultado = await asyncio.to_thread(_copiar, origem, temporario, BACKUP_PAGINAS, BACKUP_PAUSA)
+            os.replace(temporario, destino)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+    return {"arquivo": destino, "bytes": os.path.getsize(destino), **resultado}
+
+
+class AgendadorBackup:
+    """Faz uma cópia a cada BACKUP_INTERVALO minutos e aplica a retenção."""
+
+    def __init__(self, intervalo_minutos: float = BACKUP_INTERVALO, pasta: str = BACKUP_DIR, manter: int = BACKUP_MANTER):
+        self.intervalo = intervalo_minutos * 60
+        self.pasta = pasta
+        self.manter = manter
+        self.ultimo: Optional[dict] = None
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def iniciar(self):
+        if self.intervalo > 0:
+            self._tarefa = asyncio.create_task(self._agendar())
+
+    async def parar(self):
+        if self._tarefa is None:
+            return
+        self._tarefa.cancel()
+        try:
+            await self._tarefa
+        except asyncio.CancelledError:
+            pass
+        self._tarefa = None
+
+    async def _agendar(self):
+        while True:
+            # alinhado ao relógio: todos os workers miram o mesmo instante e o O_EXCL escolhe um
+            espera = self.intervalo - time.time() % self.intervalo
+            await asyncio.sleep(espera)
+            instante = datetime.fromtimestamp(round(time.time() / self.intervalo) * self.intervalo)
+            try:
+                self.ultimo = await fazer_backup("auto", self.pasta, instante)
+                aplicar_retencao(self.pasta, self.manter)
+            except BackupIndisponivel:
+                continue
+            except (OSError, sqlite3.Error) as e:
+                print(f"cópia automática do banco falhou: {e}")
+
+
+agendador_backup = AgendadorBackup()
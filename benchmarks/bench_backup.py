@@ -0,0 +1,99 @@
+"""
+Latência dos votos enquanto uma cópia online do banco (backup.py) está em andamento.
+O banco começa com --votos-iniciais votos; os terminais votam sem parar e a cópia é
+disparada no meio. Compara p50/p99/máximo do voto sem e durante a cópia e confere a cópia.
+
+Uso:
+    python benchmarks/bench_backup.py --votos-iniciais 300000 --terminais 8
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import insert, update
+
+from comum import preparar, percentil, USUARIO
+from models import Voto, ContagemChapa
+from schemas import VotoCreate
+from votacao.votacao_handler import votar_chapa
+import backup
+
+
+async def executar(args):
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = f"{pasta}/bench.db"
+        engine, Session = await preparar(f"sqlite+aiosqlite:///{arquivo}", args.chapas)
+        async with Session() as db:
+            agora = datetime.now()
+            for inicio in range(0, args.votos_iniciais, 50000):
+                await db.execute(insert(Voto.__table__), [
+                    {"eleicao_id": 1, "matricula": f"i{i}", "horario": agora, "chapa_id": 1 + i % args.chapas}
+                    for i in range(inicio, min(inicio + 50000, args.votos_iniciais))
+                ])
+            for chapa in range(args.chapas):
+                total = len(range(chapa, args.votos_iniciais, args.chapas))
+                await db.execute(update(ContagemChapa).where(ContagemChapa.chapa_id == chapa + 1).values(total_votos=total))
+            await db.commit()
+        print(f"banco inicial: {os.path.getsize(arquivo) / 2**20:.1f} MB")
+
+        latencias = {"sem_copia": [], "durante_copia": []}
+        fase = "sem_copia"
+        fim = False
+        contador = 0
+
+        async def terminal(t: int):
+            nonlocal contador
+            while not fim:
+                contador += 1
+                voto = VotoCreate(matricula=f"t{t}-{contador}", chapa_id=1 + contador % args.chapas)
+                inicio = time.perf_counter()
+                async with Session() as db:
+                    try:
+                        await votar_chapa(voto, USUARIO, db)
+                    except HTTPException:
+                        pass
+                latencias[fase].append(time.perf_counter() - inicio)
+                await asyncio.sleep(args.pausa)
+
+        async def copiar():
+            nonlocal fase, fim
+            await asyncio.sleep(args.aquecimento)
+            fase = "durante_copia"
+            resultado = await backup.fazer_backup("bench", f"{pasta}/copias", origem=arquivo)
+            fim = True
+            return resultado
+
+        resultados = await asyncio.gather(copiar(), *(terminal(t) for t in range(args.terminais)))
+        copia = resultados[0]
+        await engine.dispose()
+
+        print(
+            f"cópia: {copia['bytes'] / 2**20:.1f} MB em {copia['segundos']}s, "
+            f"{copia['passos']} passos, {copia['reinicios']} recomeços"
+        )
+        for nome, valores in latencias.items():
+            print(
+                f"  voto {nome:<14} n={len(valores):5d}  p50={percentil(valores, 50) * 1000:6.1f}ms  "
+                f"p99={percentil(valores, 99) * 1000:6.1f}ms  max={max(valores) * 1000:6.1f}ms"
+            )
+        verificacao = backup.verificar_backup(copia["arquivo"])
+        print(f"verificação: {verificacao['total']} votos, problemas={verificacao['problemas']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votos-iniciais", type=int, default=300000)
+    parser.add_argument("--terminais", type=int, default=8)
+    parser.add_argument("--chapas", type=int, default=4)
+    parser.add_argument("--pausa", type=float, default=0.01, help="segundos entre votos de cada terminal")
+    parser.add_argument("--aquecimento", type=float, default=3, help="segundos de votação antes da cópia")
+    args = parser.parse_args()
+    asyncio.run(executar(args))
+
+
+if __name__ == "__main__":
+    main()
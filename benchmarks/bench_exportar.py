@@ -0,0 +1,85 @@
+"""
+Pico de memória da exportação de votos (tracemalloc) para bases de tamanhos diferentes.
+Compara o caminho antigo (result.all + DataFrame + BytesIO) com a exportação em blocos.
+
+Uso:
+    python benchmarks/bench_exportar.py --votos 10000 50000 100000
+"""
+import io
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from comum import preparar
+from models import Voto
+from votacao.exportacao import exportar_csv, gerar_xlsx, _CONSULTA_VOTOS
+
+
+async def exportar_legado(Session):
+    # reprodução do fluxo anterior: tudo em memória antes de responder
+    import pandas as pd
+    async with Session() as db:
+        votos = (await db.execute(_CONSULTA_VOTOS, {"b_eleicao_id": 1})).all()
+    df = pd.DataFrame(votos, columns=["Matrícula", "Horário", "Chapa"])
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name="Votos Detalhados", index=False)
+    return output.getbuffer().nbytes
+
+
+async def exportar_csv_total(Session):
+    total = 0
+    async for pedaco in exportar_csv(1, Session):
+        total += len(pedaco)
+    return total
+
+
+async def exportar_xlsx_total(Session):
+    caminho = await gerar_xlsx(1, Session)
+    tamanho = os.path.getsize(caminho)
+    os.remove(caminho)
+    return tamanho
+
+
+async def medir(nome, funcao, Session):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    tamanho = await funcao(Session)
+    duracao = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {nome:<8} pico={pico / 2**20:7.1f} MB  tempo={duracao:6.2f}s  arquivo={tamanho / 2**20:6.1f} MB")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votos", type=int, nargs="*", default=[10000, 50000, 100000])
+    parser.add_argument("--chapas", type=int, default=4)
+    args = parser.parse_args()
+
+    for votos in args.votos:
+        with tempfile.TemporaryDirectory() as pasta:
+            engine, Session = await preparar(f"sqlite+aiosqlite:///{pasta}/bench.db", args.chapas)
+            inicio = datetime(2025, 1, 1, 8)
+            async with Session() as db:
+                await db.execute(insert(Voto.__table__), [
+                    {"eleicao_id": 1, "matricula": f"2025{i:08d}", "horario": inicio + timedelta(seconds=i), "chapa_id": 1 + i % args.chapas}
+                    for i in range(votos)
+                ])
+                await db.commit()
+
+            print(f"{votos} votos")
+            await medir("legado", exportar_legado, Session)
+            await medir("csv", exportar_csv_total, Session)
+            await medir("xlsx", exportar_xlsx_total, Session)
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""
+Compara um commit por voto (votar_chapa) com a fila de group commit (FilaVotos)
+no mesmo arquivo SQLite, com vários terminais votando ao mesmo tempo.
+
+Uso:
+    python benchmarks/bench_fila_votos.py --votos 5000 --terminais 64 --perfil seguro
+"""
+import time
+import asyncio
+import argparse
+import tempfile
+
+from fastapi import HTTPException
+
+from comum import preparar, percentil, USUARIO
+from database import DB_PERFIL
+from schemas import VotoCreate
+from votacao.votacao_handler import votar_chapa
+from votacao.fila_votos import FilaVotos
+
+
+async def medir(modo: str, votos: int, terminais: int, chapas: int, perfil: str, lote: int, espera_ms: float):
+    with tempfile.TemporaryDirectory() as pasta:
+        engine, Session = await preparar(f"sqlite+aiosqlite:///{pasta}/bench.db", chapas, perfil)
+        # 5% de matrículas repetidas, algumas caindo no mesmo lote
+        fila = [VotoCreate(matricula=str(i % int(votos * 0.95)), chapa_id=1 + i % chapas) for i in range(votos)]
+        fila.reverse()
+        latencias = []
+        aceitos = rejeitados = 0
+
+        fila_votos = FilaVotos(Session, lote, espera_ms)
+        if modo == "fila":
+            fila_votos.iniciar()
+
+        async def terminal():
+            nonlocal aceitos, rejeitados
+            while fila:
+                voto = fila.pop()
+                inicio = time.perf_counter()
+                try:
+                    if modo == "fila":
+                        await fila_votos.enviar(voto)
+                    else:
+                        async with Session() as db:
+                            await votar_chapa(voto, USUARIO, db)
+                    aceitos += 1
+                except HTTPException:
+                    rejeitados += 1
+                latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(terminal() for _ in range(terminais)))
+        duracao = time.perf_counter() - inicio
+        await fila_votos.parar()
+        await engine.dispose()
+
+    print(
+        f"{modo:<8} {votos / duracao:8.1f} votos/s  p50={percentil(latencias, 50) * 1000:6.1f}ms  "
+        f"p99={percentil(latencias, 99) * 1000:7.1f}ms  aceitos={aceitos} rejeitados={rejeitados}"
+    )
+    return votos / duracao
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votos", type=int, default=5000)
+    parser.add_argument("--terminais", type=int, default=64)
+    parser.add_argument("--chapas", type=int, default=4)
+    parser.add_argument("--perfil", default=DB_PERFIL)
+    parser.add_argument("--lote", type=int, default=64)
+    parser.add_argument("--espera-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    direto = await medir("direto", args.votos, args.terminais, args.chapas, args.perfil, args.lote, args.espera_ms)
+    fila = await medir("fila", args.votos, args.terminais, args.chapas, args.perfil, args.lote, args.espera_ms)
+    print(f"ganho: {fila / direto:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
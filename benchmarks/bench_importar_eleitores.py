@@ -0,0 +1,100 @@
+"""
+Importação de uma planilha de eleitores: tempo total e pico de memória (tracemalloc).
+Compara um insert/commit por linha (ORM) com a importação em blocos de importar_eleitores,
+em CSV e em .xlsx (lido pelo openpyxl, como a planilha da secretaria).
+
+Uso:
+    python benchmarks/bench_importar_eleitores.py --linhas 50000
+"""
+import io
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+from fastapi import UploadFile
+
+from comum import preparar, USUARIO
+from data_handler import ler_eleitores
+from models import Eleitor
+from votacao.votacao_handler import importar_eleitores
+
+
+def gerar_cpf(rng: random.Random) -> str:
+    digitos = [rng.randint(0, 9) for _ in range(9)]
+    for tamanho in (9, 10):
+        soma = sum(d * p for d, p in zip(digitos, range(tamanho + 1, 1, -1)))
+        digitos.append(soma * 10 % 11 % 10)
+    return "".join(map(str, digitos))
+
+
+def gerar_planilha(linhas: int) -> bytes:
+    rng = random.Random(1)
+    saida = io.StringIO()
+    saida.write("Matrícula;CPF;Nome\n")
+    for i in range(linhas):
+        saida.write(f"2025{i:08d};{gerar_cpf(rng)};Aluno {i}\n")
+    return saida.getvalue().encode()
+
+
+def gerar_xlsx(linhas: int) -> bytes:
+    # mesmo layout da planilha da secretaria: título na primeira linha, cabeçalho na segunda
+    import xlsxwriter
+    rng = random.Random(1)
+    saida = io.BytesIO()
+    livro = xlsxwriter.Workbook(saida, {"constant_memory": True})
+    folha = livro.add_worksheet()
+    folha.write_row(0, 0, ["Relação de alunos matriculados"])
+    folha.write_row(1, 0, ["Matrícula", "CPF", "Nome"])
+    for i in range(linhas):
+        folha.write_row(i + 2, 0, [f"2025{i:08d}", gerar_cpf(rng), f"Aluno {i}"])
+    livro.close()
+    return saida.getvalue()
+
+
+async def importar_por_linha(arquivo: UploadFile, db):
+    # como seria o caminho ingênuo: uma linha, um insert, um commit
+    for bloco in ler_eleitores(arquivo, 5000):
+        for _, matricula, cpf, nome in bloco:
+            db.add(Eleitor(matricula=matricula, cpf=cpf, nome=nome))
+            await db.commit()
+
+
+async def medir(modo: str, conteudo: bytes, nome_arquivo: str = "eleitores.csv"):
+    with tempfile.TemporaryDirectory() as pasta:
+        engine, Session = await preparar(f"sqlite+aiosqlite:///{pasta}/bench.db", 1)
+        arquivo = UploadFile(io.BytesIO(conteudo), filename=nome_arquivo)
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        async with Session() as db:
+            if modo == "por_linha":
+                await importar_por_linha(arquivo, db)
+            else:
+                relatorio = await importar_eleitores(arquivo, USUARIO, db)
+                if relatorio["invalidos"]:
+                    raise RuntimeError(f"linhas recusadas: {relatorio['detalhes']}")
+        duracao = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await engine.dispose()
+    print(f"{modo:<10} {duracao:7.2f}s  pico={pico / 2**20:6.1f} MB")
+    return duracao
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, default=50000)
+    parser.add_argument("--linhas-por-linha", type=int, default=5000,
+                        help="o modo por linha é lento; roda só com este tanto de linhas")
+    args = parser.parse_args()
+
+    por_linha = await medir("por_linha", gerar_planilha(args.linhas_por_linha))
+    print(f"  (estimado para {args.linhas} linhas: {por_linha * args.linhas / args.linhas_por_linha:.1f}s)")
+    await medir("em_blocos", gerar_planilha(args.linhas))
+    await medir("xlsx", gerar_xlsx(args.linhas), "eleitores.xlsx")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
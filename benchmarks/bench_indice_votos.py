@@ -0,0 +1,76 @@
+"""
+Custo de recusar votos repetidos/chapa inexistente com e sem o índice em memória,
+e a memória ocupada pelo índice para um dado número de votantes.
+
+Uso:
+    python benchmarks/bench_indice_votos.py --votantes 20000 --tentativas 5000
+"""
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from comum import preparar, percentil, USUARIO
+from models import Voto
+from schemas import VotoCreate
+from votacao.votacao_handler import votar_chapa
+from votacao.indice_votos import indice_votos
+
+
+async def medir(modo: str, votantes: int, tentativas: int):
+    with tempfile.TemporaryDirectory() as pasta:
+        engine, Session = await preparar(f"sqlite+aiosqlite:///{pasta}/bench.db", 2)
+        async with Session() as db:
+            agora = datetime.now()
+            await db.execute(insert(Voto.__table__), [
+                {"eleicao_id": 1, "matricula": f"2025{i:06d}", "horario": agora, "chapa_id": 1 + i % 2}
+                for i in range(votantes)
+            ])
+            await db.commit()
+
+        if modo == "indice":
+            inicio = time.perf_counter()
+            await indice_votos.reconstruir(Session)
+            carga = time.perf_counter() - inicio
+            print(f"  carga do índice: {carga * 1000:.1f}ms  memória={indice_votos.memoria() / 2**20:.2f} MB")
+
+        # metade matrícula repetida, metade chapa inexistente
+        latencias = []
+        for i in range(tentativas):
+            if i % 2:
+                voto = VotoCreate(matricula=f"2025{i % votantes:06d}", chapa_id=1)
+            else:
+                voto = VotoCreate(matricula=f"novo{i}", chapa_id=99)
+            inicio = time.perf_counter()
+            try:
+                async with Session() as db:
+                    await votar_chapa(voto, USUARIO, db)
+            except HTTPException:
+                pass
+            latencias.append(time.perf_counter() - inicio)
+
+        indice_votos.descartar()
+        await engine.dispose()
+
+    print(
+        f"{modo:<8} recusa p50={percentil(latencias, 50) * 1e6:7.1f}us  "
+        f"p99={percentil(latencias, 99) * 1e6:7.1f}us"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votantes", type=int, default=20000)
+    parser.add_argument("--tentativas", type=int, default=5000)
+    args = parser.parse_args()
+
+    await medir("banco", args.votantes, args.tentativas)
+    await medir("indice", args.votantes, args.tentativas)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
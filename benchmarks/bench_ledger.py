@@ -0,0 +1,65 @@
+"""
+Custo do registro de votos (ledger): gravação em lotes como no caminho do voto
+(sem fsync por voto) e verificação completa via mmap, com e sem adulteração.
+
+Uso:
+    python benchmarks/bench_ledger.py --votos 1000000 --lote 1
+"""
+import os
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+import comum  # noqa: F401  (ajusta o sys.path)
+from votacao.ledger import Ledger, verificar_pasta
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votos", type=int, default=1_000_000)
+    parser.add_argument("--lote", type=int, default=1, help="votos por commit (a fila de votos grava em lote)")
+    parser.add_argument("--chapas", type=int, default=4)
+    parser.add_argument("--checkpoint", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        ledger = Ledger(pasta, args.checkpoint)
+        ledger.abrir()
+        agora = datetime.now()
+        inicio = time.perf_counter()
+        for i in range(0, args.votos, args.lote):
+            ledger.registrar([
+                (f"2025{j:07d}", 1 + j % args.chapas, agora)
+                for j in range(i, min(i + args.lote, args.votos))
+            ])
+        ledger.fechar()
+        gravacao = time.perf_counter() - inicio
+        tamanho = os.path.getsize(ledger.caminho)
+        print(
+            f"gravação: {args.votos} votos em {gravacao:.2f}s "
+            f"({gravacao / args.votos * 1e6:.1f}µs/voto)  arquivo={tamanho / 2**20:.1f} MB "
+            f"({tamanho / args.votos:.0f} bytes/voto)"
+        )
+
+        inicio = time.perf_counter()
+        verificacao = verificar_pasta(pasta)
+        duracao = time.perf_counter() - inicio
+        problemas = sum(len(s["problemas"]) for s in verificacao["segmentos"])
+        print(f"verificação: {verificacao['votos']} votos em {duracao:.2f}s  problemas={problemas}")
+
+        # troca um byte no meio do arquivo: a cadeia tem que quebrar ali
+        with open(ledger.caminho, "r+b") as arquivo:
+            arquivo.seek(tamanho // 2)
+            byte = arquivo.read(1)
+            arquivo.seek(tamanho // 2)
+            arquivo.write(bytes([byte[0] ^ 0xFF]))
+        inicio = time.perf_counter()
+        verificacao = verificar_pasta(pasta)
+        duracao = time.perf_counter() - inicio
+        problemas = [p for s in verificacao["segmentos"] for p in s["problemas"]]
+        print(f"adulterado: {verificacao['votos']} votos lidos em {duracao:.2f}s  problemas={problemas}")
+
+
+if __name__ == "__main__":
+    main()
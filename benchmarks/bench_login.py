@@ -0,0 +1,70 @@
+"""
+Latência do voto durante uma rajada de logins (bcrypt).
+Compara o bcrypt rodando direto no event loop com o pool dedicado de auth_handler.
+
+Uso:
+    python benchmarks/bench_login.py --logins 40 --votos 300
+"""
+import time
+import asyncio
+import argparse
+import tempfile
+
+from comum import preparar, percentil, USUARIO
+from auth.auth_handler import get_password_hash, verify_password, verify_password_async, BCRYPT_ROUNDS, BCRYPT_WORKERS
+from schemas import VotoCreate
+from votacao.votacao_handler import votar_chapa
+
+
+async def medir(modo: str, logins: int, votos: int, hash_senha: str):
+    with tempfile.TemporaryDirectory() as pasta:
+        engine, Session = await preparar(f"sqlite+aiosqlite:///{pasta}/bench.db", 2)
+        latencias = []
+        logins_ativos = modo != "sem_login"
+
+        async def login():
+            if modo == "bloqueante":
+                # como era antes: bcrypt síncrono dentro do handler async
+                verify_password("senha123", hash_senha)
+                await asyncio.sleep(0)
+            else:
+                await verify_password_async("senha123", hash_senha)
+
+        async def rajada_logins():
+            await asyncio.gather(*(login() for _ in range(logins)))
+
+        async def terminal():
+            for i in range(votos):
+                voto = VotoCreate(matricula=str(i), chapa_id=1 + i % 2)
+                inicio = time.perf_counter()
+                async with Session() as db:
+                    await votar_chapa(voto, USUARIO, db)
+                latencias.append(time.perf_counter() - inicio)
+
+        tarefas = [terminal()]
+        if logins_ativos:
+            tarefas.append(rajada_logins())
+        await asyncio.gather(*tarefas)
+        await engine.dispose()
+
+    print(
+        f"{modo:<10} voto p50={percentil(latencias, 50) * 1000:7.1f}ms  "
+        f"p99={percentil(latencias, 99) * 1000:7.1f}ms  max={max(latencias) * 1000:7.1f}ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--votos", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"bcrypt rounds={BCRYPT_ROUNDS} workers={BCRYPT_WORKERS}")
+    hash_senha = get_password_hash("senha123")
+    await medir("sem_login", args.logins, args.votos, hash_senha)
+    await medir("bloqueante", args.logins, args.votos, hash_senha)
+    await medir("pool", args.logins, args.votos, hash_senha)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+"""
+Custo da contagem de consultas por requisição e do perfil sob demanda.
+Sobe `main.py --run-server` num SQLite temporário com SQL_POR_REQUISICAO=0 e =1 e mede a
+latência dos votos e da página de resultados; no fim perfila um voto (X-Perfil) e mostra
+os statements que ele rodou e as pilhas mais amostradas.
+
+Uso:
+    python benchmarks/bench_perfil.py --votos 2000 --terminais 8
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+from comum import percentil
+from bench_workers import porta_livre, esperar_servidor, RAIZ, ADMIN_PASSWORD
+
+LOGIN = {"username": "mesa0", "password": "senha123", "admin_password": ADMIN_PASSWORD}
+TOKEN = "segredo-bench"
+
+
+def subir(pasta: str, nome: str, extra: dict) -> tuple[str, subprocess.Popen]:
+    porta = porta_livre()
+    ambiente = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{pasta}/{nome}.db",
+        "HOST": "127.0.0.1",
+        "PORT": str(porta),
+        "SECRET_KEY": "bench",
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "LIMITE_TAXA": "0",
+        "LEDGER_DIR": f"{pasta}/ledger-{nome}",
+        "PERFIL_DIR": f"{pasta}/perfis-{nome}",
+        **extra,
+    }
+    subprocess.run([sys.executable, "main.py", "--create-db"], cwd=RAIZ, env=ambiente, check=True, capture_output=True)
+    processo = subprocess.Popen(
+        [sys.executable, "main.py", "--run-server"], cwd=RAIZ, env=ambiente,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{porta}"
+    esperar_servidor(url, processo)
+    return url, processo
+
+
+async def medir(url: str, args) -> dict:
+    async with httpx.AsyncClient(base_url=url, timeout=60) as c:
+        await c.post("/auth/register", json={"username": "mesa0", "password": "senha123", "admin_password": int(ADMIN_PASSWORD)})
+        await c.post("/auth/login", data=LOGIN)
+        for n in range(args.chapas):
+            await c.post("/eleicao/cadastrar-chapa", data={"chapa_nome": f"Chapa {n}"})
+
+    fila = list(range(args.votos))
+    latencias = {"voto": [], "resultados": []}
+
+    async def terminal():
+        async with httpx.AsyncClient(base_url=url, timeout=60) as c:
+            await c.post("/auth/login", data=LOGIN)
+            while fila:
+                i = fila.pop()
+                inicio = time.perf_counter()
+                await c.post("/eleicao/votar", data={"matricula": f"2025{i:06d}", "chapa_id": 1 + i % args.chapas})
+                latencias["voto"].append(time.perf_counter() - inicio)
+                if i % 10 == 0:
+                    inicio = time.perf_counter()
+                    await c.get("/eleicao/resultados")
+                    latencias["resultados"].append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(terminal() for _ in range(args.terminais)))
+    latencias["duracao"] = time.perf_counter() - inicio
+    return latencias
+
+
+async def perfilar(url: str, args):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as c:
+        await c.post("/auth/login", data=LOGIN)
+        inicio = time.perf_counter()
+        r = await c.post("/eleicao/votar", data={"matricula": "perfil-1", "chapa_id": 1}, headers={"X-Perfil": TOKEN})
+        print(f"voto perfilado em {(time.perf_counter() - inicio) * 1000:.1f}ms  server-timing: {r.headers.get('server-timing')}")
+        cabecalho = {"Authorization": f"Bearer {TOKEN}"}
+        print((await c.get(f"/perfis/{r.headers['x-perfil']}?formato=sql", headers=cabecalho)).text)
+        pilhas = (await c.get(f"/perfis/{r.headers['x-perfil']}", headers=cabecalho)).text.splitlines()
+        print(f"{len(pilhas)} pilhas distintas; as mais amostradas (folha por último):")
+        for linha in pilhas[:args.pilhas]:
+            pilha, amostras = linha.rsplit(" ", 1)
+            print(f"  {amostras:>4}  ...{';'.join(pilha.split(';')[-3:])}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votos", type=int, default=2000)
+    parser.add_argument("--terminais", type=int, default=8)
+    parser.add_argument("--chapas", type=int, default=4)
+    parser.add_argument("--pilhas", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        for nome, extra in (("desligado", {"SQL_POR_REQUISICAO": "0"}), ("ligado", {"SQL_POR_REQUISICAO": "1", "PERFIL_TOKEN": TOKEN})):
+            url, processo = subir(pasta, nome, extra)
+            try:
+                latencias = asyncio.run(medir(url, args))
+                print(f"SQL_POR_REQUISICAO {nome:<9} {args.votos / latencias['duracao']:7.1f} votos/s", end="")
+                for rota in ("voto", "resultados"):
+                    valores = latencias[rota]
+                    print(f"  {rota} p50={percentil(valores, 50) * 1000:5.2f}ms p99={percentil(valores, 99) * 1000:5.2f}ms", end="")
+                print()
+                if nome == "ligado":
+                    asyncio.run(perfilar(url, args))
+            finally:
+                processo.terminate()
+                processo.wait(30)
+
+
+if __name__ == "__main__":
+    main()
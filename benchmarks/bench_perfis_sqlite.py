@@ -0,0 +1,87 @@
+"""
+Teste de carga dos perfis de SQLite (DB_PERFIL): terminais votando em paralelo
+enquanto telas de resultados leem a contagem sem parar.
+Mostra votos/s e latência p50/p99 do voto para cada perfil.
+
+Uso:
+    python benchmarks/bench_perfis_sqlite.py --votos 3000 --terminais 16 --leitores 8
+"""
+import time
+import asyncio
+import argparse
+import tempfile
+
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+
+from comum import preparar, percentil, USUARIO
+from database import PERFIS_SQLITE
+from schemas import VotoCreate
+from votacao.votacao_handler import votar_chapa, listar_contagens
+
+
+async def medir(perfil: str, votos: int, terminais: int, leitores: int, chapas: int):
+    with tempfile.TemporaryDirectory() as pasta:
+        engine, Session = await preparar(f"sqlite+aiosqlite:///{pasta}/bench.db", chapas, perfil)
+        fila = [VotoCreate(matricula=str(i), chapa_id=1 + i % chapas) for i in range(votos)]
+        latencias = []
+        bloqueios = leituras = 0
+        votando = True
+
+        async def terminal():
+            nonlocal bloqueios
+            while fila:
+                voto = fila.pop()
+                inicio = time.perf_counter()
+                async with Session() as db:
+                    try:
+                        await votar_chapa(voto, USUARIO, db)
+                    except HTTPException:
+                        pass
+                    except OperationalError:
+                        # "database is locked": o voto teria que ser reenviado
+                        bloqueios += 1
+                        continue
+                latencias.append(time.perf_counter() - inicio)
+
+        async def tela_resultados():
+            nonlocal leituras
+            while votando:
+                async with Session() as db:
+                    try:
+                        await listar_contagens(db)
+                        leituras += 1
+                    except OperationalError:
+                        pass
+                await asyncio.sleep(0)
+
+        inicio = time.perf_counter()
+        telas = [asyncio.create_task(tela_resultados()) for _ in range(leitores)]
+        await asyncio.gather(*(terminal() for _ in range(terminais)))
+        duracao = time.perf_counter() - inicio
+        votando = False
+        await asyncio.gather(*telas)
+        await engine.dispose()
+
+    print(
+        f"{perfil:<8} {len(latencias) / duracao:8.1f} votos/s  "
+        f"p50={percentil(latencias, 50) * 1000:6.1f}ms  p99={percentil(latencias, 99) * 1000:7.1f}ms  "
+        f"bloqueios={bloqueios}  leituras={leituras}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votos", type=int, default=3000)
+    parser.add_argument("--terminais", type=int, default=16)
+    parser.add_argument("--leitores", type=int, default=8)
+    parser.add_argument("--chapas", type=int, default=4)
+    parser.add_argument("--perfis", nargs="*", default=list(PERFIS_SQLITE))
+    args = parser.parse_args()
+
+    for perfil in args.perfis:
+        await medir(perfil, args.votos, args.terminais, args.leitores, args.chapas)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,163 @@
+"""
+Primário + réplica somente leitura em dois processos locais (cada um com o seu SQLite).
+Os terminais votam no primário enquanto observadores carregam resultados e exportação
+na réplica; o script mede o atraso da réplica durante a carga e, no fim, confere
+que os totais da réplica batem com os do primário e que ela recusa votos.
+
+Uso:
+    python benchmarks/bench_replica.py --votos 3000 --terminais 8
+"""
+import os
+import re
+import sys
+import time
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+from comum import percentil
+from bench_workers import porta_livre, esperar_servidor, RAIZ, ADMIN_PASSWORD
+
+LOGIN = {"username": "mesa0", "password": "senha123", "admin_password": ADMIN_PASSWORD}
+
+
+def subir(pasta: str, nome: str, extra: dict) -> tuple[str, subprocess.Popen]:
+    porta = porta_livre()
+    ambiente = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite+aiosqlite:///{pasta}/{nome}.db",
+        "HOST": "127.0.0.1",
+        "PORT": str(porta),
+        "SECRET_KEY": "bench",  # o mesmo nos dois: o login feito num vale no outro
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "REPLICACAO_TOKEN": "segredo-bench",
+        "LIMITE_TAXA": "0",
+        "LEDGER_DIR": f"{pasta}/ledger-{nome}",
+        **extra,
+    }
+    subprocess.run([sys.executable, "main.py", "--create-db"], cwd=RAIZ, env=ambiente, check=True, capture_output=True)
+    processo = subprocess.Popen(
+        [sys.executable, "main.py", "--run-server"], cwd=RAIZ, env=ambiente,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{porta}"
+    esperar_servidor(url, processo)
+    return url, processo
+
+
+def totais(html: str) -> list[int]:
+    return [int(v) for v in re.findall(r'vote-number">(\d+)', html)]
+
+
+async def executar(args, pasta: str, primario: str, replica: str):
+    async with httpx.AsyncClient(base_url=primario, timeout=60) as c:
+        await c.post("/auth/register", json={"username": "mesa0", "password": "senha123", "admin_password": int(ADMIN_PASSWORD)})
+        await c.post("/auth/login", data=LOGIN)
+        for n in range(args.chapas):
+            await c.post("/eleicao/cadastrar-chapa", data={"chapa_nome": f"Chapa {n}"})
+
+    # o mesário só existe na réplica depois da primeira sincronização
+    async with httpx.AsyncClient(base_url=replica, timeout=60) as c:
+        for _ in range(100):
+            if "access_token" in (await c.post("/auth/login", data=LOGIN)).cookies:
+                break
+            await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("o mesário não chegou à réplica")
+
+    fila = list(range(args.votos))
+    ativos = args.terminais
+    atrasos = []
+    leituras = {"resultados": [], "exportar": []}
+
+    async def terminal():
+        nonlocal ativos
+        async with httpx.AsyncClient(base_url=primario, timeout=60) as c:
+            await c.post("/auth/login", data=LOGIN)
+            while fila:
+                i = fila.pop()
+                await c.post("/eleicao/votar", data={"matricula": f"2025{i:06d}", "chapa_id": 1 + i % args.chapas})
+        ativos -= 1
+
+    async def observador():
+        async with httpx.AsyncClient(base_url=replica, timeout=60) as c:
+            await c.post("/auth/login", data=LOGIN)
+            while ativos:
+                inicio = time.perf_counter()
+                await c.get("/eleicao/resultados")
+                leituras["resultados"].append(time.perf_counter() - inicio)
+                inicio = time.perf_counter()
+                await c.get("/eleicao/exportar-resultados?formato=csv")
+                leituras["exportar"].append(time.perf_counter() - inicio)
+                status = (await c.get("/eleicao/replicacao/status")).json()
+                atrasos.append(status["votos_pendentes"] or 0)
+                await asyncio.sleep(0.2)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(terminal() for _ in range(args.terminais)), *(observador() for _ in range(args.observadores)))
+    duracao = time.perf_counter() - inicio
+
+    # quanto a réplica leva para alcançar o primário depois do último voto
+    async with httpx.AsyncClient(base_url=primario, timeout=60) as p, httpx.AsyncClient(base_url=replica, timeout=60) as r:
+        await p.post("/auth/login", data=LOGIN)
+        await r.post("/auth/login", data=LOGIN)
+        esperado = totais((await p.get("/eleicao/resultados")).text)
+        fim_votos = time.perf_counter()
+        while totais((await r.get("/eleicao/resultados")).text) != esperado:
+            if time.perf_counter() - fim_votos > 30:
+                raise RuntimeError("a réplica não alcançou o primário em 30s")
+            await asyncio.sleep(0.05)
+        alcance = time.perf_counter() - fim_votos
+        recusa = await r.post("/eleicao/votar", data={"matricula": "x", "chapa_id": 1})
+        status = (await r.get("/eleicao/replicacao/status")).json()
+
+        # mesário desativado direto no banco do primário: a sessão dele na réplica deixa de valer
+        with sqlite3.connect(f"{pasta}/primario.db") as banco:
+            banco.execute('UPDATE "User" SET is_active = 0 WHERE username = ?', (LOGIN["username"],))
+        inicio = time.perf_counter()
+        while (await r.get("/eleicao/votar")).status_code == 200:
+            if time.perf_counter() - inicio > 30:
+                raise RuntimeError("a desativação do mesário não chegou à réplica em 30s")
+            await asyncio.sleep(0.05)
+        desativacao = time.perf_counter() - inicio
+
+    print(f"votos no primário: {args.votos / duracao:.1f}/s  totais={esperado}")
+    for nome, valores in leituras.items():
+        print(f"  réplica {nome:<10} n={len(valores):4d}  p50={percentil(valores, 50) * 1000:6.1f}ms  p99={percentil(valores, 99) * 1000:6.1f}ms")
+    print(f"  votos pendentes na réplica durante a carga: p50={percentil(atrasos, 50)}  max={max(atrasos, default=0)}")
+    print(f"  réplica alcançou o primário {alcance * 1000:.0f}ms depois do último voto")
+    print(f"  voto na réplica: {recusa.status_code}  status: {status}")
+    print(f"  desativação do mesário chegou à réplica em {desativacao * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votos", type=int, default=3000)
+    parser.add_argument("--terminais", type=int, default=8)
+    parser.add_argument("--observadores", type=int, default=2)
+    parser.add_argument("--chapas", type=int, default=4)
+    parser.add_argument("--intervalo", type=float, default=0.5, help="REPLICACAO_INTERVALO da réplica")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        primario, processo_primario = subir(pasta, "primario", {})
+        try:
+            replica, processo_replica = subir(pasta, "replica", {
+                "REPLICA_DE": primario, "REPLICACAO_INTERVALO": str(args.intervalo),
+            })
+            try:
+                asyncio.run(executar(args, pasta, primario, replica))
+            finally:
+                processo_replica.terminate()
+                processo_replica.wait(30)
+        finally:
+            processo_primario.terminate()
+            processo_primario.wait(30)
+
+
+if __name__ == "__main__":
+    main()
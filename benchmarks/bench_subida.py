@@ -0,0 +1,109 @@
+"""
+Tempo de subida e memória ociosa de um worker: importa `main` num processo novo
+(com `python -X importtime`), lista os módulos que mais pesam e mede o RSS.
+Com --servidor, mede também quanto tempo `main.py --run-server` leva até responder,
+que é o que um worker reiniciado no meio da votação custa.
+
+Uso:
+    python benchmarks/bench_subida.py --repeticoes 5 --servidor
+    python benchmarks/bench_subida.py --previo pandas   # compara com pandas carregado na subida
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+from comum import percentil
+from bench_workers import porta_livre, esperar_servidor, RAIZ
+
+AMBIENTE = {**os.environ, "PORT": "8000", "SECRET_KEY": "bench", "ADMIN_PASSWORD": "1234"}
+
+# roda no processo filho: importa a aplicação e informa tempo, RSS e módulos pesados carregados
+_FILHO = """
+import sys, time
+inicio = time.perf_counter()
+{previo}
+import main
+duracao = time.perf_counter() - inicio
+rss = 0
+with open("/proc/self/status") as status:
+    for linha in status:
+        if linha.startswith("VmRSS:"):
+            rss = int(linha.split()[1]) * 1024
+pesados = [m for m in ("pandas", "numpy", "openpyxl", "xlsxwriter") if m in sys.modules]
+print(duracao, rss, len(sys.modules), ",".join(pesados))
+"""
+
+
+def importar(previo: str, importtime: bool):
+    codigo = _FILHO.format(previo=f"import {previo}" if previo else "")
+    comando = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", codigo]
+    processo = subprocess.run(comando, cwd=RAIZ, env=AMBIENTE, capture_output=True, text=True, check=True)
+    duracao, rss, modulos, pesados = (processo.stdout.strip().splitlines()[-1].split(" ") + [""])[:4]
+    return float(duracao), int(rss), int(modulos), pesados, processo.stderr
+
+
+def mais_lentos(saida_importtime: str, quantidade: int) -> list[tuple[int, str]]:
+    # linhas "import time: self | cumulative | pacote", com dois espaços de indentação por nível;
+    # ficam os módulos importados no topo e os importados diretamente por eles (ex.: por main)
+    modulos = []
+    for linha in saida_importtime.splitlines():
+        if not linha.startswith("import time:") or "cumulative" in linha:
+            continue
+        _, acumulado, nome = linha.split("|")
+        if len(nome) - len(nome.lstrip()) <= 3:
+            modulos.append((int(acumulado), nome.strip()))
+    return sorted(modulos, reverse=True)[:quantidade]
+
+
+def subir_servidor() -> float:
+    with tempfile.TemporaryDirectory() as pasta:
+        porta = porta_livre()
+        ambiente = {
+            **AMBIENTE, "PORT": str(porta), "HOST": "127.0.0.1",
+            "DATABASE_URL": f"sqlite+aiosqlite:///{pasta}/bench.db", "LEDGER_DIR": f"{pasta}/ledger",
+        }
+        subprocess.run([sys.executable, "main.py", "--create-db"], cwd=RAIZ, env=ambiente, check=True, capture_output=True)
+        inicio = time.perf_counter()
+        servidor = subprocess.Popen(
+            [sys.executable, "main.py", "--run-server"],
+            cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            esperar_servidor(f"http://127.0.0.1:{porta}", servidor)
+            return time.perf_counter() - inicio
+        finally:
+            servidor.terminate()
+            servidor.wait(30)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--previo", help="módulo importado antes de main (ex.: pandas), para comparar")
+    parser.add_argument("--servidor", action="store_true", help="mede também a subida até a primeira resposta")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    # a primeira execução aquece o cache de bytecode e o do sistema de arquivos
+    *_, importtime = importar(args.previo, importtime=True)
+    medicoes = [importar(args.previo, importtime=False) for _ in range(args.repeticoes)]
+    duracoes = [m[0] for m in medicoes]
+    _, rss, modulos, pesados, _ = medicoes[-1]
+    print(
+        f"import main: p50={percentil(duracoes, 50) * 1000:.0f}ms  min={min(duracoes) * 1000:.0f}ms  "
+        f"RSS={rss / 2**20:.1f} MB  módulos={modulos}  pesados carregados: {pesados or 'nenhum'}"
+    )
+    print("módulos de primeiro nível mais lentos (acumulado):")
+    for acumulado, nome in mais_lentos(importtime, args.top):
+        print(f"  {acumulado / 1000:8.1f}ms  {nome}")
+
+    if args.servidor:
+        subidas = [subir_servidor() for _ in range(args.repeticoes)]
+        print(f"--run-server até a primeira resposta: p50={percentil(subidas, 50) * 1000:.0f}ms  max={max(subidas) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
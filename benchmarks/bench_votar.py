@@ -0,0 +1,92 @@
+"""
+Compara o caminho antigo de votar_chapa (SELECT Voto + SELECT Chapa + INSERT)
+com o caminho atual (INSERT único validado pelas constraints) sob carga concorrente.
+
+Uso:
+    python benchmarks/bench_votar.py --votos 2000 --concorrencia 32
+"""
+import time
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy.future import select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from comum import preparar, USUARIO
+from models import User, Chapa, Voto
+from schemas import VotoCreate
+from votacao.votacao_handler import votar_chapa, _incrementar_contagem
+
+
+async def votar_chapa_legado(novo_voto: VotoCreate, user: User, db: AsyncSession):
+    # reprodução do fluxo anterior, com os dois SELECTs de verificação
+    voto_result = await db.execute(select(Voto).where(Voto.matricula == novo_voto.matricula))
+    if voto_result.scalars().first():
+        raise HTTPException(status_code=409, detail="Você já votou!")
+
+    chapa_result = await db.execute(select(Chapa).where(Chapa.chapa_id == novo_voto.chapa_id))
+    if not chapa_result.scalars().first():
+        raise HTTPException(status_code=404, detail="Chapa não existe")
+
+    try:
+        db.add(Voto(eleicao_id=1, matricula=novo_voto.matricula, horario=datetime.now(), chapa_id=novo_voto.chapa_id))
+        await db.flush()
+        await _incrementar_contagem(db, novo_voto.chapa_id)
+        await db.commit()
+    except IntegrityError:
+        # dois terminais passaram pela verificação ao mesmo tempo
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="corrida")
+
+
+async def medir(nome: str, funcao, votos: int, concorrencia: int, chapas: int):
+    with tempfile.TemporaryDirectory() as pasta:
+        engine, Session = await preparar(f"sqlite+aiosqlite:///{pasta}/bench.db", chapas)
+        # 10% de matrículas repetidas para exercitar o caminho de rejeição
+        fila = [VotoCreate(matricula=str(i % int(votos * 0.9)), chapa_id=1 + i % chapas) for i in range(votos)]
+        fila.reverse()
+        aceitos = rejeitados = corridas = bloqueios = 0
+
+        async def terminal():
+            nonlocal aceitos, rejeitados, corridas, bloqueios
+            while fila:
+                voto = fila.pop()
+                async with Session() as db:
+                    try:
+                        await funcao(voto, USUARIO, db)
+                        aceitos += 1
+                    except HTTPException as e:
+                        rejeitados += 1
+                        corridas += e.detail == "corrida"
+                    except OperationalError:
+                        # "database is locked": voto perdido, o terminal teria que reenviar
+                        await db.rollback()
+                        bloqueios += 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(terminal() for _ in range(concorrencia)))
+        duracao = time.perf_counter() - inicio
+        await engine.dispose()
+
+    print(f"{nome:<8} {votos / duracao:10.1f} votos/s  aceitos={aceitos} rejeitados={rejeitados} corridas={corridas} bloqueios={bloqueios} ({duracao:.2f}s)")
+    return votos / duracao
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--votos", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int, default=32)
+    parser.add_argument("--chapas", type=int, default=4)
+    args = parser.parse_args()
+
+    legado = await medir("legado", votar_chapa_legado, args.votos, args.concorrencia, args.chapas)
+    atual = await medir("atual", votar_chapa, args.votos, args.concorrencia, args.chapas)
+    print(f"ganho: {atual / legado:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
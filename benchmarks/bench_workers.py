@@ -0,0 +1,177 @@
+"""
+Escalabilidade do servidor com --workers N: sobe `main.py --run-server --workers N` num
+SQLite temporário e dispara tráfego misto (voto + página de votação, resultados e login)
+de vários processos clientes pela porta local. No fim confere a coordenação entre os
+workers: total de votos nos resultados e chapa nova visível em todos os processos.
+
+Uso:
+    python benchmarks/bench_workers.py --workers 1 2 4 --duracao 15
+"""
+import os
+import re
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import multiprocessing
+
+import httpx
+
+from comum import percentil
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_PASSWORD = "1234"
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def login(c: httpx.Client | httpx.AsyncClient, usuario: str):
+    return c.post("/auth/login", data={"username": usuario, "password": "senha123", "admin_password": ADMIN_PASSWORD})
+
+
+async def entrar(c: httpx.AsyncClient, usuario: str):
+    # a admissão limita logins simultâneos (CONCORRENCIA_AUTH): como um terminal, espera e tenta de novo
+    while (r := await login(c, usuario)).status_code == 429:
+        await asyncio.sleep(float(r.headers.get("retry-after", "1")))
+
+
+async def sessao(url: str, usuario: str, prefixo: str, fim: float, chapas: int, latencias: dict):
+    async with httpx.AsyncClient(base_url=url, timeout=60) as c:
+        await entrar(c, usuario)
+        i = 0
+        while time.time() < fim:
+            i += 1
+            inicio = time.perf_counter()
+            if i % 20 == 0:
+                nome = "login"
+                await entrar(c, usuario)
+            elif i % 5 == 0:
+                nome = "resultados"
+                await c.get("/eleicao/resultados")
+            else:
+                nome = "voto"
+                r = await c.post("/eleicao/votar", data={"matricula": f"{prefixo}{i}", "chapa_id": 1 + i % chapas})
+                await c.get(r.headers["location"])
+            latencias.setdefault(nome, []).append(time.perf_counter() - inicio)
+
+
+def cliente(url: str, indice: int, sessoes: int, fim: float, chapas: int, usuarios: int):
+    latencias = {}
+
+    async def rodar():
+        await asyncio.gather(*(
+            sessao(url, f"mesa{(indice * sessoes + s) % usuarios}", f"c{indice}s{s}-", fim, chapas, latencias)
+            for s in range(sessoes)
+        ))
+
+    asyncio.run(rodar())
+    return latencias
+
+
+def esperar_servidor(url: str, processo: subprocess.Popen):
+    for _ in range(200):
+        if processo.poll() is not None:
+            raise RuntimeError("o servidor terminou antes de responder")
+        try:
+            httpx.get(url + "/", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError("o servidor não respondeu")
+
+
+def medir(workers: int, args) -> dict:
+    with tempfile.TemporaryDirectory() as pasta:
+        porta = porta_livre()
+        url = f"http://127.0.0.1:{porta}"
+        ambiente = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite+aiosqlite:///{pasta}/bench.db",
+            "HOST": "127.0.0.1",
+            "PORT": str(porta),
+            "SECRET_KEY": "bench",
+            "ADMIN_PASSWORD": ADMIN_PASSWORD,
+            "VERSAO_INTERVALO": "0.5",
+            "LIMITE_TAXA": "0",
+            "LEDGER_DIR": f"{pasta}/ledger",
+        }
+        subprocess.run([sys.executable, "main.py", "--create-db"], cwd=RAIZ, env=ambiente, check=True, capture_output=True)
+        servidor = subprocess.Popen(
+            [sys.executable, "main.py", "--run-server", "--workers", str(workers)],
+            cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            esperar_servidor(url, servidor)
+            usuarios = args.clientes * args.sessoes
+            with httpx.Client(base_url=url, timeout=60) as c:
+                for u in range(usuarios):
+                    c.post("/auth/register", json={"username": f"mesa{u}", "password": "senha123", "admin_password": int(ADMIN_PASSWORD)})
+                login(c, "mesa0")
+                for n in range(args.chapas):
+                    c.post("/eleicao/cadastrar-chapa", data={"chapa_nome": f"Chapa {n}"})
+
+            fim = time.time() + args.duracao
+            with multiprocessing.Pool(args.clientes) as pool:
+                resultados = pool.starmap(cliente, [
+                    (url, i, args.sessoes, fim, args.chapas, usuarios) for i in range(args.clientes)
+                ])
+            latencias = {}
+            for parcial in resultados:
+                for nome, valores in parcial.items():
+                    latencias.setdefault(nome, []).extend(valores)
+
+            # coordenação: a soma dos resultados bate com os votos e a chapa nova chega a todos os workers
+            with httpx.Client(base_url=url, timeout=60) as c:
+                login(c, "mesa0")
+                total_resultados = sum(int(v) for v in re.findall(r'vote-number">(\d+)', c.get("/eleicao/resultados").text))
+                c.post("/eleicao/cadastrar-chapa", data={"chapa_nome": "Chapa nova"})
+                time.sleep(1.5)
+                paginas = [c.get("/eleicao/votar").text for _ in range(4 * workers)]
+                chapa_nova_em_todos = all("Chapa nova" in pagina for pagina in paginas)
+        finally:
+            servidor.terminate()
+            servidor.wait(30)
+
+    operacoes = sum(len(v) for v in latencias.values())
+    return {
+        "workers": workers,
+        "operacoes_s": operacoes / args.duracao,
+        "p50": {nome: percentil(v, 50) for nome, v in latencias.items()},
+        "p99": {nome: percentil(v, 99) for nome, v in latencias.items()},
+        "votos": len(latencias.get("voto", [])),
+        "total_resultados": total_resultados,
+        "chapa_nova_em_todos": chapa_nova_em_todos,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4])
+    parser.add_argument("--duracao", type=float, default=15)
+    parser.add_argument("--clientes", type=int, default=4, help="processos clientes")
+    parser.add_argument("--sessoes", type=int, default=8, help="terminais por processo cliente")
+    parser.add_argument("--chapas", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"núcleos: {os.cpu_count()}")
+    base = None
+    for workers in args.workers:
+        r = medir(workers, args)
+        base = base or r["operacoes_s"]
+        p50 = "  ".join(f"{nome}={valor * 1000:.1f}ms" for nome, valor in sorted(r["p50"].items()))
+        print(
+            f"workers={workers}  {r['operacoes_s']:8.1f} op/s  ({r['operacoes_s'] / base:.2f}x)  p50: {p50}\n"
+            f"           votos={r['votos']} soma_resultados={r['total_resultados']} "
+            f"chapa_nova_em_todos={r['chapa_nova_em_todos']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
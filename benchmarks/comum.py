@@ -0,0 +1,41 @@
+"""Utilitários compartilhados pelos benchmarks (banco temporário, percentis)."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from database import criar_engine, DB_PERFIL
+from models import Base, User, Chapa, ContagemChapa, Eleicao
+
+USUARIO = User(username="benchmark", is_active=True)
+
+
+async def preparar(url: str, chapas: int, perfil: str = DB_PERFIL):
+    # cria o schema, a eleição 1 e as chapas dela (com a linha de contagem) num banco novo
+    engine = criar_engine(url, perfil)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    async with Session() as db:
+        db.add(Eleicao(eleicao_id=1, nome="Eleição", criada_em=datetime.now()))
+        await db.flush()
+        for i in range(chapas):
+            chapa = Chapa(chapa_nome=f"Chapa {i}", eleicao_id=1)
+            db.add(chapa)
+            await db.flush()
+            db.add(ContagemChapa(chapa_id=chapa.chapa_id, total_votos=0))
+        await db.commit()
+    return engine, Session
+
+
+def percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))
+    return ordenados[indice]
@@ -0,0 +1,324 @@
+"""
+A mesma bateria de verificações no SQLite e num PostgreSQL local (matriz de bancos).
+
+Cada banco roda num processo próprio (main/database leem DATABASE_URL na importação), pela
+aplicação inteira via httpx.ASGITransport: um banco no schema da primeira versão é atualizado
+com migrar() e depois passa por cadastro, votos (inclusive concorrentes), resultados,
+reconciliação, exportação, participação, importação de eleitores, várias eleições e arquivamento.
+
+O PostgreSQL é um servidor temporário subido com initdb/pg_ctl (de PG_BIN ou do PATH) numa
+pasta temporária, ou um já rodando, com --postgres-servidor; nos dois casos a bateria usa um
+banco descartável criado para ela. Precisa de asyncpg, e o initdb não roda como root.
+
+Uso:
+    python benchmarks/matriz_bancos.py
+    python benchmarks/matriz_bancos.py --bancos sqlite
+    PG_BIN=/usr/lib/postgresql/16/bin python benchmarks/matriz_bancos.py
+    python benchmarks/matriz_bancos.py --postgres-servidor postgresql://postgres@localhost:5432
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_PASSWORD = "1234"
+LOGIN = {"username": "mesa0", "password": "senha123", "admin_password": ADMIN_PASSWORD}
+
+CASOS = []
+
+
+def caso(nome: str):
+    def registrar(funcao):
+        CASOS.append((nome, funcao))
+        return funcao
+    return registrar
+
+
+def resultados_da_pagina(html: str) -> dict:
+    return {
+        nome: int(votos)
+        for nome, votos in re.findall(r'<h4>(.*?)</h4>\s*<span class="vote-count"><span class="vote-number">(\d+)', html)
+    }
+
+
+def criar_schema_antigo(conn):
+    # User, Chapa e Voto como na primeira versão: sem Eleicao, Voto com PK só na matrícula
+    from sqlalchemy import MetaData, Table, Column, Integer, String, Boolean, DateTime, ForeignKey, insert
+    meta = MetaData()
+    Table(
+        "User", meta,
+        Column("user_id", Integer, primary_key=True), Column("username", String(100), unique=True),
+        Column("hashed_password", String(255)), Column("is_active", Boolean),
+    )
+    chapa = Table("Chapa", meta, Column("chapa_id", Integer, primary_key=True), Column("chapa_nome", String(100), nullable=False))
+    voto = Table(
+        "Voto", meta,
+        Column("matricula", String(100), primary_key=True), Column("horario", DateTime),
+        Column("chapa_id", ForeignKey("Chapa.chapa_id"), nullable=False),
+    )
+    meta.create_all(conn)
+    conn.execute(insert(chapa), [{"chapa_nome": "Antiga A"}, {"chapa_nome": "Antiga B"}])
+    conn.execute(insert(voto), [
+        {"matricula": f"antigo{i}", "horario": datetime.now(), "chapa_id": 1 + i % 2} for i in range(5)
+    ])
+
+
+@caso("banco antigo atualizado por migrar()")
+async def _migracoes(c, ctx):
+    from database import engine, AsyncSessionLocal
+    from migracoes import migrar, MIGRACOES
+    from votacao.votacao_handler import listar_contagens
+    async with engine.begin() as conn:
+        await conn.run_sync(criar_schema_antigo)
+    aplicadas = await migrar()
+    assert aplicadas == [id_migracao for id_migracao, _, _ in MIGRACOES], aplicadas
+    assert await migrar() == [], "migrar() aplicou de novo"
+    async with AsyncSessionLocal() as db:
+        contagens = {nome: votos for _, nome, votos in await listar_contagens(db)}
+    assert contagens == {"Antiga A": 3, "Antiga B": 2}, contagens
+    ctx["esperado"] = dict(contagens)
+
+
+@caso("cadastro de mesário e de chapa")
+async def _cadastro(c, ctx):
+    r = await c.post("/auth/register", json={**LOGIN, "admin_password": int(ADMIN_PASSWORD)})
+    assert r.status_code == 200, (r.status_code, r.text)
+    r = await c.post("/auth/login", data=LOGIN)
+    assert r.cookies.get("access_token"), r.status_code
+    c.cookies.set("access_token", r.cookies.get("access_token"))
+    r = await c.post("/eleicao/cadastrar-chapa", data={"chapa_nome": "Nova"})
+    assert "message=" in r.headers.get("location", ""), r.headers.get("location")
+    r = await c.post("/eleicao/cadastrar-chapa", data={"chapa_nome": "Nova"})
+    assert "error=" in r.headers.get("location", ""), "chapa repetida aceita"
+    ctx["esperado"]["Nova"] = 0
+
+
+@caso("votos pela página de votação")
+async def _votos(c, ctx):
+    async def votar(matricula, chapa_id):
+        r = await c.post("/eleicao/votar", data={"matricula": matricula, "chapa_id": chapa_id})
+        return r.headers.get("location", "")
+
+    assert "message=" in await votar("2025001", 3)
+    assert "j%C3%A1%20votou" in await votar("2025001", 1), "voto repetido aceito"
+    # a PK trocada pela migração continua valendo para os votos antigos
+    assert "j%C3%A1%20votou" in await votar("antigo0", 2), "voto antigo ignorado"
+    assert "error=" in await votar("2025002", 999), "chapa inexistente aceita"
+    ctx["esperado"]["Nova"] += 1
+
+
+@caso("votos concorrentes pela API")
+async def _concorrentes(c, ctx):
+    # mesma matrícula em 20 requisições simultâneas: só uma entra
+    respostas = await asyncio.gather(*(
+        c.post("/eleicao/api/votos", json={"matricula": "corrida", "chapa_id": 1}) for _ in range(20)
+    ))
+    aceitos = sum(r.json()["aceitos"] for r in respostas)
+    assert aceitos == 1, f"{aceitos} votos aceitos para a mesma matrícula"
+    # 40 votos simultâneos na mesma chapa: a contagem não perde nenhum
+    respostas = await asyncio.gather(*(
+        c.post("/eleicao/api/votos", json={"matricula": f"paralelo{i}", "chapa_id": 2}) for i in range(40)
+    ))
+    assert all(r.json()["aceitos"] == 1 for r in respostas), [r.json() for r in respostas if r.json()["aceitos"] != 1][:3]
+    ctx["esperado"]["Antiga A"] += 1
+    ctx["esperado"]["Antiga B"] += 40
+
+
+@caso("resultados e reconciliação da contagem")
+async def _resultados(c, ctx):
+    from database import AsyncSessionLocal
+    from votacao.votacao_handler import reconciliar_contagem
+    r = await c.get("/eleicao/resultados")
+    assert resultados_da_pagina(r.text) == ctx["esperado"], (resultados_da_pagina(r.text), ctx["esperado"])
+    async with AsyncSessionLocal() as db:
+        reconciliadas = {nome: votos for _, nome, votos in await reconciliar_contagem(db)}
+    assert reconciliadas == ctx["esperado"], reconciliadas
+
+
+@caso("exportação CSV e xlsx")
+async def _exportacao(c, ctx):
+    r = await c.get("/eleicao/exportar-resultados?formato=csv")
+    assert r.status_code == 200, r.status_code
+    linhas = r.text.strip().splitlines()[1:]
+    assert len(linhas) == sum(ctx["esperado"].values()), len(linhas)
+    r = await c.get("/eleicao/exportar-resultados?formato=xlsx")
+    assert r.status_code == 200 and r.content[:2] == b"PK", r.status_code
+
+
+@caso("participação por minuto")
+async def _participacao(c, ctx):
+    r = await c.get("/eleicao/participacao")
+    assert r.status_code == 200, r.status_code
+    total = sum(chapa["acumulado"][-1] for chapa in r.json()["chapas"] if chapa["acumulado"])
+    assert total == sum(ctx["esperado"].values()), total
+
+
+@caso("importação de eleitores")
+async def _importacao(c, ctx):
+    from bench_importar_eleitores import gerar_planilha
+    conteudo = gerar_planilha(3) + b"2025x;123;CPF errado\n"
+    for importados, ja_cadastrados in ((3, 0), (0, 3)):
+        r = await c.post("/eleicao/importar-eleitores", files={"arquivo": ("eleitores.csv", conteudo, "text/csv")})
+        assert r.status_code == 200, (r.status_code, r.text)
+        relatorio = r.json()
+        assert (relatorio["importados"], relatorio["ja_cadastrados"], relatorio["invalidos"]) == (importados, ja_cadastrados, 1), relatorio
+
+
+@caso("várias eleições e encerramento")
+async def _eleicoes(c, ctx):
+    r = await c.post("/eleicao/eleicoes", json={"nome": "Segundo turno"})
+    assert r.status_code == 201, (r.status_code, r.text)
+    ctx["eleicao"] = eleicao = r.json()["eleicao_id"]
+    r = await c.post("/eleicao/cadastrar-chapa", data={"chapa_nome": "Nova", "eleicao_id": eleicao})
+    assert "message=" in r.headers.get("location", ""), "mesmo nome não aceito em outra eleição"
+    r = await c.get(f"/eleicao/votar?eleicao={eleicao}")
+    chapa_id = int(re.findall(r'<option value="(\d+)">Nova</option>', r.text)[0])
+    # quem votou na primeira eleição vota de novo na segunda
+    r = await c.post("/eleicao/api/votos", json={"matricula": "antigo0", "chapa_id": chapa_id})
+    assert r.json()["aceitos"] == 1, r.json()
+    r = await c.post(f"/eleicao/eleicoes/{eleicao}/encerrar")
+    assert r.status_code == 200, (r.status_code, r.text)
+    r = await c.post("/eleicao/api/votos", json={"matricula": "depois", "chapa_id": chapa_id})
+    assert r.json()["resultados"][0]["status"] == 403, r.json()
+
+
+@caso("arquivamento de eleição encerrada")
+async def _arquivamento(c, ctx):
+    import sqlite3
+    eleicao = ctx["eleicao"]
+    r = await c.post(f"/eleicao/eleicoes/{eleicao}/arquivar")
+    assert r.status_code == 200, (r.status_code, r.text)
+    arquivo = sqlite3.connect(r.json()["arquivo"])
+    try:
+        assert arquivo.execute('SELECT count(*) FROM "Voto"').fetchone()[0] == 1
+    finally:
+        arquivo.close()
+    r = await c.get(f"/eleicao/resultados?eleicao={eleicao}")
+    assert r.status_code == 410, r.status_code
+    r = await c.get("/eleicao/resultados?eleicao=1")
+    assert resultados_da_pagina(r.text) == ctx["esperado"], "arquivar mexeu na outra eleição"
+
+
+async def bateria(nome_banco: str) -> int:
+    import httpx
+    import main
+    from database import engine
+
+    falhas = 0
+    ctx = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://matriz") as c:
+        # o primeiro caso cria o schema: a subida (índice de votos) vem depois dele
+        for indice, (nome, funcao) in enumerate(CASOS):
+            if indice == 1:
+                contexto = main.app.router.lifespan_context(main.app)
+                await contexto.__aenter__()
+            inicio = time.perf_counter()
+            try:
+                await funcao(c, ctx)
+                situacao = "ok"
+            except Exception as erro:
+                falhas += 1
+                situacao = f"FALHA: {type(erro).__name__}: {erro}"
+            print(f"{nome_banco:<9} {(time.perf_counter() - inicio) * 1000:7.1f}ms  {nome}  {situacao}", flush=True)
+        await contexto.__aexit__(None, None, None)
+    await engine.dispose()
+    return falhas
+
+
+def rodar(nome_banco: str, url: str, pasta: str) -> int:
+    ambiente = {
+        **os.environ,
+        "DATABASE_URL": url,
+        "PORT": "8000",
+        "SECRET_KEY": "matriz",
+        "ADMIN_PASSWORD": ADMIN_PASSWORD,
+        "LIMITE_TAXA": "0",
+        "BCRYPT_ROUNDS": "4",
+        "LEDGER_DIR": os.path.join(pasta, f"ledger-{nome_banco}"),
+        "ARQUIVO_DIR": os.path.join(pasta, f"arquivo-{nome_banco}"),
+    }
+    return subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--bateria", nome_banco], cwd=RAIZ, env=ambiente,
+    ).returncode
+
+
+def subir_postgres(pasta: str):
+    from bench_workers import porta_livre
+    pg_bin = os.getenv("PG_BIN")
+    initdb = os.path.join(pg_bin, "initdb") if pg_bin else shutil.which("initdb")
+    if not initdb or not os.path.exists(initdb):
+        raise SystemExit("initdb não encontrado: defina PG_BIN ou use --postgres-servidor")
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        raise SystemExit("o initdb não roda como root: use outro usuário ou --postgres-servidor")
+    pg_ctl = os.path.join(os.path.dirname(initdb), "pg_ctl")
+    dados = os.path.join(pasta, "pgdata")
+    porta = porta_livre()
+    subprocess.run([initdb, "-D", dados, "-U", "postgres", "-A", "trust"], check=True, capture_output=True)
+    # fsync desligado: o banco é descartado no fim
+    subprocess.run([
+        pg_ctl, "-D", dados, "-w", "-l", os.path.join(pasta, "postgres.log"),
+        "-o", f"-p {porta} -k {pasta} -c fsync=off", "start",
+    ], check=True, capture_output=True)
+    return f"postgresql://postgres@127.0.0.1:{porta}", lambda: subprocess.run(
+        [pg_ctl, "-D", dados, "-m", "fast", "-w", "stop"], capture_output=True,
+    )
+
+
+async def banco_postgres(servidor: str, nome: str, criar: bool):
+    import asyncpg
+    conexao = await asyncpg.connect(f"{servidor}/postgres")
+    try:
+        if criar:
+            await conexao.execute(f'CREATE DATABASE "{nome}"')
+        else:
+            await conexao.execute(f'DROP DATABASE IF EXISTS "{nome}" WITH (FORCE)')
+    finally:
+        await conexao.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bancos", nargs="*", choices=("sqlite", "postgres"), default=["sqlite", "postgres"])
+    parser.add_argument("--postgres-servidor", help="servidor já rodando (postgresql://usuario@host:porta); padrão: sobe um temporário")
+    parser.add_argument("--bateria", help=argparse.SUPPRESS)  # processo filho: roda os casos no DATABASE_URL recebido
+    args = parser.parse_args()
+
+    if args.bateria:
+        sys.path.insert(0, RAIZ)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        return 1 if asyncio.run(bateria(args.bateria)) else 0
+
+    resultado = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        if "sqlite" in args.bancos:
+            resultado["sqlite"] = rodar("sqlite", f"sqlite+aiosqlite:///{pasta}/matriz.db", pasta)
+        if "postgres" in args.bancos:
+            servidor, parar = args.postgres_servidor, None
+            if not servidor:
+                servidor, parar = subir_postgres(pasta)
+            nome = f"matriz_{os.getpid()}"
+            try:
+                asyncio.run(banco_postgres(servidor, nome, criar=True))
+                try:
+                    url = servidor.replace("postgresql://", "postgresql+asyncpg://", 1)
+                    resultado["postgres"] = rodar("postgres", f"{url}/{nome}", pasta)
+                finally:
+                    asyncio.run(banco_postgres(servidor, nome, criar=False))
+            finally:
+                if parar:
+                    parar()
+
+    for nome_banco, codigo in resultado.items():
+        print(f"{nome_banco}: {'ok' if codigo == 0 else 'FALHOU'}")
+    return 0 if all(codigo == 0 for codigo in resultado.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
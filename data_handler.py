@@ -1,7 +1,16 @@
-import pandas as pd
+import re
+import unicodedata
+from typing import Iterator, TYPE_CHECKING
+
 from fastapi import UploadFile
 
-def importar_excel(uploaded_file: UploadFile) -> pd.DataFrame:
+# pandas (e numpy) só são importados na primeira importação de planilha: custam ~0.35s
+# e dezenas de MB em cada worker, que não precisa deles para receber votos
+if TYPE_CHECKING:
+    import pandas as pd
+
+def importar_excel(uploaded_file: UploadFile) -> "pd.DataFrame":
+    import pandas as pd
     nome_arquivo = uploaded_file.filename.lower()
     dtype = {"CPF": str}  # Força leitura da coluna CPF como string
 
@@ -11,3 +20,73 @@ def importar_excel(uploaded_file: UploadFile) -> pd.DataFrame:
         df = pd.read_excel(uploaded_file.file, engine="openpyxl", skiprows=1, dtype=dtype)
     else:
         raise ValueError("Formato não suportado: use .xls ou .xlsx")
+    return df
+
+
+# nomes de coluna aceitos (sem acento, minúsculos) para cada campo do eleitor
+COLUNAS_ELEITOR = {
+    "matricula": ("matricula",),
+    "cpf": ("cpf",),
+    "nome": ("nome", "estudante", "aluno", "nome do aluno"),
+}
+
+
+def _normalizar(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode()
+    return texto.strip().lower()
+
+
+def _mapear_colunas(colunas) -> dict:
+    normalizadas = {_normalizar(coluna): coluna for coluna in colunas}
+    mapa = {}
+    for campo, nomes in COLUNAS_ELEITOR.items():
+        for nome in nomes:
+            if nome in normalizadas:
+                mapa[campo] = normalizadas[nome]
+                break
+        else:
+            raise ValueError(f"Coluna obrigatória não encontrada: {campo}")
+    return mapa
+
+
+def ler_eleitores(uploaded_file: UploadFile, tamanho_bloco: int) -> Iterator[list[tuple[int, str, str, str]]]:
+    """
+    Lê a planilha de eleitores em blocos de (linha, matricula, cpf, nome), já como texto.
+    CSV é lido em pedaços (chunksize); .xls/.xlsx são lidos inteiros pelo pandas e fatiados.
+    """
+    import pandas as pd
+    nome_arquivo = uploaded_file.filename.lower()
+    if nome_arquivo.endswith(".csv"):
+        blocos = pd.read_csv(uploaded_file.file, dtype=str, chunksize=tamanho_bloco, sep=None, engine="python")
+        primeira_linha = 2  # linha 1 é o cabeçalho
+    else:
+        df = importar_excel(uploaded_file)
+        blocos = (df.iloc[i:i + tamanho_bloco] for i in range(0, len(df), tamanho_bloco))
+        primeira_linha = 3  # título + cabeçalho (skiprows=1)
+
+    mapa = None
+    linha = primeira_linha
+    for bloco in blocos:
+        if mapa is None:
+            mapa = _mapear_colunas(bloco.columns)
+        registros = []
+        for matricula, cpf, nome in zip(bloco[mapa["matricula"]], bloco[mapa["cpf"]], bloco[mapa["nome"]]):
+            registros.append((linha, _texto(matricula), _cpf(cpf), _texto(nome)))
+            linha += 1
+        yield registros
+
+
+def _texto(valor) -> str:
+    # NaN do pandas é o único valor diferente de si mesmo
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))  # coluna numérica no Excel: 20231.0 -> "20231"
+    return str(valor).strip()
+
+
+def _cpf(valor) -> str:
+    digitos = re.sub(r"\D", "", _texto(valor))
+    if isinstance(valor, (int, float)) and digitos:
+        digitos = digitos.zfill(11)  # CPF numérico perde os zeros à esquerda
+    return digitos
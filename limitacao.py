@@ -0,0 +1,172 @@
+# limitacao.py
+"""
+Limite de taxa e controle de admissão, em memória (por processo).
+
+- LimitadorTaxa: token bucket por chave (IP ou usuário), com um LRU limitado de baldes.
+  Chamado no começo das rotas, antes do bcrypt / do INSERT.
+- AdmissaoMiddleware: limite de requisições simultâneas por classe de rota; acima dele
+  responde 429 com Retry-After sem nem ler o corpo. Login e exportação têm limites próprios,
+  então uma enxurrada de logins não ocupa as vagas dos votos.
+
+Com --workers N cada processo tem os seus baldes, com 1/N da rajada e da reposição configuradas:
+somados, os processos nunca aceitam mais que o limite (um cliente que cai sempre no mesmo
+processo é recusado antes). O controle de admissão protege o próprio processo e não é dividido.
+"""
+import os
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+
+from metricas import Contador
+from database import WORKERS
+
+LIMITE_BALDES_MAX = int(os.getenv("LIMITE_BALDES_MAX", "10000"))
+LIMITE_TAXA = os.getenv("LIMITE_TAXA", "1") == "1"
+
+
+def _regra(variavel: str, padrao: str) -> tuple[float, float]:
+    # "5/60" = rajada de até 5 requisições, repostas à razão de 5 a cada 60 segundos
+    quantidade, periodo = os.getenv(variavel, padrao).split("/")
+    return float(quantidade), float(periodo)
+
+
+limite_recusas_total = Contador(
+    "limite_recusas_total", "Requisições recusadas com 429, por limite", ("limite",),
+)
+
+
+class LimitadorTaxa:
+    def __init__(self, nome: str, capacidade: float, periodo: float, maximo_baldes: int = LIMITE_BALDES_MAX,
+                 processos: int = WORKERS):
+        self.nome = nome
+        # cada worker fica com a sua parte; a rajada mínima é 1, senão nada passaria
+        self.capacidade = max(1.0, capacidade / processos)
+        self.taxa = capacidade / periodo / processos  # fichas por segundo
+        self.maximo_baldes = maximo_baldes
+        # chave -> [fichas, instante da última reposição]; o balde despejado pelo LRU é o
+        # parado há mais tempo, que provavelmente já estaria cheio de novo
+        self._baldes: OrderedDict = OrderedDict()
+
+    def consumir(self, chave, custo: float = 1, cobrar: bool = True) -> float:
+        """
+        Retorna 0 se liberou, senão quantos segundos faltam para haver fichas.
+        Com cobrar=False só consulta: o balde é reposto, mas as fichas não são gastas.
+        """
+        agora = time.monotonic()
+        balde = self._baldes.get(chave)
+        if balde is None:
+            balde = self._baldes[chave] = [self.capacidade, agora]
+            if len(self._baldes) > self.maximo_baldes:
+                self._baldes.popitem(last=False)
+        else:
+            self._baldes.move_to_end(chave)
+            balde[0] = min(self.capacidade, balde[0] + (agora - balde[1]) * self.taxa)
+            balde[1] = agora
+        if balde[0] >= custo:
+            if cobrar:
+                balde[0] -= custo
+            return 0.0
+        return (custo - balde[0]) / self.taxa
+
+    def exigir(self, chave, custo: float = 1, cobrar: bool = True):
+        if not LIMITE_TAXA:
+            return
+        if custo > self.capacidade:
+            # nunca caberia no balde: esperar não adianta, o cliente tem de dividir o envio
+            limite_recusas_total.inc(self.nome)
+            raise HTTPException(
+                status_code=413,
+                detail=f"Envie no máximo {int(self.capacidade)} de cada vez.",
+            )
+        espera = self.consumir(chave, custo, cobrar)
+        if espera:
+            limite_recusas_total.inc(self.nome)
+            raise HTTPException(
+                status_code=429,
+                detail="Muitas tentativas. Aguarde e tente novamente.",
+                headers={"Retry-After": str(math.ceil(espera))},
+            )
+
+    def estatisticas(self) -> dict:
+        return {"baldes": len(self._baldes), "maximo": self.maximo_baldes}
+
+
+def ip_cliente(request: Request) -> str:
+    # atrás de proxy, o uvicorn já troca pelo X-Forwarded-For (--forwarded-allow-ips)
+    return request.client.host if request.client else "desconhecido"
+
+
+# vários terminais de uma escola saem pelo mesmo IP: o limite por IP é folgado,
+# o por (IP, usuário) é que segura tentativa de senha; só senha errada gasta ficha
+limite_login_ip = LimitadorTaxa("login_ip", *_regra("LIMITE_LOGIN_IP", "60/60"))
+limite_login_usuario = LimitadorTaxa("login_usuario", *_regra("LIMITE_LOGIN_USUARIO", "10/60"))
+limite_registro_ip = LimitadorTaxa("registro_ip", *_regra("LIMITE_REGISTRO_IP", "10/60"))
+# um mesário vota no máximo a cada poucos segundos; a rajada cobre o envio da fila offline pela API
+limite_votos_usuario = LimitadorTaxa("votos_usuario", *_regra("LIMITE_VOTOS_USUARIO", "120/60"))
+
+
+# (método, caminho) -> classe de admissão; rotas fora daqui só contam no limite global
+CLASSES_ROTA = {
+    ("POST", "/auth/login"): "auth",
+    ("POST", "/auth/register"): "auth",
+    ("POST", "/eleicao/votar"): "votos",
+    ("POST", "/eleicao/api/votos"): "votos",
+    ("GET", "/eleicao/exportar-resultados"): "pesada",
+    ("POST", "/eleicao/importar-eleitores"): "pesada",
+    ("POST", "/eleicao/backup"): "pesada",
+}
+# conexões longas (SSE) e rotas de observação não ocupam vaga
+ISENTAS = ("/eleicao/resultados/stream", "/metrics", "/static/")
+
+CONCORRENCIA_MAX = int(os.getenv("CONCORRENCIA_MAX", "256"))
+CONCORRENCIA_CLASSES = {
+    "auth": int(os.getenv("CONCORRENCIA_AUTH", "16")),
+    "votos": int(os.getenv("CONCORRENCIA_VOTOS", "128")),
+    "pesada": int(os.getenv("CONCORRENCIA_PESADA", "4")),
+}
+
+
+class AdmissaoMiddleware:
+    """Middleware ASGI: recusa com 429 quando já há requisições demais em andamento."""
+
+    def __init__(self, app, maximo: int = CONCORRENCIA_MAX, classes: dict = None):
+        self.app = app
+        self.maximo = maximo
+        self.limites = classes if classes is not None else CONCORRENCIA_CLASSES
+        self.em_andamento = 0
+        self.por_classe = {classe: 0 for classe in self.limites}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(ISENTAS):
+            return await self.app(scope, receive, send)
+
+        classe = CLASSES_ROTA.get((scope["method"], scope["path"]))
+        if self.em_andamento >= self.maximo or (classe and self.por_classe[classe] >= self.limites[classe]):
+            limite_recusas_total.inc(f"concorrencia_{classe or 'global'}")
+            return await self._recusar(send)
+
+        # sem await entre o teste e o incremento: o event loop não intercala outra requisição aqui
+        self.em_andamento += 1
+        if classe:
+            self.por_classe[classe] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.em_andamento -= 1
+            if classe:
+                self.por_classe[classe] -= 1
+
+    async def _recusar(self, send):
+        corpo = '{"detail":"Servidor ocupado. Tente novamente em instantes."}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(corpo)).encode()),
+                (b"retry-after", b"1"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": corpo})
@@ -1,23 +1,165 @@
 import uvicorn
 import argparse
 import asyncio
+import sys
+import time
+import hmac
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request 
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
-from fastapi.templating import Jinja2Templates
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import HTMLResponse, PlainTextResponse
 
-from database import create_tables
+from sqlalchemy.exc import OperationalError
+
+from database import create_tables, AsyncSessionLocal, MULTIPROCESSO, engine
 from auth.auth_routes import router as auth_router
 from votacao.votacao_router import router as votacao_router
+from votacao.fila_votos import fila_votos, FILA_VOTOS
+from votacao.indice_votos import indice_votos
+from limitacao import AdmissaoMiddleware, ip_cliente
+from assets import StaticPrecomprimido, CompressaoMiddleware, construir_assets, templates
+from metricas import MetricasMiddleware, METRICAS_TOKEN, exportar as exportar_metricas
+from perfilamento import PerfilMiddleware, SQL_POR_REQUISICAO, PERFIL_TOKEN, instrumentar, ler_perfil
+from votacao.votacao_handler import EXIGIR_ELEITOR
+from votacao.coordenacao import VigiaVersoes
+from votacao.ledger import ledger, LEDGER, LEDGER_DIR
+from backup import agendador_backup
+from votacao.replicacao import replicador, MODO_REPLICA, SomenteLeituraMiddleware, verificar_dialeto
 import os
 from dotenv import load_dotenv
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # feed de réplicas (rowid) só no SQLite: recusa subir em vez de falhar a cada consulta
+    verificar_dialeto()
+    if MODO_REPLICA:
+        # réplica: só acompanha o primário; votos, fila, ledger e cópias ficam com ele
+        await replicador.iniciar()
+        yield
+        await replicador.parar()
+        return
+    # índice em memória de quem já votou; se o banco ainda não existe, os votos vão direto ao banco
+    try:
+        await indice_votos.reconstruir(AsyncSessionLocal, EXIGIR_ELEITOR)
+    except OperationalError as e:
+        print(f"índice de votos não carregado: {e.orig}")
+    # com --workers N, cada processo acompanha as mudanças feitas pelos outros
+    vigia = VigiaVersoes(exigir_eleitor=EXIGIR_ELEITOR)
+    if MULTIPROCESSO:
+        await vigia.iniciar()
+    if FILA_VOTOS:
+        fila_votos.iniciar()
+    # cada processo grava o seu segmento do registro de votos (ver --verificar-ledger)
+    if LEDGER:
+        ledger.abrir()
+    # cópias automáticas do banco a cada BACKUP_INTERVALO minutos (0 = desligado)
+    agendador_backup.iniciar()
+    yield
+    await agendador_backup.parar()
+    await fila_votos.parar()
+    ledger.fechar()
+    await vigia.parar()
+
+COMPRESSAO_MINIMO = int(os.getenv("COMPRESSAO_MINIMO", "1000"))  # bytes
+
+app = FastAPI(lifespan=lifespan)
+# HTML/JSON dinâmicos acima do limite saem comprimidos; o SSE, o xlsx e os estáticos de
+# static/dist/ (já pré-comprimidos) passam direto
+app.add_middleware(CompressaoMiddleware, minimum_size=COMPRESSAO_MINIMO, compresslevel=6)
+# a admissão fica por dentro das métricas, para os 429 também aparecerem em /metrics
+app.add_middleware(AdmissaoMiddleware)
+if MODO_REPLICA:
+    app.add_middleware(SomenteLeituraMiddleware)
+# consultas SQL por requisição e perfil sob demanda; desligados, nem os eventos do engine ficam registrados
+if SQL_POR_REQUISICAO or PERFIL_TOKEN:
+    instrumentar(engine)
+    app.add_middleware(PerfilMiddleware)
+app.add_middleware(MetricasMiddleware)
 
 async def initialize_db(create_db: bool): # verifica se a db existe
     if create_db:
         await create_tables()
+        await migrar_db()
+
+async def arquivar_eleicao_db(eleicao_id: int) -> bool: # move uma eleição encerrada para ARQUIVO_DIR
+    from votacao.arquivamento import arquivar_eleicao, ArquivamentoIndisponivel
+    try:
+        arquivo = await arquivar_eleicao(eleicao_id)
+    except ArquivamentoIndisponivel as e:
+        print(e)
+        return False
+    print(
+        f"eleição {eleicao_id} arquivada em {arquivo['arquivo']}: {arquivo['chapas']} chapas, "
+        f"{arquivo['votos']} votos, {arquivo['bytes']} bytes em {arquivo['segundos']}s"
+    )
+    return True
+
+async def migrar_db(): # aplica as migrações pendentes de migracoes.py
+    from migracoes import migrar
+    aplicadas = await migrar()
+    if aplicadas:
+        print(f"migrações aplicadas: {', '.join(aplicadas)}")
+    else:
+        print("banco já está atualizado")
+
+async def reconciliar_contagem_db(): # reconstrói a contagem por chapa a partir dos votos
+    from votacao.votacao_handler import reconciliar_contagem
+    async with AsyncSessionLocal() as db:
+        contagens = await reconciliar_contagem(db)
+    for chapa_id, chapa_nome, votos in contagens:
+        print(f"{chapa_id} - {chapa_nome}: {votos} votos")
+    print("contagem reconciliada com sucesso")
+
+async def verificar_ledger_db() -> bool: # confere o registro de votos com a contagem do banco
+    from votacao.ledger import verificar_pasta
+    from votacao.votacao_handler import listar_contagens
+    from votacao.arquivamento import contagens_arquivadas
+    from sqlalchemy.future import select
+    from models import Eleicao, Chapa
+    async with AsyncSessionLocal() as db:
+        contagens = list(await listar_contagens(db))
+        eleicao_da_chapa = dict((await db.execute(select(Chapa.chapa_id, Chapa.eleicao_id))).all())
+        arquivos = (await db.execute(select(Eleicao.arquivo).where(Eleicao.arquivo.is_not(None)))).scalars().all()
+    # votos de eleições arquivadas continuam no ledger: a contagem vem do arquivo de cada uma
+    for chapa_id, chapa_nome, votos, eleicao_id in contagens_arquivadas(arquivos):
+        contagens.append((chapa_id, chapa_nome, votos))
+        eleicao_da_chapa[chapa_id] = eleicao_id
+    # a mesma matrícula pode votar uma vez em cada eleição
+    inicio = time.perf_counter()
+    verificacao = await asyncio.to_thread(verificar_pasta, LEDGER_DIR, eleicao_da_chapa)
+    duracao = time.perf_counter() - inicio
+
+    ok = True
+    for segmento in verificacao["segmentos"]:
+        print(
+            f"{segmento['segmento']}: {segmento['votos']} votos, {segmento['checkpoints']} checkpoints, "
+            f"última raiz {segmento['ultima_raiz'] or '-'}"
+        )
+        if segmento["sem_checkpoint"]:
+            print(f"  {segmento['sem_checkpoint']} votos depois do último checkpoint")
+        for problema in segmento["problemas"]:
+            print(f"  PROBLEMA: {problema}")
+            ok = False
+    totais = verificacao["totais"]
+    for chapa_id, chapa_nome, votos in contagens:
+        no_ledger = totais.pop(chapa_id, 0)
+        marca = "" if no_ledger == votos else "  <- DIVERGENTE"
+        ok = ok and no_ledger == votos
+        print(f"{chapa_id} - {chapa_nome}: banco {votos}, ledger {no_ledger}{marca}")
+    for chapa_id, no_ledger in totais.items():
+        print(f"{chapa_id} - (chapa fora do banco): ledger {no_ledger}  <- DIVERGENTE")
+        ok = False
+    print(f"{verificacao['votos']} votos verificados em {duracao:.2f}s")
+    print("ledger confere com o banco" if ok else "ledger DIVERGE do banco")
+    return ok
+
+def imprimir_verificacao_backup(verificacao: dict) -> bool:
+    for chapa in verificacao["contagens"]:
+        print(f"{chapa['chapa_id']} - {chapa['chapa_nome']}: contagem {chapa['contagem']}, votos {chapa['votos']}")
+    for problema in verificacao["problemas"]:
+        print(f"PROBLEMA: {problema}")
+    print(f"{verificacao['total']} votos; " + ("cópia íntegra" if not verificacao["problemas"] else "cópia COM PROBLEMAS"))
+    return not verificacao["problemas"]
 
 PORT = int(os.getenv("PORT"))
 HOST = os.getenv("HOST")
@@ -25,8 +167,27 @@ HOST = os.getenv("HOST")
 app.include_router(auth_router, prefix="/auth")
 app.include_router(votacao_router, prefix="/eleicao")
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+app.mount("/static", StaticPrecomprimido(directory="static"), name="static")
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(request: Request):
+    # tráfego por rota e tempos do caminho do voto não são públicos num servidor de votação
+    if METRICAS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), f"Bearer {METRICAS_TOKEN}".encode()):
+            raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    elif ip_cliente(request) not in ("127.0.0.1", "::1"):
+        raise HTTPException(status_code=403, detail="Defina METRICAS_TOKEN para ler /metrics de outra máquina")
+    return PlainTextResponse(exportar_metricas(), media_type="text/plain; version=0.0.4")
+
+@app.get("/perfis/{nome}", response_class=PlainTextResponse, include_in_schema=False)
+async def perfil(request: Request, nome: str, formato: str = "folded"):
+    # nome vem do cabeçalho X-Perfil da requisição perfilada; formato=sql traz os statements
+    if not PERFIL_TOKEN or request.headers.get("Authorization") != f"Bearer {PERFIL_TOKEN}":
+        raise HTTPException(status_code=401, detail="Token de perfil inválido")
+    conteudo = ler_perfil(nome, ".sql" if formato == "sql" else ".folded")
+    if conteudo is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return PlainTextResponse(conteudo)
 
 @app.get("/", response_class=HTMLResponse)
 async def home_page(request: Request):
@@ -44,11 +205,100 @@ if __name__ == "__main__":
         action="store_true",
         help="Cria o banco de dados e as tabelas necessárias."
     )
+    parser.add_argument(
+        "--migrar",
+        action="store_true",
+        help="Aplica as migrações pendentes do schema (tabelas e índices novos)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Número de processos do servidor (use até o número de núcleos)."
+    )
+    parser.add_argument(
+        "--reconciliar-contagem",
+        action="store_true",
+        help="Reconstrói a contagem de votos por chapa a partir da tabela Voto."
+    )
+    parser.add_argument(
+        "--construir-assets",
+        action="store_true",
+        help="Gera static/dist/ (arquivos com hash no nome e versões .gz/.br). O --run-server já faz isso."
+    )
+    parser.add_argument(
+        "--backup",
+        action="store_true",
+        help="Faz uma cópia online do banco SQLite em BACKUP_DIR (pode rodar com o servidor no ar)."
+    )
+    parser.add_argument(
+        "--verificar-backup",
+        metavar="ARQUIVO",
+        help="Confere a integridade de uma cópia e a contagem por chapa contra os votos."
+    )
+    parser.add_argument(
+        "--restaurar-backup",
+        metavar="ARQUIVO",
+        help="Verifica a cópia e a grava por cima do banco (com o servidor parado)."
+    )
+    parser.add_argument(
+        "--arquivar-eleicao",
+        type=int,
+        metavar="ID",
+        help="Move chapas e votos de uma eleição encerrada para ARQUIVO_DIR/eleicao-<id>.db."
+    )
+    parser.add_argument(
+        "--verificar-ledger",
+        action="store_true",
+        help="Verifica a cadeia de hashes do registro de votos e compara os totais com o banco."
+    )
     args = parser.parse_args()
 
     if args.create_db:
         asyncio.run(initialize_db(args.create_db))
 
+    if args.migrar:
+        asyncio.run(migrar_db())
+
+    if args.reconciliar_contagem:
+        asyncio.run(reconciliar_contagem_db())
+
+    if args.backup:
+        from backup import fazer_backup
+        copia = asyncio.run(fazer_backup())
+        print(f"cópia gravada em {copia['arquivo']} ({copia['bytes']} bytes, {copia['passos']} passos, {copia['segundos']}s)")
+
+    if args.verificar_backup:
+        from backup import verificar_backup
+        sys.exit(0 if imprimir_verificacao_backup(verificar_backup(args.verificar_backup)) else 1)
+
+    if args.restaurar_backup:
+        from backup import restaurar_backup, BackupIndisponivel
+        try:
+            imprimir_verificacao_backup(restaurar_backup(args.restaurar_backup))
+        except BackupIndisponivel as e:
+            print(e)
+            sys.exit(1)
+        print("banco restaurado; suba o servidor de novo (o índice de votos é recarregado na subida)")
+
+    if args.arquivar_eleicao is not None:
+        sys.exit(0 if asyncio.run(arquivar_eleicao_db(args.arquivar_eleicao)) else 1)
+
+    if args.verificar_ledger:
+        sys.exit(0 if asyncio.run(verificar_ledger_db()) else 1)
+
+    if args.construir_assets or args.run_server:
+        # antes de subir os workers: cada um lê o manifesto uma vez
+        manifesto = construir_assets()
+        print(f"assets: {len(manifesto)} arquivos em static/dist/")
+
     if args.run_server:
-        uvicorn.run("main:app", host=HOST, port=PORT, log_level="info")
+        # os workers herdam o ambiente: é assim que sabem que há outros processos
+        os.environ["WORKERS"] = str(args.workers)
+        # as conexões de /eleicao/resultados/stream nunca terminam sozinhas: sem o limite,
+        # parar ou reiniciar os workers ficaria esperando os telões fecharem
+        uvicorn.run(
+            "main:app", host=HOST, port=PORT, log_level="info",
+            workers=args.workers, timeout_graceful_shutdown=5,
+        )
     
\ No newline at end of file
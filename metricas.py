@@ -0,0 +1,163 @@
+# metricas.py
+"""
+Métricas no formato texto do Prometheus, sem dependência externa.
+Contadores e histogramas ficam em dicts por combinação de labels; registrar
+uma observação custa um bisect e duas somas, barato o bastante para ficar ligado.
+"""
+import os
+import time
+from bisect import bisect_left
+
+# limites em segundos; a última faixa (+Inf) é implícita
+BUCKETS_REQUISICAO = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_ETAPA = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# se definido, /metrics exige "Authorization: Bearer <METRICAS_TOKEN>"; sem ele, só responde
+# a quem conecta pela própria máquina (Prometheus local ou túnel SSH)
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN")
+
+_registro = []
+
+
+def _formatar_labels(nomes, valores, extra: str = "") -> str:
+    pares = [f'{nome}="{str(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class Contador:
+    def __init__(self, nome: str, ajuda: str, labels: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.labels = labels
+        self.valores: dict[tuple, float] = {}
+        _registro.append(self)
+
+    def inc(self, *valores_labels, quantidade: float = 1):
+        self.valores[valores_labels] = self.valores.get(valores_labels, 0) + quantidade
+
+    def exportar(self) -> list[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        for valores_labels, valor in self.valores.items():
+            linhas.append(f"{self.nome}{_formatar_labels(self.labels, valores_labels)} {valor}")
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome: str, ajuda: str, labels: tuple = (), buckets: tuple = BUCKETS_ETAPA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [contagem por faixa (não acumulada), soma, total]
+        self.series: dict[tuple, list] = {}
+        _registro.append(self)
+
+    def observar(self, valor: float, *valores_labels):
+        serie = self.series.get(valores_labels)
+        if serie is None:
+            serie = self.series[valores_labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        serie[0][bisect_left(self.buckets, valor)] += 1
+        serie[1] += valor
+        serie[2] += 1
+
+    def medir(self, *valores_labels) -> "Cronometro":
+        return Cronometro(self, valores_labels)
+
+    def exportar(self) -> list[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        for valores_labels, (faixas, soma, total) in self.series.items():
+            acumulado = 0
+            for limite, quantidade in zip(self.buckets + (float("inf"),), faixas):
+                acumulado += quantidade
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                labels = _formatar_labels(self.labels, valores_labels, f'le="{le}"')
+                linhas.append(f"{self.nome}_bucket{labels} {acumulado}")
+            labels = _formatar_labels(self.labels, valores_labels)
+            linhas.append(f"{self.nome}_sum{labels} {soma}")
+            linhas.append(f"{self.nome}_count{labels} {total}")
+        return linhas
+
+
+class Cronometro:
+    """`with histograma.medir("etapa"):` observa a duração do bloco."""
+    __slots__ = ("histograma", "valores_labels", "inicio")
+
+    def __init__(self, histograma: Histograma, valores_labels: tuple):
+        self.histograma = histograma
+        self.valores_labels = valores_labels
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histograma.observar(time.perf_counter() - self.inicio, *self.valores_labels)
+
+
+def exportar() -> str:
+    linhas = []
+    for metrica in _registro:
+        linhas.extend(metrica.exportar())
+    return "\n".join(linhas) + "\n"
+
+
+requisicoes_segundos = Histograma(
+    "http_requisicao_segundos", "Latência das requisições por rota (até o fim da resposta)",
+    ("metodo", "rota", "status"), BUCKETS_REQUISICAO,
+)
+auth_etapa_segundos = Histograma(
+    "auth_etapa_segundos", "Duração das etapas da autenticação", ("etapa",),
+)
+voto_etapa_segundos = Histograma(
+    "voto_etapa_segundos", "Duração das etapas do registro de votos", ("etapa",),
+)
+render_segundos = Histograma(
+    "template_render_segundos", "Tempo de renderização dos templates Jinja", ("template",),
+)
+pool_espera_segundos = Histograma(
+    "db_pool_espera_segundos", "Espera na fila por uma conexão livre no pool do banco (sem a abertura de conexões novas)",
+)
+sqlite_bloqueios_total = Contador(
+    "sqlite_bloqueios_total", "Erros 'database is locked'/'busy' devolvidos pelo SQLite",
+)
+votos_gravados_total = Contador(
+    "votos_gravados_total", "Votos confirmados (commit feito)",
+)
+votos_recusados_total = Contador(
+    "votos_recusados_total", "Votos recusados, por código de resposta", ("status",),
+)
+
+
+def rota_da_requisicao(scope) -> str:
+    # o router do FastAPI grava a rota encontrada no scope; path cru geraria labels sem fim
+    rota = scope.get("route")
+    return getattr(rota, "path", None) or ("/static" if scope["path"].startswith("/static/") else "desconhecida")
+
+
+class MetricasMiddleware:
+    """Middleware ASGI: mede cada requisição HTTP com a rota (template do path) como label."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        status_resposta = 500
+
+        async def send_medido(mensagem):
+            nonlocal status_resposta
+            if mensagem["type"] == "http.response.start":
+                status_resposta = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, send_medido)
+        finally:
+            requisicoes_segundos.observar(
+                time.perf_counter() - inicio, scope["method"], rota_da_requisicao(scope), status_resposta
+            )
@@ -0,0 +1,139 @@
+# migracoes.py
+"""
+Migrações do schema, aplicadas em ordem com `python main.py --migrar`.
+Cada uma roda uma vez por banco (registrada na tabela Migracao) e é escrita para
+funcionar tanto no SQLite quanto no PostgreSQL. Para mudar o schema, acrescente
+uma nova no fim da lista; não edite as que já foram aplicadas.
+"""
+from datetime import datetime
+
+from sqlalchemy import text, insert, inspect, func
+from sqlalchemy.future import select
+
+from database import engine
+from models import Base, Migracao, VotosPorMinuto, Eleicao, Voto, Chapa, ContagemChapa
+
+
+def _criar_tabelas_novas(conn):
+    # ContagemChapa, Eleitor e Versao em bancos criados antes delas (create_all só cria o que falta)
+    Base.metadata.create_all(conn)
+
+
+def _indice_voto_chapa(conn):
+    # contagem por chapa, reconciliação e o JOIN da exportação filtram por Voto.chapa_id
+    conn.execute(text('CREATE INDEX IF NOT EXISTS "ix_Voto_chapa_id" ON "Voto" (chapa_id)'))
+
+
+def _participacao_por_minuto(conn):
+    # consultas por período em Voto.horario e a tabela VotosPorMinuto preenchida com os votos já gravados
+    from votacao.participacao import reconstruir_minutos
+    conn.execute(text('CREATE INDEX IF NOT EXISTS "ix_Voto_horario" ON "Voto" (horario)'))
+    VotosPorMinuto.__table__.create(conn, checkfirst=True)
+    reconstruir_minutos(conn)
+
+
+def _varias_eleicoes(conn):
+    # Eleicao, Chapa.eleicao_id e a PK de Voto de matricula para (eleicao_id, matricula).
+    # O que já estava no banco vira a primeira eleição; num banco novo ela é criada vazia
+    Eleicao.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(Eleicao.eleicao_id).limit(1)).first() is None:
+        # sem id explícito: no PostgreSQL a sequência do serial precisa andar junto
+        conn.execute(insert(Eleicao).values(nome="Eleição", criada_em=datetime.now()))
+    primeira = conn.execute(select(func.min(Eleicao.eleicao_id))).scalar()
+
+    def colunas(tabela):
+        return {coluna["name"] for coluna in inspect(conn).get_columns(tabela)}
+
+    if "eleicao_id" not in colunas("Chapa"):
+        conn.execute(text('ALTER TABLE "Chapa" ADD COLUMN eleicao_id INTEGER REFERENCES "Eleicao" (eleicao_id)'))
+        conn.execute(text('UPDATE "Chapa" SET eleicao_id = :eleicao'), {"eleicao": primeira})
+        conn.execute(text('CREATE INDEX IF NOT EXISTS "ix_Chapa_eleicao_id" ON "Chapa" (eleicao_id)'))
+        if conn.dialect.name == "postgresql":
+            conn.execute(text('ALTER TABLE "Chapa" ALTER COLUMN eleicao_id SET NOT NULL'))
+
+    # os índices de 002/003 dão lugar aos compostos, que começam pela eleição
+    conn.execute(text('DROP INDEX IF EXISTS "ix_Voto_chapa_id"'))
+    conn.execute(text('DROP INDEX IF EXISTS "ix_Voto_horario"'))
+    if "eleicao_id" not in colunas("Voto"):
+        if conn.dialect.name == "postgresql":
+            conn.execute(text('ALTER TABLE "Voto" ADD COLUMN eleicao_id INTEGER REFERENCES "Eleicao" (eleicao_id)'))
+            conn.execute(text('UPDATE "Voto" SET eleicao_id = :eleicao'), {"eleicao": primeira})
+            conn.execute(text('ALTER TABLE "Voto" ALTER COLUMN eleicao_id SET NOT NULL'))
+            conn.execute(text('ALTER TABLE "Voto" DROP CONSTRAINT "Voto_pkey"'))
+            conn.execute(text('ALTER TABLE "Voto" ADD PRIMARY KEY (eleicao_id, matricula)'))
+        else:
+            # o SQLite não troca a PK de uma tabela: recria Voto e copia os votos,
+            # mantendo o rowid (é a posição das réplicas no feed de alterações)
+            conn.execute(text('ALTER TABLE "Voto" RENAME TO "Voto_antigo"'))
+            Voto.__table__.create(conn)
+            conn.execute(text(
+                'INSERT INTO "Voto" (rowid, eleicao_id, matricula, horario, chapa_id) '
+                'SELECT rowid, :eleicao, matricula, horario, chapa_id FROM "Voto_antigo"'
+            ), {"eleicao": primeira})
+            conn.execute(text('DROP TABLE "Voto_antigo"'))
+    for indice in Voto.__table__.indexes:
+        indice.create(conn, checkfirst=True)
+
+
+def _preencher_contagem(conn):
+    # a 001 cria ContagemChapa vazia em bancos antigos: sem isto os resultados mostram 0
+    # até alguém rodar --reconciliar-contagem. Só entram as chapas sem linha de contagem
+    conn.execute(insert(ContagemChapa).from_select(
+        ["chapa_id", "total_votos"],
+        select(Chapa.chapa_id, func.count(Voto.matricula))
+        .outerjoin(Voto, (Voto.eleicao_id == Chapa.eleicao_id) & (Voto.chapa_id == Chapa.chapa_id))
+        .where(~select(ContagemChapa.chapa_id).where(ContagemChapa.chapa_id == Chapa.chapa_id).exists())
+        .group_by(Chapa.chapa_id)
+    ))
+
+
+def _versao_usuarios(conn):
+    # toda escrita em User (pelo sistema ou direto no banco) incrementa Versao "usuarios":
+    # os outros workers limpam o cache de usuários em vez de esperar USER_CACHE_TTL
+    if conn.dialect.name == "postgresql":
+        conn.execute(text(
+            'CREATE OR REPLACE FUNCTION versao_usuarios() RETURNS trigger AS $$ BEGIN '
+            'INSERT INTO "Versao" (nome, valor) VALUES (\'usuarios\', 1) '
+            'ON CONFLICT (nome) DO UPDATE SET valor = "Versao".valor + 1; RETURN NULL; END $$ LANGUAGE plpgsql'
+        ))
+        conn.execute(text('DROP TRIGGER IF EXISTS "User_versao" ON "User"'))
+        conn.execute(text(
+            'CREATE TRIGGER "User_versao" AFTER INSERT OR UPDATE OR DELETE ON "User" '
+            'FOR EACH STATEMENT EXECUTE FUNCTION versao_usuarios()'
+        ))
+    else:
+        for evento in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(text(
+                f'CREATE TRIGGER IF NOT EXISTS "User_versao_{evento.lower()}" AFTER {evento} ON "User" BEGIN '
+                'INSERT INTO "Versao" (nome, valor) VALUES (\'usuarios\', 1) '
+                'ON CONFLICT (nome) DO UPDATE SET valor = valor + 1; END'
+            ))
+
+
+MIGRACOES = [
+    ("001", "tabelas novas em bancos antigos", _criar_tabelas_novas),
+    ("002", "índice em Voto.chapa_id", _indice_voto_chapa),
+    ("003", "índice em Voto.horario e VotosPorMinuto", _participacao_por_minuto),
+    ("004", "Eleicao e votos/chapas por eleição", _varias_eleicoes),
+    ("005", "ContagemChapa preenchida a partir de Voto", _preencher_contagem),
+    ("006", "Versao \"usuarios\" incrementada por trigger em User", _versao_usuarios),
+]
+
+
+async def migrar(engine=engine) -> list[str]:
+    """Aplica as migrações pendentes, cada uma na sua transação. Retorna os ids aplicados."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Migracao.__table__.create, checkfirst=True)
+        aplicadas = set((await conn.execute(select(Migracao.id))).scalars())
+
+    novas = []
+    for id_migracao, descricao, funcao in MIGRACOES:
+        if id_migracao in aplicadas:
+            continue
+        async with engine.begin() as conn:
+            await conn.run_sync(funcao)
+            await conn.execute(insert(Migracao).values(
+                id=id_migracao, descricao=descricao, aplicada_em=datetime.now()
+            ))
+        novas.append(id_migracao)
+    return novas
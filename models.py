@@ -1,4 +1,5 @@
-from sqlalchemy import String,Integer,ForeignKey,DateTime,Boolean
+from typing import Optional
+from sqlalchemy import String,Integer,ForeignKey,DateTime,Boolean,Index
 from sqlalchemy.orm import Mapped, mapped_column,relationship, DeclarativeBase
 from sqlalchemy.ext.asyncio import AsyncAttrs
 from datetime import datetime,timezone
@@ -15,17 +16,37 @@ class User(Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     
 
+class Eleicao(Base):
+    # cada eleição (outro campus, segundo turno) tem as suas chapas e votos no mesmo banco.
+    # Encerrada não aceita mais votos; arquivada teve chapas e votos movidos para `arquivo`
+    __tablename__ = "Eleicao"
+
+    eleicao_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    nome: Mapped[str] = mapped_column(String(100), nullable=False)
+    criada_em: Mapped[datetime] = mapped_column(DateTime)
+    encerrada_em: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    arquivo: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+
 class Chapa(Base):
     __tablename__ = "Chapa"
 
     chapa_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     chapa_nome: Mapped[str] = mapped_column(String(100), nullable=False)
+    eleicao_id: Mapped[int] = mapped_column(ForeignKey("Eleicao.eleicao_id"), nullable=False, index=True)
     
     votos: Mapped[list["Voto"]] = relationship("Voto", back_populates="chapa")
 
 class Voto(Base):
     __tablename__ = "Voto"
+    # tudo começa pela eleição: "já votou", contagem por chapa e exportação por horário
+    # só percorrem as linhas da eleição consultada
+    __table_args__ = (
+        Index("ix_Voto_eleicao_chapa", "eleicao_id", "chapa_id"),
+        Index("ix_Voto_eleicao_horario", "eleicao_id", "horario"),
+    )
 
+    # a mesma matrícula vota uma vez em cada eleição
+    eleicao_id: Mapped[int] = mapped_column(ForeignKey("Eleicao.eleicao_id"), primary_key=True)
     matricula: Mapped[str] = mapped_column(String(100), primary_key=True)
     #documento: Mapped[str] = mapped_column(String(100))
     #estudante: Mapped[str] = mapped_column(String(100))
@@ -34,4 +55,45 @@ class Voto(Base):
     chapa_id: Mapped[int] = mapped_column(ForeignKey("Chapa.chapa_id"), nullable=False)
 
     # Relacionamento com Chapa
-    chapa: Mapped["Chapa"] = relationship("Chapa", back_populates="votos")
\ No newline at end of file
+    chapa: Mapped["Chapa"] = relationship("Chapa", back_populates="votos")
+
+class ContagemChapa(Base):
+    # contagem de votos por chapa mantida na mesma transação do voto
+    # (reconstruída a partir de Voto com --reconciliar-contagem)
+    __tablename__ = "ContagemChapa"
+
+    chapa_id: Mapped[int] = mapped_column(ForeignKey("Chapa.chapa_id"), primary_key=True)
+    total_votos: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+class Eleitor(Base):
+    # cadastro de alunos aptos a votar (importado da planilha da secretaria)
+    __tablename__ = "Eleitor"
+
+    matricula: Mapped[str] = mapped_column(String(100), primary_key=True)
+    cpf: Mapped[str] = mapped_column(String(11), index=True)
+    nome: Mapped[str] = mapped_column(String(200))
+
+class Versao(Base):
+    # contador por assunto ("chapas", "eleitores", "indice"), incrementado a cada mudança;
+    # com vários workers, cada processo compara com o valor que tem para saber se o cache ficou velho
+    __tablename__ = "Versao"
+
+    nome: Mapped[str] = mapped_column(String(50), primary_key=True)
+    valor: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+class Migracao(Base):
+    # migrações de migracoes.py já aplicadas neste banco (python main.py --migrar)
+    __tablename__ = "Migracao"
+
+    id: Mapped[str] = mapped_column(String(10), primary_key=True)
+    descricao: Mapped[str] = mapped_column(String(200))
+    aplicada_em: Mapped[datetime] = mapped_column(DateTime)
+
+class VotosPorMinuto(Base):
+    # votos por minuto e por chapa, somados na mesma transação do voto;
+    # os gráficos de participação leem só esta tabela, nunca Voto
+    __tablename__ = "VotosPorMinuto"
+
+    minuto: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    chapa_id: Mapped[int] = mapped_column(ForeignKey("Chapa.chapa_id"), primary_key=True)
+    total: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
@@ -0,0 +1,304 @@
+# perfilamento.py
+"""
+Consultas SQL por requisição e perfil de uma requisição sob demanda.
+
+- Consultas: os eventos before/after_cursor_execute do engine somam, numa ContextVar
+  criada pelo PerfilMiddleware, quantos statements cada requisição rodou e quanto tempo
+  levaram. Vai para /metrics por rota (http_requisicao_consultas_sql, http_requisicao_sql_segundos).
+- Perfil: com PERFIL_TOKEN definido, uma requisição com o cabeçalho "X-Perfil: <token>"
+  (só no cabeçalho: na URL o token iria para os logs de acesso) é amostrada por uma thread a cada PERFIL_INTERVALO segundos. A pilha
+  da tarefa da requisição vai para PERFIL_DIR em formato "folded" (flamegraph.pl, speedscope),
+  com o trecho "(esperando)" quando ela está parada num await, e os statements rodados vão
+  para um .sql ao lado, com os repetidos agrupados.
+
+Sem SQL_POR_REQUISICAO nem PERFIL_TOKEN, main.py não registra nem os eventos nem o middleware.
+"""
+import os
+import re
+import sys
+import hmac
+import hashlib
+import time
+import asyncio
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+from metricas import Histograma, BUCKETS_ETAPA, rota_da_requisicao
+
+SQL_POR_REQUISICAO = os.getenv("SQL_POR_REQUISICAO", "1") == "1"
+# se definido, libera o perfil sob demanda para quem mandar o token
+PERFIL_TOKEN = os.getenv("PERFIL_TOKEN")
+PERFIL_DIR = os.getenv("PERFIL_DIR", "perfis")
+PERFIL_INTERVALO = float(os.getenv("PERFIL_INTERVALO", "0.0005"))  # segundos entre amostras
+
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50, 100)
+
+consultas_por_requisicao = Histograma(
+    "http_requisicao_consultas_sql", "Statements SQL executados por requisição, por rota (voto da fila: os do seu lote)",
+    ("rota",), BUCKETS_CONSULTAS,
+)
+sql_segundos_por_requisicao = Histograma(
+    "http_requisicao_sql_segundos", "Tempo somado dos statements SQL de cada requisição, por rota",
+    ("rota",), BUCKETS_ETAPA,
+)
+
+_RAIZ = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+
+class Consultas:
+    __slots__ = ("total", "segundos", "sentencas")
+
+    def __init__(self, sentencas: Optional[list] = None):
+        self.total = 0
+        self.segundos = 0.0
+        # (statement, segundos) de cada execução, só na requisição perfilada
+        self.sentencas = sentencas
+
+
+# a da requisição em andamento; tarefas criadas por ela herdam a mesma
+_consultas: ContextVar[Optional[Consultas]] = ContextVar("consultas", default=None)
+
+
+def _antes(conn, cursor, statement, parameters, context, executemany):
+    if _consultas.get() is not None:
+        conn.info["perfil_inicio"] = time.perf_counter()
+
+
+def _depois(conn, cursor, statement, parameters, context, executemany):
+    consultas = _consultas.get()
+    inicio = conn.info.pop("perfil_inicio", None)
+    if consultas is None or inicio is None:
+        return
+    duracao = time.perf_counter() - inicio
+    consultas.total += 1
+    consultas.segundos += duracao
+    if consultas.sentencas is not None:
+        consultas.sentencas.append((statement, duracao))
+
+
+def consultas_da_requisicao() -> Optional[Consultas]:
+    """A contagem da requisição em andamento (None fora do middleware ou com ele desligado)."""
+    return _consultas.get()
+
+
+@contextmanager
+def contar_para(destinos: list):
+    """
+    Soma os statements rodados dentro do bloco na contagem de cada requisição de `destinos`.
+    Para trabalho feito por outra tarefa em nome delas: o lote da fila de votos é gravado
+    pela tarefa escritora e cada voto do lote conta os statements do lote inteiro.
+    """
+    destinos = [destino for destino in destinos if destino is not None]
+    if not destinos:
+        yield
+        return
+    perfilado = any(destino.sentencas is not None for destino in destinos)
+    consultas = Consultas(sentencas=[] if perfilado else None)
+    marca = _consultas.set(consultas)
+    try:
+        yield
+    finally:
+        _consultas.reset(marca)
+        for destino in destinos:
+            destino.total += consultas.total
+            destino.segundos += consultas.segundos
+            if destino.sentencas is not None:
+                destino.sentencas.extend(consultas.sentencas)
+
+
+def instrumentar(engine):
+    """Registra a contagem de consultas no engine (async ou síncrono)."""
+    alvo = getattr(engine, "sync_engine", engine)
+    event.listen(alvo, "before_cursor_execute", _antes)
+    event.listen(alvo, "after_cursor_execute", _depois)
+
+
+def _nome(frame) -> str:
+    codigo = frame.f_code
+    arquivo = codigo.co_filename
+    arquivo = arquivo[len(_RAIZ):] if arquivo.startswith(_RAIZ) else os.path.basename(arquivo)
+    return f"{codigo.co_qualname} ({arquivo}:{frame.f_lineno})"
+
+
+class Amostrador(threading.Thread):
+    """
+    Amostra, de outra thread, a pilha de uma tarefa asyncio. Criado na thread do loop.
+    Quando a tarefa está rodando, lê o frame atual do loop (sys._current_frames) até a
+    corrotina da tarefa; quando está parada, segue a cadeia de cr_await até o que ela espera.
+    """
+
+    def __init__(self, tarefa: asyncio.Task, intervalo: float = PERFIL_INTERVALO):
+        super().__init__(name="perfil", daemon=True)
+        self.tarefa = tarefa
+        self.loop = tarefa.get_loop()
+        self.thread_loop = threading.get_ident()
+        self.raiz = tarefa.get_coro().cr_frame
+        self.intervalo = intervalo
+        self.pilhas: Counter = Counter()
+        self._fim = threading.Event()
+
+    def run(self):
+        while not self._fim.wait(self.intervalo):
+            pilha = self._amostrar()
+            if pilha:
+                self.pilhas[pilha] += 1
+
+    def parar(self):
+        self._fim.set()
+        self.join()
+
+    def _amostrar(self) -> Optional[str]:
+        if asyncio.current_task(self.loop) is self.tarefa:
+            frame = sys._current_frames().get(self.thread_loop)
+            nomes = []
+            while frame is not None:
+                nomes.append(_nome(frame))
+                if frame is self.raiz:
+                    return ";".join(reversed(nomes))
+                frame = frame.f_back
+            # o loop trocou de tarefa durante a leitura
+            return None
+        nomes = []
+        objeto = self.tarefa.get_coro()
+        while objeto is not None:
+            frame = getattr(objeto, "cr_frame", None) or getattr(objeto, "gi_frame", None)
+            if frame is None:
+                break
+            nomes.append(_nome(frame))
+            objeto = getattr(objeto, "cr_await", None) or getattr(objeto, "gi_yieldfrom", None)
+        if not nomes:
+            return None
+        nomes.append("(esperando)")
+        return ";".join(nomes)
+
+
+def _token_pedido(scope) -> Optional[str]:
+    for nome, valor in scope["headers"]:
+        if nome == b"x-perfil":
+            return valor.decode("latin-1")
+    return None
+
+
+_FORA_DO_NOME = re.compile(r"[^A-Za-z0-9._-]+")
+_TAMANHO_NOME_ROTA = 80
+
+
+def _nome_perfil(scope) -> str:
+    # o caminho vem do cliente: só caracteres seguros e tamanho limitado (o resto vira hash),
+    # senão um caminho longo faz a gravação falhar depois de a resposta já ter saído
+    rota = _FORA_DO_NOME.sub("_", f"{scope['method']}{scope['path']}")
+    if len(rota) > _TAMANHO_NOME_ROTA:
+        rota = rota[:_TAMANHO_NOME_ROTA - 9] + "-" + hashlib.sha1(rota.encode()).hexdigest()[:8]
+    return f"{datetime.now():%Y%m%dT%H%M%S%f}-{rota}"
+
+
+def _gravar(base: str, amostrador: Amostrador, consultas: Consultas, cabecalho: str):
+    os.makedirs(PERFIL_DIR, exist_ok=True)
+    with open(base + ".folded", "w", encoding="utf-8") as arquivo:
+        for pilha, amostras in amostrador.pilhas.most_common():
+            arquivo.write(f"{pilha} {amostras}\n")
+    repetidas = Counter(statement for statement, _ in consultas.sentencas)
+    with open(base + ".sql", "w", encoding="utf-8") as arquivo:
+        arquivo.write(f"-- {cabecalho}\n")
+        arquivo.write(f"-- {consultas.total} statements, {consultas.segundos * 1000:.2f} ms no banco\n")
+        for statement, vezes in repetidas.items():
+            if vezes > 1:
+                arquivo.write(f"-- repetido {vezes}x: {' '.join(statement.split())[:200]}\n")
+        for statement, segundos in consultas.sentencas:
+            arquivo.write(f"\n-- {segundos * 1000:.3f} ms\n{statement.strip()};\n")
+
+
+class PerfilMiddleware:
+    """Middleware ASGI: conta as consultas de cada requisição e perfila a que pedir."""
+
+    def __init__(self, app):
+        self.app = app
+        self.perfilando = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if PERFIL_TOKEN:
+            token = _token_pedido(scope)
+            if token is not None:
+                return await self._perfilar(scope, receive, send, token)
+        if not SQL_POR_REQUISICAO:
+            return await self.app(scope, receive, send)
+
+        consultas = Consultas()
+        marca = _consultas.set(consultas)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _consultas.reset(marca)
+            self._observar(scope, consultas)
+
+    def _observar(self, scope, consultas: Consultas):
+        rota = rota_da_requisicao(scope)
+        consultas_por_requisicao.observar(consultas.total, rota)
+        sql_segundos_por_requisicao.observar(consultas.segundos, rota)
+
+    async def _perfilar(self, scope, receive, send, token: str):
+        if not hmac.compare_digest(token.encode(), PERFIL_TOKEN.encode()):
+            return await JSONResponse({"detail": "Token de perfil inválido"}, status_code=401)(scope, receive, send)
+        # uma de cada vez: a thread de amostragem e o switch interval curto pesam no processo todo
+        if self.perfilando:
+            return await JSONResponse({"detail": "Já há um perfil em andamento"}, status_code=409)(scope, receive, send)
+        self.perfilando = True
+
+        nome = _nome_perfil(scope)
+        base = os.path.join(PERFIL_DIR, nome)
+        consultas = Consultas(sentencas=[])
+        amostrador = Amostrador(asyncio.current_task())
+
+        async def send_perfilado(mensagem):
+            if mensagem["type"] == "http.response.start":
+                cabecalhos = list(mensagem.get("headers", []))
+                cabecalhos.append((b"x-perfil", nome.encode()))
+                cabecalhos.append((
+                    b"server-timing",
+                    f'sql;dur={consultas.segundos * 1000:.2f};desc="{consultas.total} statements"'.encode(),
+                ))
+                mensagem = {**mensagem, "headers": cabecalhos}
+            await send(mensagem)
+
+        # a thread só consegue amostrar quando o loop solta o GIL: sem isso, uma amostra a cada 5 ms
+        intervalo_anterior = sys.getswitchinterval()
+        sys.setswitchinterval(min(intervalo_anterior, PERFIL_INTERVALO))
+        marca = _consultas.set(consultas)
+        inicio = time.perf_counter()
+        amostrador.start()
+        try:
+            await self.app(scope, receive, send_perfilado)
+        finally:
+            # join() da thread de amostragem fora do loop
+            await asyncio.to_thread(amostrador.parar)
+            duracao = time.perf_counter() - inicio
+            _consultas.reset(marca)
+            sys.setswitchinterval(intervalo_anterior)
+            if SQL_POR_REQUISICAO:
+                self._observar(scope, consultas)
+            try:
+                cabecalho = (
+                    f"{scope['method']} {scope['path']}: {duracao * 1000:.2f} ms, "
+                    f"{sum(amostrador.pilhas.values())} amostras a cada {amostrador.intervalo * 1000:g} ms"
+                )
+                await asyncio.to_thread(_gravar, base, amostrador, consultas, cabecalho)
+            finally:
+                self.perfilando = False
+
+
+def ler_perfil(nome: str, extensao: str) -> Optional[str]:
+    """Conteúdo de um perfil gravado (nome vindo do cabeçalho X-Perfil), ou None."""
+    caminho = os.path.join(PERFIL_DIR, os.path.basename(nome) + extensao)
+    if not os.path.isfile(caminho):
+        return None
+    with open(caminho, encoding="utf-8") as arquivo:
+        return arquivo.read()
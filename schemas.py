@@ -23,9 +23,24 @@ class Token(BaseModel):
     access_token: str
     token_type: str
 
+class EleicaoCreate(BaseModel):
+    nome: str
+
 class ChapaCreate(BaseModel):
     chapa_nome: str
+    eleicao_id: int | None = None  # sem ela, vai para a eleição aberta mais recente
 
 class VotoCreate(BaseModel):
     matricula: str
-    chapa_id: int
\ No newline at end of file
+    chapa_id: int
+
+class VotoResultado(BaseModel):
+    matricula: str
+    chapa_id: int
+    status: int  # 201 aceito; senão o código da recusa (409, 404, 403)
+    detalhe: str | None = None
+
+class VotosResposta(BaseModel):
+    aceitos: int
+    recusados: int
+    resultados: list[VotoResultado]
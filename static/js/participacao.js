@@ -0,0 +1,75 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const svg = document.getElementById('grafico-participacao');
+    if (!svg) {
+        return;
+    }
+
+    const seletorIntervalo = document.getElementById('participacao-intervalo');
+    const seletorModo = document.getElementById('participacao-modo');
+    const legenda = document.getElementById('legenda-participacao');
+    const eleicao = document.querySelector('.results-container').dataset.eleicaoId;
+    const cores = ['#4361ee', '#f72585', '#7209b7', '#4cc9f0', '#f8961e', '#2a9d8f', '#e76f51', '#6c757d'];
+    const LARGURA = 600, ALTURA = 220, MARGEM = 24;
+    let dados = null;
+
+    function linha(valores, maximo, cor, espessura) {
+        const passo = valores.length > 1 ? (LARGURA - 2 * MARGEM) / (valores.length - 1) : 0;
+        const pontos = valores.map((valor, i) => {
+            const x = MARGEM + i * passo;
+            const y = ALTURA - MARGEM - (maximo ? valor / maximo * (ALTURA - 2 * MARGEM) : 0);
+            return x.toFixed(1) + ',' + y.toFixed(1);
+        });
+        return '<polyline fill="none" stroke="' + cor + '" stroke-width="' + espessura + '" points="' + pontos.join(' ') + '"/>';
+    }
+
+    function desenhar() {
+        if (!dados || !dados.rotulos.length) {
+            svg.innerHTML = '<text x="300" y="110" text-anchor="middle" fill="#6c757d">Nenhum voto ainda</text>';
+            legenda.innerHTML = '';
+            return;
+        }
+        const modo = seletorModo.value;
+        const total = dados[modo === 'acumulado' ? 'acumulado' : 'total'];
+        const maximo = Math.max(...total, 1);
+
+        let conteudo = '<line x1="' + MARGEM + '" y1="' + (ALTURA - MARGEM) + '" x2="' + (LARGURA - MARGEM) +
+            '" y2="' + (ALTURA - MARGEM) + '" stroke="#dee2e6"/>';
+        conteudo += '<text x="' + MARGEM + '" y="14" fill="#6c757d" font-size="11">' + maximo + '</text>';
+        conteudo += '<text x="' + MARGEM + '" y="' + (ALTURA - 6) + '" fill="#6c757d" font-size="11">' +
+            dados.rotulos[0].replace('T', ' ') + '</text>';
+        conteudo += '<text x="' + (LARGURA - MARGEM) + '" y="' + (ALTURA - 6) + '" fill="#6c757d" font-size="11" text-anchor="end">' +
+            dados.rotulos[dados.rotulos.length - 1].replace('T', ' ') + '</text>';
+        conteudo += linha(total, maximo, '#adb5bd', 3);
+
+        legenda.innerHTML = '';
+        dados.chapas.forEach((chapa, i) => {
+            const cor = cores[i % cores.length];
+            conteudo += linha(chapa[modo], maximo, cor, 2);
+            const item = document.createElement('span');
+            item.style.setProperty('--cor', cor);
+            item.textContent = chapa.chapa_nome;
+            legenda.appendChild(item);
+        });
+        const itemTotal = document.createElement('span');
+        itemTotal.style.setProperty('--cor', '#adb5bd');
+        itemTotal.textContent = 'Total';
+        legenda.appendChild(itemTotal);
+
+        svg.innerHTML = conteudo;
+    }
+
+    function carregar() {
+        fetch('/eleicao/participacao?intervalo=' + seletorIntervalo.value + '&eleicao=' + eleicao, { credentials: 'same-origin' })
+            .then(resposta => resposta.ok ? resposta.json() : null)
+            .then(json => {
+                dados = json;
+                desenhar();
+            });
+    }
+
+    seletorIntervalo.addEventListener('change', carregar);
+    seletorModo.addEventListener('change', desenhar);
+    carregar();
+    // uma consulta pequena (minutos com voto x chapas) a cada 30 s
+    setInterval(carregar, 30000);
+});
@@ -0,0 +1,36 @@
+document.addEventListener('DOMContentLoaded', function() {
+    if (!window.EventSource) {
+        return;
+    }
+
+    const totalElement = document.getElementById('total-votos');
+    const eleicao = document.querySelector('.results-container').dataset.eleicaoId;
+    const contagens = {};
+
+    document.querySelectorAll('.result-item').forEach(item => {
+        contagens[item.dataset.chapaId] = parseInt(item.querySelector('.vote-number').textContent, 10);
+    });
+
+    // Atualiza contagens e percentuais com os deltas enviados pelo servidor
+    function aplicar(dados) {
+        dados.chapas.forEach(chapa => {
+            contagens[chapa.chapa_id] = chapa.total_votos;
+        });
+
+        totalElement.textContent = dados.total_votos;
+
+        document.querySelectorAll('.result-item').forEach(item => {
+            const votos = contagens[item.dataset.chapaId] || 0;
+            const percentual = dados.total_votos > 0 ? (votos / dados.total_votos * 100) : 0;
+
+            item.querySelector('.vote-number').textContent = votos;
+            item.querySelector('.progress-fill').style.width = percentual.toFixed(2) + '%';
+            item.querySelector('.percentage').textContent = Math.round(percentual * 100) / 100 + '%';
+        });
+    }
+
+    const fonte = new EventSource('/eleicao/resultados/stream?eleicao=' + eleicao);
+    fonte.onmessage = function(evento) {
+        aplicar(JSON.parse(evento.data));
+    };
+});
@@ -0,0 +1,171 @@
+# votacao/arquivamento.py
+"""
+Arquivamento de eleições encerradas.
+
+`arquivar_eleicao()` copia a eleição (chapas, contagens, votos por minuto e votos) para
+ARQUIVO_DIR/eleicao-<id>.db, um SQLite com o mesmo schema do sistema, confere a cópia e
+só então apaga essas linhas do banco principal. A linha em Eleicao fica, com o caminho do
+arquivo. O banco da votação em andamento não carrega o histórico: índices menores, índice
+em memória menor e cópias (backup.py) mais rápidas.
+
+Para consultar uma eleição arquivada, aponte DATABASE_URL para o arquivo.
+"""
+import os
+import time
+import sqlite3
+import asyncio
+
+from sqlalchemy import create_engine, insert, delete, update
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import Base, Eleicao, Chapa, Voto, ContagemChapa, VotosPorMinuto, Migracao
+from .coordenacao import incrementar_versao
+from .cache_chapas import cache_chapas
+from .cache_eleicoes import cache_eleicoes
+
+ARQUIVO_DIR = os.getenv("ARQUIVO_DIR", "arquivo")
+ARQUIVO_BLOCO = int(os.getenv("ARQUIVO_BLOCO", "5000"))  # votos copiados por vez
+
+
+class ArquivamentoIndisponivel(Exception):
+    pass
+
+
+def _dicts(linhas) -> list[dict]:
+    return [dict(linha._mapping) for linha in linhas]
+
+
+async def arquivar_eleicao(eleicao_id: int, session_factory=AsyncSessionLocal, pasta: str = ARQUIVO_DIR) -> dict:
+    inicio = time.perf_counter()
+    destino = os.path.join(pasta, f"eleicao-{eleicao_id}.db")
+    temporario = destino + ".parcial"
+    async with session_factory() as db:
+        eleicao = await db.get(Eleicao, eleicao_id)
+        if eleicao is None:
+            raise ArquivamentoIndisponivel("eleição não existe")
+        if eleicao.arquivo:
+            raise ArquivamentoIndisponivel(f"eleição já arquivada em {eleicao.arquivo}")
+        if eleicao.encerrada_em is None:
+            raise ArquivamentoIndisponivel("encerre a eleição antes de arquivar")
+        os.makedirs(pasta, exist_ok=True)
+        if os.path.exists(destino):
+            raise ArquivamentoIndisponivel(f"{destino} já existe")
+        try:
+            os.close(os.open(temporario, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            raise ArquivamentoIndisponivel(f"já há um arquivamento em andamento para {destino}")
+
+        try:
+            # encerrada: nada mais muda nas linhas copiadas
+            chapas = _dicts((await db.execute(select(Chapa.__table__).where(Chapa.eleicao_id == eleicao_id))).all())
+            chapa_ids = [chapa["chapa_id"] for chapa in chapas]
+            contagens = _dicts((await db.execute(
+                select(ContagemChapa.__table__).where(ContagemChapa.chapa_id.in_(chapa_ids))
+            )).all())
+            votos = await _copiar(db, eleicao, chapas, contagens, temporario)
+            os.replace(temporario, destino)
+            # fecha a leitura: no WAL, uma transação que leu antes de outros votos
+            # serem gravados não consegue virar escrita (SQLITE_BUSY_SNAPSHOT)
+            await db.commit()
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+        try:
+            await db.execute(delete(Voto.__table__).where(Voto.eleicao_id == eleicao_id))
+            await db.execute(delete(VotosPorMinuto.__table__).where(VotosPorMinuto.chapa_id.in_(chapa_ids)))
+            await db.execute(delete(ContagemChapa.__table__).where(ContagemChapa.chapa_id.in_(chapa_ids)))
+            await db.execute(delete(Chapa.__table__).where(Chapa.eleicao_id == eleicao_id))
+            await db.execute(update(Eleicao).where(Eleicao.eleicao_id == eleicao_id).values(arquivo=destino))
+            await incrementar_versao(db, "eleicoes")
+            await incrementar_versao(db, "chapas")
+            # as réplicas acompanham os votos pelo rowid, que o SQLite pode reaproveitar depois do DELETE
+            await incrementar_versao(db, "arquivamentos")
+            await db.commit()
+        except BaseException:
+            # sem o commit o banco continua com a eleição; o arquivo não serve de nada
+            await db.rollback()
+            os.remove(destino)
+            raise
+
+    cache_eleicoes.invalidar()
+    cache_chapas.invalidar()
+    return {
+        "eleicao_id": eleicao_id,
+        "arquivo": destino,
+        "chapas": len(chapas),
+        "votos": votos,
+        "bytes": os.path.getsize(destino),
+        "segundos": round(time.perf_counter() - inicio, 3),
+    }
+
+
+async def _copiar(db, eleicao: Eleicao, chapas: list[dict], contagens: list[dict], caminho: str) -> int:
+    """Grava a eleição em `caminho` e confere os votos por chapa com ContagemChapa. Retorna o total de votos."""
+    chapa_ids = [chapa["chapa_id"] for chapa in chapas]
+    # os blocos são gravados em threads do to_thread, uma de cada vez
+    arquivo = create_engine(f"sqlite:///{caminho}", connect_args={"check_same_thread": False})
+    try:
+        conn = arquivo.connect()
+        try:
+            await asyncio.to_thread(Base.metadata.create_all, conn)
+            # registra as migrações já aplicadas: o arquivo abre no sistema sem --migrar
+            migracoes = _dicts((await db.execute(select(Migracao.__table__))).all())
+            linhas = [
+                (Migracao.__table__, migracoes),
+                (Eleicao.__table__, [{
+                    "eleicao_id": eleicao.eleicao_id, "nome": eleicao.nome, "criada_em": eleicao.criada_em,
+                    "encerrada_em": eleicao.encerrada_em, "arquivo": None,
+                }]),
+                (Chapa.__table__, chapas),
+                (ContagemChapa.__table__, contagens),
+                (VotosPorMinuto.__table__, _dicts((await db.execute(
+                    select(VotosPorMinuto.__table__).where(VotosPorMinuto.chapa_id.in_(chapa_ids))
+                )).all())),
+            ]
+            for tabela, valores in linhas:
+                if valores:
+                    await asyncio.to_thread(conn.execute, insert(tabela), valores)
+
+            por_chapa = dict.fromkeys(chapa_ids, 0)
+            result = await db.stream(
+                select(Voto.__table__).where(Voto.eleicao_id == eleicao.eleicao_id)
+                .execution_options(yield_per=ARQUIVO_BLOCO)
+            )
+            async for bloco in result.partitions(ARQUIVO_BLOCO):
+                valores = _dicts(bloco)
+                for voto in valores:
+                    por_chapa[voto["chapa_id"]] += 1
+                await asyncio.to_thread(conn.execute, insert(Voto.__table__), valores)
+
+            divergentes = [
+                f"chapa {contagem['chapa_id']}: contagem {contagem['total_votos']}, votos {por_chapa.get(contagem['chapa_id'], 0)}"
+                for contagem in contagens if contagem["total_votos"] != por_chapa.get(contagem["chapa_id"], 0)
+            ]
+            if divergentes:
+                raise ArquivamentoIndisponivel(
+                    "contagem diverge dos votos (rode --reconciliar-contagem): " + "; ".join(divergentes)
+                )
+            await asyncio.to_thread(conn.commit)
+        finally:
+            conn.close()
+    finally:
+        arquivo.dispose()
+    return sum(por_chapa.values())
+
+
+def contagens_arquivadas(arquivos) -> list[tuple[int, str, int, int]]:
+    """(chapa_id, chapa_nome, votos, eleicao_id) das eleições arquivadas, lidos dos próprios arquivos."""
+    contagens = []
+    for caminho in arquivos:
+        conexao = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+        try:
+            contagens.extend(conexao.execute(
+                f'SELECT c.chapa_id, c.chapa_nome, COALESCE(t.total_votos, 0), c.eleicao_id FROM "{Chapa.__tablename__}" c '
+                f'LEFT JOIN "{ContagemChapa.__tablename__}" t ON t.chapa_id = c.chapa_id ORDER BY c.chapa_id'
+            ).fetchall())
+        finally:
+            conexao.close()
+    return contagens
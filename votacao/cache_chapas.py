@@ -0,0 +1,49 @@
+import hashlib
+
+from markupsafe import Markup
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import Chapa
+from assets import templates
+
+
+class CacheChapas:
+    """
+    Lista de chapas de cada eleição e o trecho <option> já renderizado da cédula.
+    A lista só muda quando uma chapa é cadastrada, então a página de votação
+    não precisa ir ao banco a cada recarga; cadastrar_chapa chama invalidar().
+    """
+
+    def __init__(self):
+        self.versao = 0
+        # eleicao_id -> (chapas, opções renderizadas, digest)
+        self.eleicoes: dict[int, tuple[list[tuple[int, str]], Markup, str]] = {}
+
+    async def obter(self, db: AsyncSession, eleicao_id: int) -> tuple[Markup, str]:
+        """Retorna o trecho <option> das chapas da eleição e um digest do conteúdo (para o ETag)."""
+        guardado = self.eleicoes.get(eleicao_id)
+        if guardado is None:
+            versao = self.versao
+            result = await db.execute(
+                select(Chapa.chapa_id, Chapa.chapa_nome)
+                .where(Chapa.eleicao_id == eleicao_id)
+                .order_by(Chapa.chapa_id)
+            )
+            chapas = [tuple(linha) for linha in result.all()]
+            opcoes = Markup(templates.get_template("opcoes_chapas.html").render(chapas=chapas))
+            # derivado do conteúdo: o ETag não muda num restart se as chapas não mudaram
+            digest = hashlib.sha1(f"{eleicao_id}\0{opcoes}".encode()).hexdigest()[:16]
+            # se invalidar() rodou durante a consulta, a lista lida pode estar velha: não guarda
+            if versao != self.versao:
+                return opcoes, digest
+            guardado = self.eleicoes[eleicao_id] = (chapas, opcoes, digest)
+        _, opcoes, digest = guardado
+        return opcoes, digest
+
+    def invalidar(self):
+        self.versao += 1
+        self.eleicoes = {}
+
+
+cache_chapas = CacheChapas()
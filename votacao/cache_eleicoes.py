@@ -0,0 +1,59 @@
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from models import Eleicao
+
+
+class CacheEleicoes:
+    """
+    Lista de eleições (poucas linhas; muda só ao criar, encerrar ou arquivar uma).
+    As páginas resolvem ?eleicao= por aqui sem ir ao banco a cada recarga;
+    quem muda uma eleição chama invalidar().
+    """
+
+    def __init__(self):
+        self.versao = 0
+        self.eleicoes: Optional[dict] = None  # eleicao_id -> linha (eleicao_id, nome, encerrada_em, arquivo)
+
+    async def listar(self, db: AsyncSession) -> dict:
+        if self.eleicoes is None:
+            versao = self.versao
+            result = await db.execute(
+                select(Eleicao.eleicao_id, Eleicao.nome, Eleicao.encerrada_em, Eleicao.arquivo)
+                .order_by(Eleicao.eleicao_id)
+            )
+            eleicoes = {linha.eleicao_id: linha for linha in result.all()}
+            # mesma regra do cache de chapas: invalidado durante a consulta, não guarda
+            if versao != self.versao:
+                return eleicoes
+            self.eleicoes = eleicoes
+        return self.eleicoes
+
+    async def resolver(self, db: AsyncSession, eleicao_id: Optional[int] = None):
+        """
+        A eleição pedida em ?eleicao=; sem ela, a aberta mais recente
+        (ou a última não arquivada, depois que todas encerraram).
+        """
+        eleicoes = await self.listar(db)
+        if eleicao_id is None:
+            candidatas = [e for e in eleicoes.values() if e.encerrada_em is None]
+            candidatas = candidatas or [e for e in eleicoes.values() if e.arquivo is None]
+            if not candidatas:
+                raise HTTPException(status_code=404, detail="Nenhuma eleição cadastrada")
+            return candidatas[-1]
+        eleicao = eleicoes.get(eleicao_id)
+        if eleicao is None:
+            raise HTTPException(status_code=404, detail="Eleição não existe")
+        if eleicao.arquivo:
+            raise HTTPException(status_code=410, detail=f"Eleição arquivada em {eleicao.arquivo}")
+        return eleicao
+
+    def invalidar(self):
+        self.versao += 1
+        self.eleicoes = None
+
+
+cache_eleicoes = CacheEleicoes()
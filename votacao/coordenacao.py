@@ -0,0 +1,80 @@
+import asyncio
+from typing import Optional
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, VERSAO_INTERVALO, insert_dialeto
+from models import Versao
+from auth.cache import cache_usuarios
+from .cache_chapas import cache_chapas
+from .cache_eleicoes import cache_eleicoes
+from .indice_votos import indice_votos
+
+_INCREMENTAR_VERSAO = (
+    insert_dialeto(Versao.__table__)
+    .values(nome=bindparam("b_nome"), valor=1)
+    .on_conflict_do_update(
+        index_elements=[Versao.__table__.c.nome],
+        set_={"valor": Versao.__table__.c.valor + 1},
+    )
+)
+
+
+async def incrementar_versao(db: AsyncSession, nome: str):
+    # roda dentro da transação da mudança: a versão só muda se a mudança for gravada
+    await db.execute(_INCREMENTAR_VERSAO, {"b_nome": nome})
+
+
+class VigiaVersoes:
+    """
+    Com vários workers, cada processo tem o seu cache de chapas e o seu índice de votos.
+    Quem muda algo incrementa a linha em Versao na mesma transação; esta tarefa lê a
+    tabela a cada VERSAO_INTERVALO e descarta/recarrega o que ficou velho neste processo.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, intervalo: float = VERSAO_INTERVALO, exigir_eleitor: bool = False):
+        self.session_factory = session_factory
+        self.intervalo = intervalo
+        self.exigir_eleitor = exigir_eleitor
+        self.versoes: dict[str, int] = {}
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def iniciar(self):
+        self.versoes = await self._ler()
+        self._tarefa = asyncio.create_task(self._vigiar())
+
+    async def parar(self):
+        if self._tarefa is None:
+            return
+        self._tarefa.cancel()
+        try:
+            await self._tarefa
+        except asyncio.CancelledError:
+            pass
+        self._tarefa = None
+
+    async def _ler(self) -> dict[str, int]:
+        async with self.session_factory() as db:
+            return dict((await db.execute(select(Versao.nome, Versao.valor))).all())
+
+    async def _vigiar(self):
+        while True:
+            await asyncio.sleep(self.intervalo)
+            try:
+                versoes = await self._ler()
+            except OperationalError:
+                continue  # banco ocupado: tenta no próximo intervalo
+            mudaram = {nome for nome, valor in versoes.items() if self.versoes.get(nome) != valor}
+            self.versoes = versoes
+            if "chapas" in mudaram:
+                cache_chapas.invalidar()
+            if "eleicoes" in mudaram:
+                cache_eleicoes.invalidar()
+            # mesário desativado ou com senha nova em outro worker (ou direto no banco)
+            if "usuarios" in mudaram:
+                cache_usuarios.limpar()
+            if mudaram & {"chapas", "eleicoes", "eleitores", "indice"} and indice_votos.pronto:
+                await indice_votos.reconstruir(self.session_factory, self.exigir_eleitor)
@@ -0,0 +1,90 @@
+import io
+import os
+import csv
+import tempfile
+
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import bindparam
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal
+from models import Chapa, Voto
+
+EXPORT_BLOCO = int(os.getenv("EXPORT_BLOCO", "2000"))  # linhas lidas do banco por vez
+CABECALHO = ["Matrícula", "Horário", "Chapa"]
+
+# percorre o índice (eleicao_id, horario): só as linhas da eleição, já na ordem
+_CONSULTA_VOTOS = (
+    select(Voto.matricula, Voto.horario, Chapa.chapa_nome)
+    .join(Chapa, Voto.chapa_id == Chapa.chapa_id)
+    .where(Voto.eleicao_id == bindparam("b_eleicao_id"))
+    .order_by(Voto.horario)
+)
+
+
+async def _votos_em_blocos(eleicao_id, session_factory):
+    # sessão própria: a resposta continua sendo enviada depois que a rota retorna
+    async with session_factory() as db:
+        result = await db.stream(
+            _CONSULTA_VOTOS.execution_options(yield_per=EXPORT_BLOCO), {"b_eleicao_id": eleicao_id}
+        )
+        async for bloco in result.partitions(EXPORT_BLOCO):
+            yield bloco
+
+
+async def exportar_csv(eleicao_id: int, session_factory=AsyncSessionLocal):
+    """Gera o CSV bloco a bloco; a memória usada não depende do número de votos."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CABECALHO)
+    yield "\ufeff" + buffer.getvalue()  # BOM para o Excel reconhecer UTF-8
+
+    async for bloco in _votos_em_blocos(eleicao_id, session_factory):
+        buffer.seek(0)
+        buffer.truncate()
+        for matricula, horario, chapa_nome in bloco:
+            writer.writerow([matricula, horario.strftime("%Y-%m-%d %H:%M:%S"), chapa_nome])
+        yield buffer.getvalue()
+
+
+async def gerar_xlsx(eleicao_id: int, session_factory=AsyncSessionLocal) -> str:
+    """
+    Escreve o XLSX num arquivo temporário com o modo constant_memory do xlsxwriter
+    (cada linha vai para o disco assim que a próxima começa). Quem chama remove o arquivo.
+    """
+    import xlsxwriter  # só quando alguém exporta: fica fora da subida dos workers
+    fd, caminho = tempfile.mkstemp(prefix="resultados_", suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(caminho, {"constant_memory": True})
+        worksheet = workbook.add_worksheet("Votos Detalhados")
+
+        # Formata o cabeçalho
+        header_format = workbook.add_format({
+            'bold': True,
+            'bg_color': '#366092',
+            'font_color': 'white',
+            'border': 1
+        })
+        data_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+
+        # Ajusta a largura das colunas
+        worksheet.set_column('A:A', 20)
+        worksheet.set_column('B:B', 25)
+        worksheet.set_column('C:C', 30)
+
+        worksheet.write_row(0, 0, CABECALHO, header_format)
+        linha = 1
+        async for bloco in _votos_em_blocos(eleicao_id, session_factory):
+            for matricula, horario, chapa_nome in bloco:
+                worksheet.write_string(linha, 0, matricula)
+                worksheet.write_datetime(linha, 1, horario, data_format)
+                worksheet.write_string(linha, 2, chapa_nome)
+                linha += 1
+
+        # compacta o zip fora do event loop
+        await run_in_threadpool(workbook.close)
+    except BaseException:
+        os.remove(caminho)
+        raise
+    return caminho
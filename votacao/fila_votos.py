@@ -0,0 +1,124 @@
+import os
+import asyncio
+from typing import Optional
+
+from fastapi import HTTPException
+
+from database import AsyncSessionLocal
+from perfilamento import consultas_da_requisicao, contar_para
+from schemas import VotoCreate
+from .votacao_handler import registrar_votos
+
+# Modo opcional de ingestão com group commit (FILA_VOTOS=1 no .env)
+FILA_VOTOS = os.getenv("FILA_VOTOS", "0") == "1"
+FILA_VOTOS_LOTE = int(os.getenv("FILA_VOTOS_LOTE", "64"))
+FILA_VOTOS_ESPERA_MS = float(os.getenv("FILA_VOTOS_ESPERA_MS", "2"))
+# votos esperando o escritor; acima disso o terminal recebe 503 em vez de a memória crescer
+FILA_VOTOS_MAX = int(os.getenv("FILA_VOTOS_MAX", "4096"))
+
+
+class FilaVotos:
+    """
+    Uma única tarefa escritora drena a fila e grava os votos em lotes,
+    com um commit (e um fsync) por lote em vez de um por voto.
+    Cada requisição só recebe a resposta depois do commit do seu lote,
+    então um voto confirmado ao terminal já está gravado no banco.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, lote_max: int = FILA_VOTOS_LOTE, espera_ms: float = FILA_VOTOS_ESPERA_MS,
+                 maximo: int = FILA_VOTOS_MAX):
+        self.session_factory = session_factory
+        self.lote_max = lote_max
+        self.espera = espera_ms / 1000
+        self.maximo = maximo
+        self.fila: Optional[asyncio.Queue] = None
+        self._tarefa: Optional[asyncio.Task] = None
+
+    @property
+    def ativa(self) -> bool:
+        return self._tarefa is not None and not self._tarefa.done()
+
+    def iniciar(self):
+        self.fila = asyncio.Queue(maxsize=self.maximo)
+        self._tarefa = asyncio.create_task(self._escritor())
+
+    async def parar(self):
+        # grava o que já está na fila antes de encerrar
+        if not self.ativa:
+            return
+        await self.fila.put(None)
+        await self._tarefa
+        self._tarefa = None
+
+    async def enviar(self, voto: VotoCreate):
+        futuro = asyncio.get_running_loop().create_future()
+        try:
+            # leva a contagem de SQL da requisição: quem roda os statements é a tarefa escritora
+            self.fila.put_nowait((voto, futuro, consultas_da_requisicao()))
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=503, detail="Servidor ocupado, tente novamente", headers={"Retry-After": "1"},
+            )
+        rejeicao = await futuro
+        if rejeicao:
+            raise rejeicao
+
+    async def _escritor(self):
+        loop = asyncio.get_running_loop()
+        encerrar = False
+        while not encerrar:
+            item = await self.fila.get()
+            if item is None:
+                break
+            lote = [item]
+            # fecha o lote com FILA_VOTOS_LOTE votos ou FILA_VOTOS_ESPERA_MS após o primeiro
+            prazo = loop.time() + self.espera
+            while len(lote) < self.lote_max:
+                try:
+                    item = self.fila.get_nowait()
+                except asyncio.QueueEmpty:
+                    restante = prazo - loop.time()
+                    if restante <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.fila.get(), restante)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    encerrar = True
+                    break
+                lote.append(item)
+            await self._gravar(lote)
+
+    async def _gravar(self, lote):
+        votos = [voto for voto, _, _ in lote]
+        with contar_para([consultas for _, _, consultas in lote]):
+            try:
+                async with self.session_factory() as db:
+                    rejeicoes = await registrar_votos(votos, db)
+            except Exception as e:
+                if len(votos) == 1:
+                    rejeicoes = [_rejeicao(e)]
+                else:
+                    # a transação do lote foi desfeita inteira: regrava um a um, e só o voto
+                    # que falhar de novo recebe o erro
+                    rejeicoes = [await self._gravar_um(voto) for voto in votos]
+        for (_, futuro, _), rejeicao in zip(lote, rejeicoes):
+            if not futuro.done():  # requisição pode ter sido cancelada pelo cliente
+                futuro.set_result(rejeicao)
+
+    async def _gravar_um(self, voto: VotoCreate) -> Optional[HTTPException]:
+        try:
+            async with self.session_factory() as db:
+                return (await registrar_votos([voto], db))[0]
+        except Exception as e:
+            return _rejeicao(e)
+
+
+def _rejeicao(e: Exception) -> HTTPException:
+    if isinstance(e, HTTPException):
+        return e
+    return HTTPException(status_code=503, detail="Erro ao registrar voto, tente novamente")
+
+
+fila_votos = FilaVotos()
@@ -0,0 +1,135 @@
+import sys
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, MULTIPROCESSO
+from models import Chapa, Voto, Eleitor, Eleicao
+from schemas import VotoCreate
+
+
+def _chave(matricula: str):
+    # matrícula só de dígitos (sem zero à esquerda) vira int: ocupa metade de uma str no set.
+    # Só dígitos ASCII: "١٢٣" é outra matrícula no banco e "²" nem converte
+    if matricula.isascii() and matricula.isdigit() and not matricula.startswith("0"):
+        return int(matricula)
+    return matricula
+
+
+class IndiceVotos:
+    """
+    Índice em memória de quem já votou em cada eleição aberta, das chapas existentes
+    (com a eleição de cada uma) e (com EXIGIR_ELEITOR) das matrículas aptas.
+    Carregado do banco na subida e atualizado depois de cada commit.
+
+    Só serve para recusar cedo, sem ir ao SQLite: o índice nunca tem um voto que
+    ainda não foi gravado, então ele não recusa voto válido. Quem decide continua
+    sendo o INSERT (PK de Voto (eleicao_id, matricula) e FK de chapa_id).
+    Enquanto não for carregado (ex.: benchmarks com outro banco), não recusa nada.
+    Eleições encerradas não guardam matrículas: todo voto nelas é recusado.
+
+    Com vários workers, outro processo pode ter cadastrado a chapa ou o eleitor há pouco:
+    aí só "já votou" e "eleição encerrada" (que nunca volta atrás) são recusados aqui,
+    e chapa/eleitor desconhecidos vão para o banco decidir.
+    """
+
+    def __init__(self, confiar_ausencias: bool = not MULTIPROCESSO):
+        self.confiar_ausencias = confiar_ausencias
+        self.pronto = False
+        self.votaram: dict[int, set] = {}  # eleicao_id -> matrículas
+        self.chapas: dict[int, int] = {}  # chapa_id -> eleicao_id
+        self.encerradas: set[int] = set()
+        self.eleitores: Optional[set] = None
+        self.recusas = 0
+
+    async def reconstruir(self, session_factory=AsyncSessionLocal, exigir_eleitor: bool = False):
+        """Relê tudo do banco; usar também quando o banco for alterado por fora da aplicação."""
+        async with session_factory() as db:
+            eleicoes = (await db.execute(select(Eleicao.eleicao_id, Eleicao.encerrada_em))).all()
+            encerradas = {eleicao_id for eleicao_id, encerrada_em in eleicoes if encerrada_em is not None}
+            votaram = {}
+            for eleicao_id, _ in eleicoes:
+                if eleicao_id not in encerradas:
+                    # uma consulta por eleição, pelo começo da PK
+                    votaram[eleicao_id] = {
+                        _chave(m) for m in (await db.execute(
+                            select(Voto.matricula).where(Voto.eleicao_id == eleicao_id)
+                        )).scalars()
+                    }
+            chapas = dict((await db.execute(select(Chapa.chapa_id, Chapa.eleicao_id))).all())
+            eleitores = None
+            if exigir_eleitor:
+                eleitores = {_chave(m) for m in (await db.execute(select(Eleitor.matricula))).scalars()}
+        # troca de uma vez, sem await no meio: nenhum voto enxerga o índice pela metade
+        self.votaram, self.chapas, self.encerradas, self.eleitores = votaram, chapas, encerradas, eleitores
+        self.pronto = True
+
+    def descartar(self):
+        self.pronto = False
+        self.votaram, self.chapas, self.encerradas, self.eleitores = {}, {}, set(), None
+
+    def verificar(self, voto: VotoCreate) -> Optional[HTTPException]:
+        # mesma ordem de _motivo_rejeicao; a eleição do voto é a da chapa
+        if not self.pronto:
+            return None
+        eleicao_id = self.chapas.get(voto.chapa_id)
+        chave = _chave(voto.matricula)
+        if eleicao_id is None:
+            if not self.confiar_ausencias:
+                return None
+            motivo = HTTPException(status_code=404, detail="Chapa não existe")
+        elif eleicao_id in self.encerradas:
+            motivo = HTTPException(status_code=403, detail="Eleição encerrada")
+        elif chave in self.votaram.get(eleicao_id, ()):
+            motivo = HTTPException(status_code=409, detail="Você já votou!")
+        elif not self.confiar_ausencias:
+            return None
+        elif self.eleitores is not None and chave not in self.eleitores:
+            motivo = HTTPException(status_code=403, detail="Matrícula não está apta a votar")
+        else:
+            return None
+        self.recusas += 1
+        return motivo
+
+    # chamados só depois do commit
+    def registrar_votos(self, votos):
+        """votos: pares (eleicao_id, matrícula)."""
+        if self.pronto:
+            for eleicao_id, matricula in votos:
+                if eleicao_id not in self.encerradas:
+                    self.votaram.setdefault(eleicao_id, set()).add(_chave(matricula))
+
+    def registrar_chapa(self, chapa_id: int, eleicao_id: int):
+        if self.pronto:
+            self.chapas[chapa_id] = eleicao_id
+
+    def encerrar(self, eleicao_id: int):
+        if self.pronto:
+            self.encerradas.add(eleicao_id)
+            self.votaram.pop(eleicao_id, None)
+
+    def registrar_eleitores(self, matriculas):
+        if self.pronto and self.eleitores is not None:
+            self.eleitores.update(_chave(m) for m in matriculas)
+
+    def memoria(self) -> int:
+        """Bytes ocupados pelos conjuntos e seus elementos (sys.getsizeof)."""
+        total = 0
+        for conjunto in (*self.votaram.values(), self.chapas, self.eleitores or set()):
+            total += sys.getsizeof(conjunto) + sum(sys.getsizeof(item) for item in conjunto)
+        return total
+
+    def estatisticas(self) -> dict:
+        return {
+            "pronto": self.pronto,
+            "votaram": sum(len(matriculas) for matriculas in self.votaram.values()),
+            "eleicoes_abertas": len(self.votaram),
+            "chapas": len(self.chapas),
+            "eleitores": None if self.eleitores is None else len(self.eleitores),
+            "recusas_sem_banco": self.recusas,
+            "memoria_bytes": self.memoria(),
+        }
+
+
+indice_votos = IndiceVotos()
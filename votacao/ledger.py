@@ -0,0 +1,223 @@
+import os
+import mmap
+import time
+import struct
+import hashlib
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+# Registro append-only dos votos confirmados, à prova de adulteração:
+# cada registro carrega o SHA-256 do anterior (cadeia) e, a cada LEDGER_CHECKPOINT votos,
+# um checkpoint grava a raiz de Merkle do bloco. Cada processo escreve o seu segmento.
+LEDGER = os.getenv("LEDGER", "1") == "1"
+LEDGER_DIR = os.getenv("LEDGER_DIR", "ledger")
+LEDGER_CHECKPOINT = int(os.getenv("LEDGER_CHECKPOINT", "1000"))
+
+MAGICO = b"VOTLEDG1"
+TIPO_VOTO = 1
+TIPO_CHECKPOINT = 2
+_CABECALHO = struct.Struct(">BI")  # tipo, tamanho do conteúdo
+_VOTO = struct.Struct(">Id")  # chapa_id, horário (epoch); a matrícula (utf-8) ocupa o resto
+_CHECKPOINT = struct.Struct(">QI32s")  # votos no segmento, votos no bloco, raiz de Merkle do bloco
+_TAMANHO_HASH = 32
+
+# uma thread só: os fsyncs dos checkpoints saem do event loop e não se atropelam
+_EXECUTOR_FSYNC = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ledger-fsync")
+
+
+def _sha256(dados: bytes) -> bytes:
+    return hashlib.sha256(dados).digest()
+
+
+def hash_inicial(nome_segmento: str) -> bytes:
+    # a cadeia começa amarrada ao nome do arquivo: trocar segmentos de lugar quebra a verificação
+    return _sha256(MAGICO + nome_segmento.encode())
+
+
+def raiz_merkle(folhas: list[bytes]) -> bytes:
+    if not folhas:
+        return bytes(_TAMANHO_HASH)
+    nivel = folhas
+    while len(nivel) > 1:
+        if len(nivel) % 2:
+            nivel = nivel + [nivel[-1]]
+        nivel = [_sha256(nivel[i] + nivel[i + 1]) for i in range(0, len(nivel), 2)]
+    return nivel[0]
+
+
+class Ledger:
+    """
+    Escreve os votos depois do commit no banco. Cada commit vira um único write()
+    sem fsync; o fsync só acontece nos checkpoints (fora do event loop) e ao fechar,
+    que espera o fsync pendente antes de fechar o descritor.
+    Numa queda de energia podem faltar os últimos votos do arquivo, e a verificação
+    aponta a diferença em relação ao banco.
+    """
+
+    def __init__(self, pasta: str = LEDGER_DIR, intervalo_checkpoint: int = LEDGER_CHECKPOINT):
+        self.pasta = pasta
+        self.intervalo_checkpoint = intervalo_checkpoint
+        self.caminho: Optional[str] = None
+        self._arquivo = None
+        self._ultimo_hash = b""
+        self._folhas: list[bytes] = []
+        self._fsync: Optional[Future] = None
+        self.total = 0
+
+    @property
+    def aberto(self) -> bool:
+        return self._arquivo is not None
+
+    def abrir(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        nome = f"votos-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.seg"
+        self.caminho = os.path.join(self.pasta, nome)
+        self._arquivo = open(self.caminho, "ab")
+        self._arquivo.write(MAGICO)
+        self._arquivo.flush()
+        self._ultimo_hash = hash_inicial(nome)
+        self._folhas = []
+        self.total = 0
+
+    def registrar(self, votos: list[tuple[str, int, datetime]]):
+        """votos: (matrícula, chapa_id, horário) já confirmados no banco."""
+        if self._arquivo is None or not votos:
+            return
+        partes = []
+        checkpoint = False
+        for matricula, chapa_id, horario in votos:
+            conteudo = _VOTO.pack(chapa_id, horario.timestamp()) + matricula.encode()
+            partes.append(self._registro(TIPO_VOTO, conteudo))
+            self._folhas.append(self._ultimo_hash)
+            self.total += 1
+            if len(self._folhas) >= self.intervalo_checkpoint:
+                partes.append(self._checkpoint())
+                checkpoint = True
+        self._arquivo.write(b"".join(partes))
+        self._arquivo.flush()
+        if checkpoint:
+            self._sincronizar()
+
+    def fechar(self):
+        if self._arquivo is None:
+            return
+        if self._folhas:
+            self._arquivo.write(self._checkpoint())
+        self._arquivo.flush()
+        try:
+            self._esperar_fsync()
+            os.fsync(self._arquivo.fileno())
+        finally:
+            self._arquivo.close()
+            self._arquivo = None
+
+    def _registro(self, tipo: int, conteudo: bytes) -> bytes:
+        corpo = _CABECALHO.pack(tipo, len(conteudo)) + conteudo
+        self._ultimo_hash = _sha256(self._ultimo_hash + corpo)
+        return corpo + self._ultimo_hash
+
+    def _checkpoint(self) -> bytes:
+        conteudo = _CHECKPOINT.pack(self.total, len(self._folhas), raiz_merkle(self._folhas))
+        self._folhas = []
+        return self._registro(TIPO_CHECKPOINT, conteudo)
+
+    def _sincronizar(self):
+        # o anterior já terminou quase sempre; se falhou, o erro aparece aqui e não se perde
+        if self._fsync is not None and self._fsync.done():
+            self._esperar_fsync()
+        self._fsync = _EXECUTOR_FSYNC.submit(os.fsync, self._arquivo.fileno())
+
+    def _esperar_fsync(self):
+        fsync, self._fsync = self._fsync, None
+        if fsync is not None:
+            fsync.result()
+
+
+def verificar_segmento(caminho: str, matriculas: set, eleicao_da_chapa: Optional[dict] = None) -> dict:
+    """
+    Percorre o segmento via mmap refazendo a cadeia de hashes e as raízes de Merkle.
+    Soma os votos por chapa e acusa matrícula repetida (em `matriculas`, comum a todos os segmentos).
+    Com `eleicao_da_chapa` (chapa_id -> eleicao_id), a repetição é contada dentro de cada eleição.
+    """
+    nome = os.path.basename(caminho)
+    resultado = {
+        "segmento": nome, "votos": 0, "totais": Counter(), "checkpoints": 0,
+        "sem_checkpoint": 0, "ultima_raiz": None, "problemas": [],
+    }
+    if os.path.getsize(caminho) < len(MAGICO):
+        resultado["problemas"].append("arquivo menor que o cabeçalho")
+        return resultado
+
+    with open(caminho, "rb") as arquivo, mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+        if dados[:len(MAGICO)] != MAGICO:
+            resultado["problemas"].append("cabeçalho inválido")
+            return resultado
+        tamanho_total = len(dados)
+        ultimo_hash = hash_inicial(nome)
+        folhas = []
+        totais = resultado["totais"]
+        votos = 0
+        posicao = len(MAGICO)
+        tamanho_cabecalho = _CABECALHO.size
+        tamanho_voto = _VOTO.size
+        while posicao < tamanho_total:
+            if posicao + tamanho_cabecalho > tamanho_total:
+                resultado["problemas"].append(f"registro incompleto no byte {posicao} (fim do arquivo)")
+                break
+            tipo, tamanho = _CABECALHO.unpack_from(dados, posicao)
+            fim_corpo = posicao + tamanho_cabecalho + tamanho
+            fim = fim_corpo + _TAMANHO_HASH
+            if fim > tamanho_total:
+                resultado["problemas"].append(f"registro incompleto no byte {posicao} (fim do arquivo)")
+                break
+            ultimo_hash = _sha256(ultimo_hash + dados[posicao:fim_corpo])
+            if ultimo_hash != dados[fim_corpo:fim]:
+                # daqui em diante nada é confiável
+                resultado["problemas"].append(f"cadeia de hashes quebrada no byte {posicao}")
+                break
+
+            if tipo == TIPO_VOTO:
+                inicio = posicao + tamanho_cabecalho
+                chapa_id, _ = _VOTO.unpack_from(dados, inicio)
+                matricula = dados[inicio + tamanho_voto:fim_corpo]
+                chave = matricula if eleicao_da_chapa is None else (eleicao_da_chapa.get(chapa_id), matricula)
+                if chave in matriculas:
+                    resultado["problemas"].append(f"matrícula {matricula.decode()} votou mais de uma vez")
+                matriculas.add(chave)
+                totais[chapa_id] += 1
+                folhas.append(ultimo_hash)
+                votos += 1
+            elif tipo == TIPO_CHECKPOINT:
+                total, bloco, raiz = _CHECKPOINT.unpack_from(dados, posicao + tamanho_cabecalho)
+                if total != votos or bloco != len(folhas) or raiz != raiz_merkle(folhas):
+                    resultado["problemas"].append(f"checkpoint divergente no byte {posicao}")
+                resultado["checkpoints"] += 1
+                resultado["ultima_raiz"] = raiz.hex()
+                folhas = []
+            else:
+                resultado["problemas"].append(f"tipo de registro desconhecido ({tipo}) no byte {posicao}")
+            posicao = fim
+
+        resultado["votos"] = votos
+        resultado["sem_checkpoint"] = len(folhas)
+    return resultado
+
+
+def verificar_pasta(pasta: str = LEDGER_DIR, eleicao_da_chapa: Optional[dict] = None) -> dict:
+    """Verifica todos os segmentos e soma os totais por chapa."""
+    segmentos = sorted(
+        os.path.join(pasta, nome) for nome in os.listdir(pasta) if nome.endswith(".seg")
+    ) if os.path.isdir(pasta) else []
+    matriculas = set()
+    totais = Counter()
+    resultados = []
+    for caminho in segmentos:
+        resultado = verificar_segmento(caminho, matriculas, eleicao_da_chapa)
+        totais.update(resultado["totais"])
+        resultados.append(resultado)
+    return {"segmentos": resultados, "totais": totais, "votos": sum(totais.values())}
+
+
+ledger = Ledger()
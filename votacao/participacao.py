@@ -0,0 +1,100 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import bindparam, delete, DateTime
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import insert_dialeto
+from models import Chapa, Voto, VotosPorMinuto
+
+INTERVALOS = {"minuto": timedelta(minutes=1), "hora": timedelta(hours=1)}
+
+_tabela = VotosPorMinuto.__table__
+_upsert = insert_dialeto(_tabela).values(
+    minuto=bindparam("b_minuto", type_=DateTime),
+    chapa_id=bindparam("b_chapa_id"),
+    total=bindparam("b_quantidade"),
+)
+_SOMAR_MINUTO = _upsert.on_conflict_do_update(
+    index_elements=[_tabela.c.minuto, _tabela.c.chapa_id],
+    set_={"total": _tabela.c.total + _upsert.excluded.total},
+)
+
+
+def minuto_de(horario: datetime) -> datetime:
+    return horario.replace(second=0, microsecond=0)
+
+
+async def somar_minutos(db: AsyncSession, por_minuto: Counter):
+    # por_minuto: (minuto, chapa_id) -> votos aceitos; roda dentro da transação do voto
+    await db.execute(_SOMAR_MINUTO, [
+        {"b_minuto": minuto, "b_chapa_id": chapa_id, "b_quantidade": quantidade}
+        for (minuto, chapa_id), quantidade in por_minuto.items()
+    ])
+
+
+def reconstruir_minutos(conn: Connection):
+    """Refaz VotosPorMinuto a partir de Voto (migração e --reconciliar-contagem)."""
+    conn.execute(delete(VotosPorMinuto))
+    por_minuto = Counter()
+    votos = conn.execute(select(Voto.horario, Voto.chapa_id).execution_options(yield_per=5000))
+    for horario, chapa_id in votos:
+        por_minuto[(minuto_de(horario), chapa_id)] += 1
+    if por_minuto:
+        conn.execute(_SOMAR_MINUTO, [
+            {"b_minuto": minuto, "b_chapa_id": chapa_id, "b_quantidade": quantidade}
+            for (minuto, chapa_id), quantidade in por_minuto.items()
+        ])
+
+
+async def participacao(db: AsyncSession, intervalo: str = "minuto", eleicao_id: Optional[int] = None) -> dict:
+    """
+    Série temporal de votos por chapa, por intervalo e acumulada, pronta para o gráfico.
+    Uma consulta em VotosPorMinuto (minutos com voto × chapas), independente do total de votos.
+    """
+    passo = INTERVALOS[intervalo]
+    consulta = (
+        select(VotosPorMinuto.minuto, VotosPorMinuto.chapa_id, Chapa.chapa_nome, VotosPorMinuto.total)
+        .join(Chapa, Chapa.chapa_id == VotosPorMinuto.chapa_id)
+        .order_by(VotosPorMinuto.minuto)
+    )
+    if eleicao_id is not None:
+        consulta = consulta.where(Chapa.eleicao_id == eleicao_id)
+    result = await db.execute(consulta)
+    linhas = result.all()
+    if not linhas:
+        return {"intervalo": intervalo, "rotulos": [], "chapas": [], "total": [], "acumulado": []}
+
+    def faixa(minuto: datetime) -> datetime:
+        return minuto if intervalo == "minuto" else minuto.replace(minute=0)
+
+    inicio, fim = faixa(linhas[0].minuto), faixa(linhas[-1].minuto)
+    quantidade = int((fim - inicio) / passo) + 1  # faixas sem voto também entram, com zero
+    nomes = {}
+    votos = {}
+    for minuto, chapa_id, chapa_nome, total in linhas:
+        nomes[chapa_id] = chapa_nome
+        serie = votos.setdefault(chapa_id, [0] * quantidade)
+        serie[int((faixa(minuto) - inicio) / passo)] += total
+
+    def acumular(serie):
+        soma, saida = 0, []
+        for valor in serie:
+            soma += valor
+            saida.append(soma)
+        return saida
+
+    total = [sum(coluna) for coluna in zip(*votos.values())]
+    return {
+        "intervalo": intervalo,
+        "rotulos": [(inicio + i * passo).strftime("%Y-%m-%dT%H:%M") for i in range(quantidade)],
+        "chapas": [
+            {"chapa_id": chapa_id, "chapa_nome": nomes[chapa_id], "votos": serie, "acumulado": acumular(serie)}
+            for chapa_id, serie in sorted(votos.items())
+        ],
+        "total": total,
+        "acumulado": acumular(total),
+    }
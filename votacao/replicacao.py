@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import asyncio
+import urllib.request
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import literal_column, func, delete
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, insert_dialeto, engine
+from models import User, Chapa, Voto, ContagemChapa, Versao, Eleicao, VotosPorMinuto
+from auth.cache import cache_usuarios
+from .cache_chapas import cache_chapas
+from .cache_eleicoes import cache_eleicoes
+from .transmissao import transmissor
+from .participacao import somar_minutos, minuto_de
+from .votacao_handler import _incrementar_contagem
+
+# Réplica somente leitura: com REPLICA_DE=http://primario:8000, este processo puxa do primário
+# os votos, chapas e mesários novos e serve resultados, exportação e participação do próprio banco.
+# O primário expõe o feed em /eleicao/replicacao/alteracoes, protegido por REPLICACAO_TOKEN.
+REPLICA_DE = os.getenv("REPLICA_DE")
+MODO_REPLICA = bool(REPLICA_DE)
+REPLICACAO_TOKEN = os.getenv("REPLICACAO_TOKEN")
+REPLICACAO_INTERVALO = float(os.getenv("REPLICACAO_INTERVALO", "1.0"))  # segundos entre consultas ao primário
+REPLICACAO_LOTE = int(os.getenv("REPLICACAO_LOTE", "5000"))  # votos por resposta do feed
+
+# posição no feed = maior id já recebido de cada tabela. No SQLite (um escritor por vez) o rowid
+# de Voto segue a ordem dos commits; só o arquivamento apaga votos, e aí o rowid pode ser
+# reaproveitado: a "época" (Versao "arquivamentos") muda e a réplica relê os votos do começo.
+# As eleições (poucas linhas, que mudam ao encerrar/arquivar) vão inteiras em toda resposta.
+# Usuários já enviados podem mudar (senha, desativação): o feed leva a versão "usuarios" e,
+# quando ela muda, a réplica pede a lista inteira de novo (posição 0) e a aplica por cima
+_FONTES = ("votos", "chapas", "usuarios")
+_ROWID_VOTO = literal_column(f'"{Voto.__tablename__}".rowid')
+
+
+def verificar_dialeto(dialeto: str = engine.dialect.name):
+    """
+    O feed segue o rowid implícito de Voto, que só o SQLite tem: no PostgreSQL nem o primário
+    (REPLICACAO_TOKEN) nem a réplica (REPLICA_DE) sobem, em vez de falhar a cada consulta.
+    """
+    if dialeto != "sqlite" and (REPLICACAO_TOKEN or MODO_REPLICA):
+        raise RuntimeError(
+            f"Replicação só funciona com SQLite (banco atual: {dialeto}); "
+            "remova REPLICACAO_TOKEN/REPLICA_DE ou use a replicação do próprio banco"
+        )
+
+
+def ler_posicao(texto: Optional[str]) -> dict[str, int]:
+    """"votos.chapas.usuarios" -> dict; vazio = desde o começo."""
+    if not texto:
+        return dict.fromkeys(_FONTES, 0)
+    partes = texto.split(".")
+    if len(partes) != len(_FONTES):
+        raise ValueError("posição inválida; use votos.chapas.usuarios")
+    return {fonte: int(parte) for fonte, parte in zip(_FONTES, partes)}
+
+
+def formatar_posicao(posicao: dict[str, int]) -> str:
+    return ".".join(str(posicao[fonte]) for fonte in _FONTES)
+
+
+async def alteracoes(db: AsyncSession, desde: dict[str, int], limite: int = REPLICACAO_LOTE) -> dict:
+    """Lado do primário: o que foi gravado depois de `desde`, lido numa única transação."""
+    async with db.begin():
+        votos = (await db.execute(
+            select(_ROWID_VOTO, Voto.eleicao_id, Voto.matricula, Voto.horario, Voto.chapa_id)
+            .where(_ROWID_VOTO > desde["votos"]).order_by(_ROWID_VOTO).limit(limite)
+        )).all()
+        chapas = (await db.execute(
+            select(Chapa.chapa_id, Chapa.chapa_nome, Chapa.eleicao_id)
+            .where(Chapa.chapa_id > desde["chapas"]).order_by(Chapa.chapa_id)
+        )).all()
+        eleicoes = (await db.execute(
+            select(Eleicao.eleicao_id, Eleicao.nome, Eleicao.criada_em, Eleicao.encerrada_em, Eleicao.arquivo)
+            .order_by(Eleicao.eleicao_id)
+        )).all()
+        epoca = (await db.execute(select(Versao.valor).where(Versao.nome == "arquivamentos"))).scalar() or 0
+        usuarios_versao = (await db.execute(select(Versao.valor).where(Versao.nome == "usuarios"))).scalar() or 0
+        usuarios = (await db.execute(
+            select(User.user_id, User.username, User.hashed_password, User.is_active)
+            .where(User.user_id > desde["usuarios"]).order_by(User.user_id)
+        )).all()
+        ultimo_voto = (await db.execute(select(func.max(_ROWID_VOTO)).select_from(Voto))).scalar() or 0
+
+    posicao = {
+        "votos": votos[-1][0] if votos else desde["votos"],
+        "chapas": chapas[-1][0] if chapas else desde["chapas"],
+        "usuarios": usuarios[-1][0] if usuarios else desde["usuarios"],
+    }
+    return {
+        "posicao": formatar_posicao(posicao),
+        "pendentes": ultimo_voto - posicao["votos"],
+        "epoca": epoca,
+        "usuarios_versao": usuarios_versao,
+        "gerado_em": time.time(),
+        "eleicoes": [
+            [eleicao_id, nome, _iso(criada_em), _iso(encerrada_em), arquivo]
+            for eleicao_id, nome, criada_em, encerrada_em, arquivo in eleicoes
+        ],
+        "votos": [
+            [eleicao_id, matricula, horario.isoformat(), chapa_id]
+            for _, eleicao_id, matricula, horario, chapa_id in votos
+        ],
+        "chapas": [list(chapa) for chapa in chapas],
+        "usuarios": [list(usuario) for usuario in usuarios],
+    }
+
+
+def _iso(horario: Optional[datetime]) -> Optional[str]:
+    return horario.isoformat() if horario else None
+
+
+def _data(texto: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(texto) if texto else None
+
+
+_GRAVAR_POSICAO = insert_dialeto(Versao.__table__)
+_GRAVAR_POSICAO = _GRAVAR_POSICAO.on_conflict_do_update(
+    index_elements=[Versao.__table__.c.nome], set_={"valor": _GRAVAR_POSICAO.excluded.valor},
+)
+_GRAVAR_ELEICAO = insert_dialeto(Eleicao.__table__)
+_GRAVAR_ELEICAO = _GRAVAR_ELEICAO.on_conflict_do_update(
+    index_elements=[Eleicao.__table__.c.eleicao_id],
+    set_={coluna: getattr(_GRAVAR_ELEICAO.excluded, coluna) for coluna in ("nome", "encerrada_em", "arquivo")},
+)
+_GRAVAR_USUARIO = insert_dialeto(User.__table__)
+_GRAVAR_USUARIO = _GRAVAR_USUARIO.on_conflict_do_update(
+    index_elements=[User.__table__.c.user_id],
+    set_={coluna: getattr(_GRAVAR_USUARIO.excluded, coluna) for coluna in ("username", "hashed_password", "is_active")},
+)
+
+
+class Replicador:
+    """
+    Lado da réplica: a cada REPLICACAO_INTERVALO busca o feed do primário e aplica tudo numa
+    transação, junto com a nova posição (linhas "replicacao_*" de Versao). Se o processo cair
+    no meio, nada do lote fica gravado e ele é buscado de novo.
+    """
+
+    def __init__(self, primario: str = REPLICA_DE, session_factory=AsyncSessionLocal,
+                 intervalo: float = REPLICACAO_INTERVALO, token: Optional[str] = REPLICACAO_TOKEN):
+        self.primario = (primario or "").rstrip("/")
+        self.session_factory = session_factory
+        self.intervalo = intervalo
+        self.token = token
+        self.posicao = ler_posicao(None)
+        self.epoca = 0
+        self.usuarios_versao = 0
+        self.eleicoes: list = []
+        self.pendentes: Optional[int] = None
+        self.ultima_sincronizacao: Optional[float] = None
+        self.ultimo_erro: Optional[str] = None
+        self.votos_aplicados = 0
+        self._tarefa: Optional[asyncio.Task] = None
+
+    async def iniciar(self):
+        async with self.session_factory() as db:
+            linhas = dict((await db.execute(
+                select(Versao.nome, Versao.valor).where(Versao.nome.in_([f"replicacao_{f}" for f in (*_FONTES, "epoca", "usuarios_versao")]))
+            )).all())
+        self.posicao = {fonte: linhas.get(f"replicacao_{fonte}", 0) for fonte in _FONTES}
+        self.epoca = linhas.get("replicacao_epoca", 0)
+        self.usuarios_versao = linhas.get("replicacao_usuarios_versao", 0)
+        self._tarefa = asyncio.create_task(self._replicar())
+
+    async def parar(self):
+        if self._tarefa is None:
+            return
+        self._tarefa.cancel()
+        try:
+            await self._tarefa
+        except asyncio.CancelledError:
+            pass
+        self._tarefa = None
+
+    def _buscar(self) -> dict:
+        url = f"{self.primario}/eleicao/replicacao/alteracoes?desde={formatar_posicao(self.posicao)}"
+        requisicao = urllib.request.Request(url, headers={"Authorization": f"Bearer {self.token}"})
+        with urllib.request.urlopen(requisicao, timeout=30) as resposta:
+            return json.load(resposta)
+
+    async def _replicar(self):
+        while True:
+            try:
+                feed = await asyncio.to_thread(self._buscar)
+                await self.aplicar(feed)
+                self.ultima_sincronizacao = time.time()
+                self.ultimo_erro = None
+                if feed["pendentes"]:
+                    continue  # ainda atrás: busca o próximo lote sem esperar
+            except (OSError, ValueError, OperationalError) as e:
+                # primário fora do ar ou banco local ocupado: tenta de novo no próximo intervalo
+                self.ultimo_erro = str(e)
+            await asyncio.sleep(self.intervalo)
+
+    async def aplicar(self, feed: dict):
+        posicao = ler_posicao(feed["posicao"])
+        if feed["epoca"] != self.epoca:
+            # o primário arquivou uma eleição: rowids já vistos podem voltar com outros votos.
+            # Relê os votos do começo; os que já estão aqui esbarram na PK e não contam de novo
+            posicao["votos"] = 0
+        # lista inteira de usuários: pedida desde 0, ela substitui a da réplica
+        usuarios_completos = self.posicao["usuarios"] == 0
+        usuarios_versao = self.usuarios_versao
+        if feed["usuarios_versao"] != self.usuarios_versao:
+            if usuarios_completos:
+                usuarios_versao = feed["usuarios_versao"]
+            else:
+                # um usuário já replicado mudou: a próxima busca traz todos de novo
+                posicao["usuarios"] = 0
+        por_chapa = Counter()
+        por_minuto = Counter()
+        eleicao_da_chapa = {}
+        totais = {}
+        async with self.session_factory() as db:
+            eleicoes_mudaram = feed["eleicoes"] != self.eleicoes
+            if eleicoes_mudaram:
+                await self._aplicar_eleicoes(db, feed["eleicoes"])
+            if feed["chapas"]:
+                await db.execute(insert_dialeto(Chapa.__table__).on_conflict_do_nothing(), [
+                    {"chapa_id": chapa_id, "chapa_nome": nome, "eleicao_id": eleicao_id}
+                    for chapa_id, nome, eleicao_id in feed["chapas"]
+                ])
+                await db.execute(insert_dialeto(ContagemChapa.__table__).on_conflict_do_nothing(), [
+                    {"chapa_id": chapa_id, "total_votos": 0} for chapa_id, _, _ in feed["chapas"]
+                ])
+            if feed["usuarios"]:
+                await db.execute(_GRAVAR_USUARIO, [
+                    {"user_id": user_id, "username": username, "hashed_password": senha, "is_active": ativo}
+                    for user_id, username, senha, ativo in feed["usuarios"]
+                ])
+            if usuarios_completos and usuarios_versao != self.usuarios_versao:
+                # removido no primário: também some daqui
+                await db.execute(delete(User.__table__).where(
+                    User.user_id.not_in([usuario[0] for usuario in feed["usuarios"]])
+                ))
+            if feed["votos"]:
+                # só conta o que entrou de fato: a réplica pode ter começado de uma cópia do primário
+                inseridos = await db.execute(
+                    insert_dialeto(Voto.__table__).on_conflict_do_nothing()
+                    .returning(Voto.eleicao_id, Voto.horario, Voto.chapa_id),
+                    [
+                        {
+                            "eleicao_id": eleicao_id, "matricula": matricula,
+                            "horario": datetime.fromisoformat(horario), "chapa_id": chapa_id,
+                        }
+                        for eleicao_id, matricula, horario, chapa_id in feed["votos"]
+                    ],
+                )
+                for eleicao_id, horario, chapa_id in inseridos:
+                    eleicao_da_chapa[chapa_id] = eleicao_id
+                    por_chapa[chapa_id] += 1
+                    por_minuto[(minuto_de(horario), chapa_id)] += 1
+                for chapa_id, quantidade in por_chapa.items():
+                    totais[chapa_id] = await _incrementar_contagem(db, chapa_id, quantidade)
+                await somar_minutos(db, por_minuto)
+            await db.execute(
+                _GRAVAR_POSICAO,
+                [{"nome": f"replicacao_{fonte}", "valor": posicao[fonte]} for fonte in _FONTES]
+                + [
+                    {"nome": "replicacao_epoca", "valor": feed["epoca"]},
+                    {"nome": "replicacao_usuarios_versao", "valor": usuarios_versao},
+                ],
+            )
+            await db.commit()
+
+        self.posicao = posicao
+        self.epoca = feed["epoca"]
+        if feed["usuarios"] or usuarios_versao != self.usuarios_versao:
+            cache_usuarios.limpar()
+        self.usuarios_versao = usuarios_versao
+        if eleicoes_mudaram:
+            self.eleicoes = feed["eleicoes"]
+            cache_eleicoes.invalidar()
+            cache_chapas.invalidar()
+        self.pendentes = feed["pendentes"]
+        self.votos_aplicados += sum(por_chapa.values())
+        if feed["chapas"]:
+            cache_chapas.invalidar()
+        for chapa_id, total in totais.items():
+            transmissor.notificar(eleicao_da_chapa[chapa_id], chapa_id, total)
+
+    async def _aplicar_eleicoes(self, db: AsyncSession, eleicoes: list):
+        arquivadas_antes = set((await db.execute(
+            select(Eleicao.eleicao_id).where(Eleicao.arquivo.is_not(None))
+        )).scalars())
+        await db.execute(_GRAVAR_ELEICAO, [
+            {
+                "eleicao_id": eleicao_id, "nome": nome, "criada_em": _data(criada_em),
+                "encerrada_em": _data(encerrada_em), "arquivo": arquivo,
+            }
+            for eleicao_id, nome, criada_em, encerrada_em, arquivo in eleicoes
+        ])
+        # arquivada no primário: some daqui também (o arquivo fica só no primário)
+        for eleicao_id, *_, arquivo in eleicoes:
+            if arquivo and eleicao_id not in arquivadas_antes:
+                chapas = select(Chapa.chapa_id).where(Chapa.eleicao_id == eleicao_id).scalar_subquery()
+                await db.execute(delete(Voto.__table__).where(Voto.eleicao_id == eleicao_id))
+                await db.execute(delete(VotosPorMinuto.__table__).where(VotosPorMinuto.chapa_id.in_(chapas)))
+                await db.execute(delete(ContagemChapa.__table__).where(ContagemChapa.chapa_id.in_(chapas)))
+                await db.execute(delete(Chapa.__table__).where(Chapa.eleicao_id == eleicao_id))
+
+    def estatisticas(self) -> dict:
+        atraso = None if self.ultima_sincronizacao is None else round(time.time() - self.ultima_sincronizacao, 3)
+        return {
+            "modo": "replica",
+            "primario": self.primario,
+            "posicao": formatar_posicao(self.posicao),
+            "votos_pendentes": self.pendentes,
+            "segundos_desde_sincronizacao": atraso,
+            "votos_aplicados": self.votos_aplicados,
+            "ultimo_erro": self.ultimo_erro,
+        }
+
+
+replicador = Replicador()
+
+
+# escrita numa réplica iria para um banco que o primário nunca vê
+_ESCRITAS_PERMITIDAS = ("/auth/login", "/auth/logout")
+
+
+class SomenteLeituraMiddleware:
+    """Na réplica, recusa com 403 qualquer escrita (votos, chapas, importação, registro)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS") or scope["path"] in _ESCRITAS_PERMITIDAS:
+            return await self.app(scope, receive, send)
+        corpo = '{"detail":"Réplica somente leitura: vote e cadastre no servidor primário."}'.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 403,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode())],
+        })
+        await send({"type": "http.response.body", "body": corpo})
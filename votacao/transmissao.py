@@ -0,0 +1,124 @@
+import os
+import json
+import asyncio
+from typing import Optional
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.future import select
+
+from database import AsyncSessionLocal, MULTIPROCESSO
+from models import Chapa, ContagemChapa
+
+# janela de agregação: uma rajada de votos gera um único envio por intervalo
+INTERVALO_TRANSMISSAO = float(os.getenv("RESULTADOS_INTERVALO", "1.0"))
+TAMANHO_FILA_OBSERVADOR = 16
+
+
+class TransmissorResultados:
+    """
+    Fan-out único dos resultados para todas as telas de observação.
+    Os votos só marcam a chapa como pendente; a cada intervalo uma única
+    mensagem JSON por eleição é montada e repassada para as filas de quem
+    acompanha aquela eleição.
+
+    Com vários workers, um voto gravado em outro processo não passa por notificar()
+    daqui: enquanto houver observadores, cada intervalo também relê ContagemChapa
+    (uma linha por chapa) e transmite o que mudou.
+    """
+
+    def __init__(self, intervalo: float = INTERVALO_TRANSMISSAO, compartilhado: bool = MULTIPROCESSO, session_factory=AsyncSessionLocal):
+        self.intervalo = intervalo
+        self.compartilhado = compartilhado
+        self.session_factory = session_factory
+        self.contagens: dict[int, int] = {}
+        self.eleicao_da_chapa: dict[int, int] = {}
+        self.pendentes: set[int] = set()
+        self.observadores: dict[asyncio.Queue, int] = {}  # fila -> eleicao_id
+        self._tarefa: Optional[asyncio.Task] = None
+
+    def carregar(self, eleicao_id: int, contagens):
+        # contagens da eleição no formato de listar_contagens: (chapa_id, chapa_nome, votos)
+        for chapa_id, _, votos in contagens:
+            self.contagens[chapa_id] = votos
+            self.eleicao_da_chapa[chapa_id] = eleicao_id
+
+    def notificar(self, eleicao_id: int, chapa_id: int, total_chapa: int):
+        self.contagens[chapa_id] = total_chapa
+        self.eleicao_da_chapa[chapa_id] = eleicao_id
+        if not self.observadores:
+            return
+        self.pendentes.add(chapa_id)
+        if self._tarefa is None or self._tarefa.done():
+            self._tarefa = asyncio.create_task(self._transmitir())
+
+    def assinar(self, eleicao_id: int) -> asyncio.Queue:
+        fila = asyncio.Queue(maxsize=TAMANHO_FILA_OBSERVADOR)
+        self.observadores[fila] = eleicao_id
+        if self.compartilhado and (self._tarefa is None or self._tarefa.done()):
+            self._tarefa = asyncio.create_task(self._transmitir())
+        return fila
+
+    def cancelar(self, fila: asyncio.Queue):
+        self.observadores.pop(fila, None)
+
+    def snapshot(self, eleicao_id: int) -> str:
+        return self._mensagem(eleicao_id, self._chapas_da(eleicao_id))
+
+    def _chapas_da(self, eleicao_id: int) -> list[int]:
+        return sorted(chapa_id for chapa_id, eleicao in self.eleicao_da_chapa.items() if eleicao == eleicao_id)
+
+    def _mensagem(self, eleicao_id: int, chapa_ids) -> str:
+        return json.dumps({
+            "eleicao_id": eleicao_id,
+            "chapas": [
+                {"chapa_id": chapa_id, "total_votos": self.contagens.get(chapa_id, 0)}
+                for chapa_id in chapa_ids
+            ],
+            "total_votos": sum(self.contagens.get(chapa_id, 0) for chapa_id in self._chapas_da(eleicao_id)),
+        })
+
+    async def _transmitir(self):
+        while self.observadores:
+            await asyncio.sleep(self.intervalo)
+            if self.compartilhado:
+                await self._sincronizar()
+            if not self.pendentes:
+                if self.compartilhado:
+                    continue
+                break
+            pendentes, self.pendentes = self.pendentes, set()
+            por_eleicao = {}
+            for chapa_id in sorted(pendentes):
+                por_eleicao.setdefault(self.eleicao_da_chapa.get(chapa_id), []).append(chapa_id)
+            # uma mensagem por eleição, montada uma vez para todos os observadores dela
+            mensagens = {eleicao_id: self._mensagem(eleicao_id, chapas) for eleicao_id, chapas in por_eleicao.items()}
+            for fila, eleicao_id in list(self.observadores.items()):
+                mensagem = mensagens.get(eleicao_id)
+                if mensagem is None:
+                    continue
+                try:
+                    fila.put_nowait(mensagem)
+                except asyncio.QueueFull:
+                    # observador lento: descarta o atrasado e manda o estado completo
+                    while not fila.empty():
+                        fila.get_nowait()
+                    fila.put_nowait(self.snapshot(eleicao_id))
+        self.pendentes.clear()
+
+    async def _sincronizar(self):
+        try:
+            async with self.session_factory() as db:
+                linhas = (await db.execute(
+                    select(ContagemChapa.chapa_id, Chapa.eleicao_id, ContagemChapa.total_votos)
+                    .join(Chapa, Chapa.chapa_id == ContagemChapa.chapa_id)
+                )).all()
+        except OperationalError:
+            return  # banco ocupado: fica para o próximo intervalo
+        for chapa_id, eleicao_id, total in linhas:
+            self.eleicao_da_chapa[chapa_id] = eleicao_id
+            if self.contagens.get(chapa_id) != total:
+                self.contagens[chapa_id] = total
+                self.pendentes.add(chapa_id)
+
+
+transmissor = TransmissorResultados()
@@ -1,29 +1,61 @@
-from fastapi import HTTPException,status
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException,UploadFile,status
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession 
 
-from sqlalchemy import func
+from sqlalchemy import func, update, delete, insert, bindparam, String, DateTime, Integer
 
-from schemas import ChapaCreate,VotoCreate
-from models import User,Chapa,Voto
+from database import insert_dialeto
+from schemas import ChapaCreate,VotoCreate,VotoResultado,VotosResposta,EleicaoCreate
+from models import User,Chapa,Voto,ContagemChapa,Eleitor,Eleicao
+from data_handler import ler_eleitores
+from metricas import voto_etapa_segundos, votos_gravados_total, votos_recusados_total
+from .transmissao import transmissor
+from .indice_votos import indice_votos
+from .cache_chapas import cache_chapas
+from .cache_eleicoes import cache_eleicoes
+from .coordenacao import incrementar_versao
+from .participacao import somar_minutos, minuto_de, reconstruir_minutos
+from .ledger import ledger
+
+# Com EXIGIR_ELEITOR=1 só votam matrículas importadas em /eleicao/importar-eleitores
+EXIGIR_ELEITOR = os.getenv("EXIGIR_ELEITOR", "0") == "1"
+VOTOS_LOTE_MAX = int(os.getenv("VOTOS_LOTE_MAX", "500"))  # votos por requisição em /eleicao/api/votos
+IMPORTACAO_BLOCO = 5000
+MAX_DETALHES_IMPORTACAO = 100
 
 async def cadastrar_chapa(nova_chapa:ChapaCreate,user:User,db:AsyncSession):
     if not user:
         raise HTTPException(status_code=401,detail="Usuário não autorizado")
 
-    chapa_result = await db.execute(select(Chapa).where(func.lower(Chapa.chapa_nome) == nova_chapa.chapa_nome.lower()))
+    eleicao = await cache_eleicoes.resolver(db, nova_chapa.eleicao_id)
+    if eleicao.encerrada_em is not None:
+        raise HTTPException(status_code=409, detail="Eleição encerrada")
+
+    chapa_result = await db.execute(select(Chapa).where(
+        Chapa.eleicao_id == eleicao.eleicao_id,
+        func.lower(Chapa.chapa_nome) == nova_chapa.chapa_nome.lower(),
+    ))
     chapa_obj = chapa_result.scalars().first()
 
     if chapa_obj:
         raise HTTPException(status_code=409, detail="Chapa já criada")
     
     db_chapa = Chapa(
-        chapa_nome=nova_chapa.chapa_nome
+        chapa_nome=nova_chapa.chapa_nome,
+        eleicao_id=eleicao.eleicao_id,
     )
 
     try:
         db.add(db_chapa)
+        await db.flush()
+        db.add(ContagemChapa(chapa_id=db_chapa.chapa_id, total_votos=0))
+        await incrementar_versao(db, "chapas")
         await db.commit()
     except IntegrityError as e:
         await db.rollback()
@@ -31,41 +63,394 @@ async def cadastrar_chapa(nova_chapa:ChapaCreate,user:User,db:AsyncSession):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Erro ao criar chapa. Detalhes: {str(e)}",
         )
+    indice_votos.registrar_chapa(db_chapa.chapa_id, eleicao.eleicao_id)
+    cache_chapas.invalidar()
     return {"message":"Chapa cadastrada com sucesso"}
+
+
+async def criar_eleicao(nova_eleicao:EleicaoCreate, user:User, db:AsyncSession):
+    if not user:
+        raise HTTPException(status_code=401,detail="Usuário não autorizado")
+    nome = nova_eleicao.nome.strip()
+    if not nome or len(nome) > 100:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nome da eleição inválido")
+    eleicao = Eleicao(nome=nome, criada_em=datetime.now())
+    db.add(eleicao)
+    await db.flush()
+    await incrementar_versao(db, "eleicoes")
+    await db.commit()
+    cache_eleicoes.invalidar()
+    return {"eleicao_id": eleicao.eleicao_id, "nome": eleicao.nome}
+
+
+async def encerrar_eleicao(eleicao_id:int, user:User, db:AsyncSession):
+    # depois de encerrada, a eleição não aceita votos nem chapas; não há como reabrir
+    if not user:
+        raise HTTPException(status_code=401,detail="Usuário não autorizado")
+    result = await db.execute(
+        update(Eleicao)
+        .where(Eleicao.eleicao_id == eleicao_id, Eleicao.encerrada_em.is_(None))
+        .values(encerrada_em=datetime.now())
+        .returning(Eleicao.eleicao_id)
+    )
+    if result.scalar() is None:
+        await db.rollback()
+        if await db.get(Eleicao, eleicao_id) is None:
+            raise HTTPException(status_code=404, detail="Eleição não existe")
+        raise HTTPException(status_code=409, detail="Eleição já encerrada")
+    await incrementar_versao(db, "eleicoes")
+    await db.commit()
+    cache_eleicoes.invalidar()
+    indice_votos.encerrar(eleicao_id)
+    return {"message": "Eleição encerrada"}
+
+
+async def listar_eleicoes(db:AsyncSession):
+    # votos por eleição somados de ContagemChapa (uma linha por chapa), não de Voto
+    result = await db.execute(
+        select(
+            Eleicao.eleicao_id, Eleicao.nome, Eleicao.criada_em, Eleicao.encerrada_em, Eleicao.arquivo,
+            func.count(Chapa.chapa_id), func.coalesce(func.sum(ContagemChapa.total_votos), 0),
+        )
+        .outerjoin(Chapa, Chapa.eleicao_id == Eleicao.eleicao_id)
+        .outerjoin(ContagemChapa, ContagemChapa.chapa_id == Chapa.chapa_id)
+        .group_by(Eleicao.eleicao_id)
+        .order_by(Eleicao.eleicao_id)
+    )
+    return [
+        {
+            "eleicao_id": eleicao_id, "nome": nome, "criada_em": criada_em,
+            "encerrada_em": encerrada_em, "arquivo": arquivo, "chapas": chapas, "votos": votos,
+        }
+        for eleicao_id, nome, criada_em, encerrada_em, arquivo, chapas, votos in result.all()
+    ]
     
 
+# INSERT ... SELECT FROM Chapa ... ON CONFLICT DO NOTHING RETURNING matricula:
+# matrícula repetida ou chapa inexistente não inserem nada e não levantam erro.
+# Um IntegrityError aqui deixaria o cursor do aiosqlite vivo até o GC,
+# segurando o lock do SQLite e travando os outros terminais.
+# Montado uma vez com bindparams (Core) para pular o overhead do ORM a cada voto.
+# A eleição do voto é a da chapa, e só entra se ela ainda estiver aberta.
+def _montar_insert_voto(exigir_eleitor:bool):
+    chapa = Chapa.__table__
+    eleicao = Eleicao.__table__
+    origem = (
+        select(
+            chapa.c.eleicao_id,
+            bindparam("b_matricula", type_=String),
+            bindparam("b_horario", type_=DateTime),
+            chapa.c.chapa_id,
+        )
+        .select_from(chapa.join(eleicao, eleicao.c.eleicao_id == chapa.c.eleicao_id))
+        .where(chapa.c.chapa_id == bindparam("b_chapa_id"), eleicao.c.encerrada_em.is_(None))
+    )
+    if exigir_eleitor:
+        # busca pela PK de Eleitor, no mesmo statement
+        origem = origem.where(
+            select(Eleitor.__table__.c.matricula)
+            .where(Eleitor.__table__.c.matricula == bindparam("b_matricula"))
+            .exists()
+        )
+    return (
+        insert_dialeto(Voto.__table__)
+        .from_select(["eleicao_id", "matricula", "horario", "chapa_id"], origem)
+        .on_conflict_do_nothing(index_elements=[Voto.__table__.c.eleicao_id, Voto.__table__.c.matricula])
+        .returning(Voto.__table__.c.eleicao_id)
+    )
+
+
+_INSERT_VOTO = _montar_insert_voto(EXIGIR_ELEITOR)
+
+
+_INCREMENTAR_CONTAGEM = (
+    update(ContagemChapa.__table__)
+    .where(ContagemChapa.__table__.c.chapa_id == bindparam("b_chapa_id"))
+    .values(total_votos=ContagemChapa.__table__.c.total_votos + bindparam("b_quantidade"))
+    .returning(ContagemChapa.__table__.c.total_votos)
+)
+# linha ausente (chapa criada antes da tabela de contagem): cria a partir de Voto, que já tem os
+# votos desta transação. Se outra transação criou a linha no meio tempo, só soma os daqui
+_CRIAR_CONTAGEM = insert_dialeto(ContagemChapa.__table__).from_select(
+    ["chapa_id", "total_votos"],
+    select(bindparam("b_chapa_id", type_=Integer), func.count(Voto.matricula))
+    .where(Voto.chapa_id == bindparam("b_chapa_id", type_=Integer)),
+)
+_CRIAR_CONTAGEM = _CRIAR_CONTAGEM.on_conflict_do_update(
+    index_elements=[ContagemChapa.__table__.c.chapa_id],
+    set_={"total_votos": ContagemChapa.__table__.c.total_votos + bindparam("b_quantidade", type_=Integer)},
+).returning(ContagemChapa.__table__.c.total_votos)
+
+
 async def votar_chapa(novo_voto:VotoCreate,user:User,db:AsyncSession):
     if not user:
         raise HTTPException(status_code=401,detail="Usuário não autorizado")
-    
-    voto_result = await db.execute(select(Voto).where(Voto.matricula == novo_voto.matricula))
-    voto_obj = voto_result.scalars().first()
 
-    if voto_obj:
-        raise HTTPException(status_code=409, detail="Você já votou!")
-    
-    chapa_result = await db.execute(select(Chapa).where(Chapa.chapa_id == novo_voto.chapa_id))
-    chapa_obj = chapa_result.scalars().first()
-    
-    if not chapa_obj:
-        raise HTTPException(status_code=404, detail="Chapa não existe")
+    rejeicao, = await registrar_votos([novo_voto], db)
+    if rejeicao:
+        raise rejeicao
+    return {"message":"Voto cadastrado com sucesso"}
 
 
-    from datetime import datetime
-    db_voto = Voto(
-        matricula=novo_voto.matricula,
-        horario=datetime.now(),
-        chapa_id=novo_voto.chapa_id
-    )
+async def votar_lote(votos:list[VotoCreate],user:User,db:AsyncSession) -> VotosResposta:
+    if not user:
+        raise HTTPException(status_code=401,detail="Usuário não autorizado")
+    if not votos:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nenhum voto enviado")
+    if len(votos) > VOTOS_LOTE_MAX:
+        raise HTTPException(status_code=413, detail=f"Envie no máximo {VOTOS_LOTE_MAX} votos por vez")
+
+    # o lote inteiro numa transação; cada voto recebe o seu resultado
+    rejeicoes = await registrar_votos(votos, db)
+    resultados = [
+        VotoResultado(
+            matricula=voto.matricula,
+            chapa_id=voto.chapa_id,
+            status=rejeicao.status_code if rejeicao else 201,
+            detalhe=rejeicao.detail if rejeicao else None,
+        )
+        for voto, rejeicao in zip(votos, rejeicoes)
+    ]
+    recusados = sum(1 for rejeicao in rejeicoes if rejeicao)
+    return VotosResposta(aceitos=len(votos) - recusados, recusados=recusados, resultados=resultados)
+
+
+async def registrar_votos(votos:list[VotoCreate], db:AsyncSession) -> list[Optional[HTTPException]]:
+    """
+    Grava os votos numa única transação (um commit para todos).
+    Retorna, na ordem dos votos, None para voto aceito ou a HTTPException da recusa;
+    matrícula repetida dentro do próprio lote também é recusada.
+    """
+    # Sem SELECT prévio: um único INSERT decide cada voto, apoiado na PK (eleicao_id, matricula)
+    # de Voto e na FK de chapa_id (também elimina a corrida entre dois terminais com a mesma matrícula)
+    # matrícula que já votou ou chapa inexistente são recusadas pelo índice em memória,
+    # sem abrir transação
+    with voto_etapa_segundos.medir("indice"):
+        rejeicoes = [indice_votos.verificar(voto) for voto in votos]
+    if all(rejeicoes):
+        _contar_recusas(rejeicoes)
+        return rejeicoes
 
+    aceitos = []
+    ja_votaram = []
+    aceitos_por_chapa = {}
+    eleicao_da_chapa = {}
+    por_minuto = Counter()
     try:
-        db.add(db_voto)
-        await db.commit()
+        for i, voto in enumerate(votos):
+            if rejeicoes[i]:
+                continue
+            horario = datetime.now()
+            with voto_etapa_segundos.medir("insert"):
+                result = await db.execute(_INSERT_VOTO, {
+                    "b_matricula": voto.matricula,
+                    "b_horario": horario,
+                    "b_chapa_id": voto.chapa_id,
+                })
+            eleicao_id = result.scalar()
+            if eleicao_id is None:
+                with voto_etapa_segundos.medir("motivo_rejeicao"):
+                    rejeicoes[i], eleicao_id = await _motivo_rejeicao(voto, db)
+                if rejeicoes[i].status_code == 409:
+                    ja_votaram.append((eleicao_id, voto.matricula))
+            else:
+                aceitos.append((voto.matricula, voto.chapa_id, horario))
+                eleicao_da_chapa[voto.chapa_id] = eleicao_id
+                aceitos_por_chapa[voto.chapa_id] = aceitos_por_chapa.get(voto.chapa_id, 0) + 1
+                por_minuto[(minuto_de(horario), voto.chapa_id)] += 1
+
+        if not aceitos_por_chapa:
+            await db.rollback()
+            # nada foi inserido nesta transação: os 409 vieram de votos já gravados
+            # (outro processo ou banco alterado por fora) e passam a constar no índice
+            indice_votos.registrar_votos(ja_votaram)
+            _contar_recusas(rejeicoes)
+            return rejeicoes
+
+        totais = {}
+        with voto_etapa_segundos.medir("contagem"):
+            for chapa_id, quantidade in aceitos_por_chapa.items():
+                totais[chapa_id] = await _incrementar_contagem(db, chapa_id, quantidade)
+            await somar_minutos(db, por_minuto)
+        with voto_etapa_segundos.medir("commit"):
+            await db.commit()
     except IntegrityError as e:
         await db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Erro ao votar. Detalhes: {str(e)}",
+        raise _erro_voto(e)
+
+    with voto_etapa_segundos.medir("ledger"):
+        ledger.registrar(aceitos)
+    votos_gravados_total.inc(quantidade=len(aceitos))
+    _contar_recusas(rejeicoes)
+    indice_votos.registrar_votos(
+        [(eleicao_da_chapa[chapa_id], matricula) for matricula, chapa_id, _ in aceitos] + ja_votaram
+    )
+    for chapa_id, eleicao_id in eleicao_da_chapa.items():
+        indice_votos.registrar_chapa(chapa_id, eleicao_id)
+    for chapa_id, total_chapa in totais.items():
+        transmissor.notificar(eleicao_da_chapa[chapa_id], chapa_id, total_chapa)
+    return rejeicoes
+
+
+def _contar_recusas(rejeicoes):
+    for rejeicao in rejeicoes:
+        if rejeicao:
+            votos_recusados_total.inc(rejeicao.status_code)
+
+
+async def _motivo_rejeicao(novo_voto:VotoCreate, db:AsyncSession) -> tuple[HTTPException, Optional[int]]:
+    # só roda quando o voto foi recusado, para escolher a mensagem; retorna também a eleição da chapa
+    chapa_result = await db.execute(
+        select(Chapa.eleicao_id, Eleicao.encerrada_em)
+        .join(Eleicao, Eleicao.eleicao_id == Chapa.eleicao_id)
+        .where(Chapa.chapa_id == novo_voto.chapa_id)
+    )
+    chapa = chapa_result.first()
+    if chapa is None:
+        return HTTPException(status_code=404, detail="Chapa não existe"), None
+    eleicao_id, encerrada_em = chapa
+    if encerrada_em is not None:
+        return HTTPException(status_code=403, detail="Eleição encerrada"), eleicao_id
+    voto_result = await db.execute(
+        select(Voto.matricula).where(Voto.eleicao_id == eleicao_id, Voto.matricula == novo_voto.matricula)
+    )
+    if voto_result.first():
+        return HTTPException(status_code=409, detail="Você já votou!"), eleicao_id
+    if EXIGIR_ELEITOR:
+        eleitor_result = await db.execute(select(Eleitor.matricula).where(Eleitor.matricula == novo_voto.matricula))
+        if not eleitor_result.first():
+            return HTTPException(status_code=403, detail="Matrícula não está apta a votar"), eleicao_id
+    return HTTPException(status_code=404, detail="Chapa não existe"), eleicao_id
+
+
+def _erro_voto(e:IntegrityError) -> HTTPException:
+    # traduz a violação de constraint para as mensagens de antes
+    mensagem = str(e.orig).lower()
+    if "foreign key" in mensagem:
+        return HTTPException(status_code=404, detail="Chapa não existe")
+    if "unique" in mensagem or "duplicate key" in mensagem:
+        return HTTPException(status_code=409, detail="Você já votou!")
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Erro ao votar. Detalhes: {str(e)}",
+    )
+
+
+async def _incrementar_contagem(db:AsyncSession, chapa_id:int, quantidade:int = 1) -> int:
+    # roda dentro da transação do voto, então contagem e voto são gravados juntos
+    result = await db.execute(_INCREMENTAR_CONTAGEM, {"b_chapa_id": chapa_id, "b_quantidade": quantidade})
+    total = result.scalar()
+    if total is None:
+        result = await db.execute(_CRIAR_CONTAGEM, {"b_chapa_id": chapa_id, "b_quantidade": quantidade})
+        total = result.scalar()
+    return total
+
+
+async def listar_contagens(db:AsyncSession, eleicao_id:Optional[int] = None):
+    # outer join para que chapas sem votos também apareçam; sem eleicao_id, todas as chapas
+    consulta = (
+        select(Chapa.chapa_id, Chapa.chapa_nome, func.coalesce(ContagemChapa.total_votos, 0))
+        .outerjoin(ContagemChapa, ContagemChapa.chapa_id == Chapa.chapa_id)
+        .order_by(Chapa.chapa_id)
+    )
+    if eleicao_id is not None:
+        consulta = consulta.where(Chapa.eleicao_id == eleicao_id)
+    result = await db.execute(consulta)
+    return result.all()
+
+
+async def reconciliar_contagem(db:AsyncSession):
+    # reconstrói ContagemChapa do zero a partir da tabela Voto.
+    # SERIALIZABLE: no PostgreSQL um voto gravado entre o DELETE e o INSERT ficaria fora da contagem
+    await db.connection(execution_options={"isolation_level": "SERIALIZABLE"})
+    await db.execute(delete(ContagemChapa))
+    await db.execute(
+        insert(ContagemChapa).from_select(
+            ["chapa_id", "total_votos"],
+            select(Chapa.chapa_id, func.count(Voto.matricula))
+            # eleicao_id no join: a contagem de cada chapa usa o índice (eleicao_id, chapa_id)
+            .outerjoin(Voto, (Voto.eleicao_id == Chapa.eleicao_id) & (Voto.chapa_id == Chapa.chapa_id))
+            .group_by(Chapa.chapa_id)
         )
-    return {"message":"Voto cadastrado com sucesso"}
-    
+    )
+    await db.run_sync(lambda sessao: reconstruir_minutos(sessao.connection()))
+    await db.commit()
+    return await listar_contagens(db)
+
+
+# executemany com RETURNING (insertmanyvalues do SQLAlchemy): junta as linhas em poucos
+# INSERTs multi-VALUES e diz quais entraram, igual no SQLite e no PostgreSQL
+_INSERT_ELEITOR = (
+    insert_dialeto(Eleitor.__table__)
+    .on_conflict_do_nothing(index_elements=[Eleitor.__table__.c.matricula])
+    .returning(Eleitor.__table__.c.matricula)
+)
+
+
+def _validar_eleitor(matricula:str, cpf:str, nome:str) -> Optional[str]:
+    if not matricula:
+        return "matrícula vazia"
+    if len(matricula) > 100:
+        return "matrícula muito longa"
+    if not nome:
+        return "nome vazio"
+    if len(cpf) != 11 or cpf == cpf[0] * 11:
+        return "CPF inválido"
+    for tamanho in (9, 10):
+        soma = sum(int(digito) * peso for digito, peso in zip(cpf, range(tamanho + 1, 1, -1)))
+        if (soma * 10 % 11) % 10 != int(cpf[tamanho]):
+            return "CPF inválido"
+    return None
+
+
+async def importar_eleitores(arquivo:UploadFile, user:User, db:AsyncSession):
+    if not user:
+        raise HTTPException(status_code=401,detail="Usuário não autorizado")
+
+    relatorio = {
+        "importados": 0,
+        "ja_cadastrados": 0,
+        "duplicados_planilha": 0,
+        "invalidos": 0,
+        "detalhes": [],  # primeiras linhas recusadas, com o motivo
+    }
+
+    def recusar(linha, matricula, motivo):
+        if len(relatorio["detalhes"]) < MAX_DETALHES_IMPORTACAO:
+            relatorio["detalhes"].append({"linha": linha, "matricula": matricula, "motivo": motivo})
+
+    # leitura da planilha (pandas) fora do event loop, um bloco por vez;
+    # cada bloco vira um único executemany e tudo entra num só commit
+    blocos = ler_eleitores(arquivo, IMPORTACAO_BLOCO)
+    vistos = set()
+    importados = []
+    try:
+        while (bloco := await run_in_threadpool(next, blocos, None)) is not None:
+            validos = []
+            for linha, matricula, cpf, nome in bloco:
+                motivo = _validar_eleitor(matricula, cpf, nome)
+                if motivo:
+                    relatorio["invalidos"] += 1
+                    recusar(linha, matricula, motivo)
+                elif matricula in vistos:
+                    relatorio["duplicados_planilha"] += 1
+                    recusar(linha, matricula, "matrícula repetida na planilha")
+                else:
+                    vistos.add(matricula)
+                    validos.append({"matricula": matricula, "cpf": cpf, "nome": nome})
+            if validos:
+                importados.extend(eleitor["matricula"] for eleitor in validos)
+                inseridos = len((await db.execute(_INSERT_ELEITOR, validos)).all())
+                relatorio["importados"] += inseridos
+                relatorio["ja_cadastrados"] += len(validos) - inseridos
+        await incrementar_versao(db, "eleitores")
+        await db.commit()
+    except ValueError as e:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportError as e:
+        # openpyxl (.xlsx) / xlrd (.xls) ausentes: a planilha é válida, falta o leitor no servidor
+        await db.rollback()
+        raise HTTPException(status_code=501, detail=f"Leitura de planilha indisponível no servidor: {e}")
+    indice_votos.registrar_eleitores(importados)
+    return relatorio
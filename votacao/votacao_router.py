@@ -1,21 +1,35 @@
-from fastapi import APIRouter, Request, Depends, Form, HTTPException,status
-from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
+from fastapi import APIRouter, Request, Depends, Form, Body, HTTPException, UploadFile, File, status
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse, FileResponse, Response
+from starlette.background import BackgroundTask
 from starlette.status import HTTP_303_SEE_OTHER, HTTP_400_BAD_REQUEST
 from sqlalchemy.ext.asyncio import AsyncSession 
-from sqlalchemy.future import select
-from sqlalchemy import func
-from fastapi.templating import Jinja2Templates
-import pandas as pd
-import io
+import os
+import asyncio
+import hashlib
+from typing import Optional
 
-from database import get_db
+from database import get_db, AsyncSessionLocal
 from auth.dependencies import get_current_active_user
-from models import User,Chapa,Voto
-from schemas import ChapaCreate,VotoCreate
-from .votacao_handler import cadastrar_chapa,votar_chapa
+from models import User
+from schemas import ChapaCreate,VotoCreate,VotosResposta,EleicaoCreate
+from .votacao_handler import cadastrar_chapa,votar_chapa,votar_lote,listar_contagens,importar_eleitores,EXIGIR_ELEITOR
+from .votacao_handler import criar_eleicao,encerrar_eleicao,listar_eleicoes
+from .transmissao import transmissor
+from .fila_votos import fila_votos
+from .indice_votos import indice_votos
+from .cache_chapas import cache_chapas
+from .cache_eleicoes import cache_eleicoes
+from .arquivamento import arquivar_eleicao, ArquivamentoIndisponivel
+from .coordenacao import incrementar_versao
+from .exportacao import exportar_csv, gerar_xlsx
+from .participacao import participacao, INTERVALOS
+from metricas import render_segundos
+from assets import templates, versao_assets
+from .replicacao import alteracoes, ler_posicao, replicador, MODO_REPLICA, REPLICACAO_TOKEN, REPLICACAO_LOTE
+from backup import fazer_backup, agendador_backup, BackupIndisponivel, BACKUP_DIR
+from limitacao import limite_votos_usuario
 
 router = APIRouter()
-templates = Jinja2Templates(directory="templates")
 
 # Página de cadastro de chapa
 @router.get("/cadastrar-chapa", response_class=HTMLResponse)
@@ -40,6 +54,7 @@ async def cadastrar_chapa_page(
 async def cadastrar_chapa_action(
     request: Request,
     chapa_nome: str = Form(...),
+    eleicao_id: Optional[int] = Form(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  # Garante que só usuário autenticado acesse
 ):
@@ -47,7 +62,7 @@ async def cadastrar_chapa_action(
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
     try:
         # Cria objeto de schema
-        nova_chapa = ChapaCreate(chapa_nome=chapa_nome)
+        nova_chapa = ChapaCreate(chapa_nome=chapa_nome, eleicao_id=eleicao_id)
         
         # Chama a função que faz a lógica de cadastro
         await cadastrar_chapa(nova_chapa, current_user, db)
@@ -65,30 +80,49 @@ async def cadastrar_chapa_action(
             status_code=303
         )
 
+def _etag_confere(if_none_match: str, etag: str) -> bool:
+    # lista separada por vírgulas; cada tag é comparada inteira, não como substring
+    return any(tag.strip() in (etag, "*") for tag in if_none_match.split(","))
+
+
 # Página de votação
 @router.get("/votar", response_class=HTMLResponse)
 async def votar_page(
     request: Request,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    eleicao: Optional[int] = None,
     error: str = None,
     message: str = None,
 ):
     if not current_user or not current_user.is_active:
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
-    # Carrega as chapas para exibir no select
-    result = await db.execute(select(Chapa))
-    chapas = result.scalars().all()
+    # Eleição e chapas vêm dos caches (só vão ao banco depois de uma mudança)
+    eleicao = await cache_eleicoes.resolver(db, eleicao)
+    opcoes_chapas, digest = await cache_chapas.obter(db, eleicao.eleicao_id)
 
-    return templates.TemplateResponse(
-        "votar.html",
-        {
-            "request": request,
-            "chapas": chapas,
-            "error_message": error,
-            "success_message": message
-        }
-    )
+    # o terminal recarrega esta página após cada voto: se nada mudou, responde 304 sem corpo.
+    # Entra tudo o que a página mostra: chapas, eleição (encerrada ou não), links dos assets e mensagens
+    pagina = hashlib.sha1(
+        f"{eleicao.nome}\0{eleicao.encerrada_em}\0{versao_assets()}\0{error}\0{message}".encode()
+    ).hexdigest()[:8]
+    etag = f'W/"{digest}-{pagina}"'
+    cabecalhos = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_confere(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=cabecalhos)
+
+    with render_segundos.medir("votar.html"):
+        return templates.TemplateResponse(
+            "votar.html",
+            {
+                "request": request,
+                "opcoes_chapas": opcoes_chapas,
+                "eleicao": eleicao,
+                "error_message": error,
+                "success_message": message
+            },
+            headers=cabecalhos
+        )
 
 
 @router.post("/votar", response_class=HTMLResponse)
@@ -96,123 +130,274 @@ async def votar_action(
     request: Request,
     matricula: str = Form(...),
     chapa_id: int = Form(...),
+    eleicao: Optional[int] = Form(None),
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     if not current_user or not current_user.is_active:
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
+    # a eleição do voto é a da chapa; o campo só mantém o terminal na mesma cédula
+    cedula = f"&eleicao={eleicao}" if eleicao else ""
     try:
+        # dentro do try: o 429 volta para a página como os outros erros, não como JSON
+        limite_votos_usuario.exigir(current_user.username)
         novo_voto = VotoCreate(matricula=matricula, chapa_id=chapa_id)
-        await votar_chapa(novo_voto, current_user, db)
+        if fila_votos.ativa:
+            # group commit: responde só depois do commit do lote
+            await fila_votos.enviar(novo_voto)
+        else:
+            await votar_chapa(novo_voto, current_user, db)
 
         return RedirectResponse(
-            url=f"/eleicao/votar?message=Voto%20registrado%20com%20sucesso",
+            url=f"/eleicao/votar?message=Voto%20registrado%20com%20sucesso{cedula}",
             status_code=303
         )
 
     except HTTPException as e:
         return RedirectResponse(
-            url=f"/eleicao/votar?error={e.detail}",
+            url=f"/eleicao/votar?error={e.detail}{cedula}",
             status_code=303
         )
 
+# API JSON: um voto ou uma lista (terminal que ficou offline envia a fila de uma vez)
+@router.post("/api/votos", response_model=VotosResposta)
+async def votar_api(
+    votos: VotoCreate | list[VotoCreate] = Body(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    if isinstance(votos, VotoCreate):
+        votos = [votos]
+    # cada voto do lote gasta uma ficha: um lote não fura o limite por mesário
+    limite_votos_usuario.exigir(current_user.username, custo=len(votos))
+    return await votar_lote(votos, current_user, db)
+
+@router.post("/importar-eleitores")
+async def importar_eleitores_action(
+    arquivo: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    # planilha .csv, .xls ou .xlsx com as colunas Matrícula, CPF e Nome
+    return await importar_eleitores(arquivo, current_user, db)
+
+# eleições: cada uma com as suas chapas e votos; encerrada não aceita mais votos
+@router.get("/eleicoes")
+async def eleicoes_listar(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    return await listar_eleicoes(db)
+
+@router.post("/eleicoes", status_code=201)
+async def eleicoes_criar(
+    nova_eleicao: EleicaoCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    return await criar_eleicao(nova_eleicao, current_user, db)
+
+@router.post("/eleicoes/{eleicao_id}/encerrar")
+async def eleicoes_encerrar(
+    eleicao_id: int,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    return await encerrar_eleicao(eleicao_id, current_user, db)
+
+@router.post("/eleicoes/{eleicao_id}/arquivar")
+async def eleicoes_arquivar(eleicao_id: int, current_user: User = Depends(get_current_active_user)):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    # move chapas e votos da eleição encerrada para ARQUIVO_DIR (ver arquivamento.py)
+    try:
+        return await arquivar_eleicao(eleicao_id)
+    except ArquivamentoIndisponivel as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/indice")
+async def indice_stats(current_user: User = Depends(get_current_active_user)):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    return indice_votos.estatisticas()
+
+@router.post("/indice/reconstruir")
+async def indice_reconstruir(current_user: User = Depends(get_current_active_user)):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    # para quando o banco foi alterado por fora da aplicação (votos apagados, restauração etc.)
+    await indice_votos.reconstruir(exigir_eleitor=EXIGIR_ELEITOR)
+    # com vários workers, os outros processos reconstroem ao ver a versão nova
+    async with AsyncSessionLocal() as db:
+        await incrementar_versao(db, "indice")
+        await db.commit()
+    return indice_votos.estatisticas()
+
+# cópia online do banco sem parar a votação (ver backup.py)
+@router.post("/backup")
+async def backup_criar(current_user: User = Depends(get_current_active_user)):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    try:
+        return await fazer_backup()
+    except BackupIndisponivel as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/backup")
+async def backup_listar(current_user: User = Depends(get_current_active_user)):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    copias = sorted(nome for nome in os.listdir(BACKUP_DIR) if nome.endswith(".db")) if os.path.isdir(BACKUP_DIR) else []
+    return {
+        "copias": [{"arquivo": nome, "bytes": os.path.getsize(os.path.join(BACKUP_DIR, nome))} for nome in copias],
+        "ultima_automatica": agendador_backup.ultimo,
+    }
+
+# feed de alterações para as réplicas somente leitura (ver replicacao.py)
+@router.get("/replicacao/alteracoes", include_in_schema=False)
+async def replicacao_alteracoes(request: Request, desde: str = "", limite: int = REPLICACAO_LOTE):
+    # o feed leva os hashes de senha dos mesários: sem token configurado, fica desligado
+    if not REPLICACAO_TOKEN or request.headers.get("Authorization") != f"Bearer {REPLICACAO_TOKEN}":
+        raise HTTPException(status_code=403, detail="Replicação desligada ou token inválido")
+    try:
+        posicao = ler_posicao(desde)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    async with AsyncSessionLocal() as db:
+        return await alteracoes(db, posicao, min(limite, REPLICACAO_LOTE))
+
+@router.get("/replicacao/status")
+async def replicacao_status(current_user: User = Depends(get_current_active_user)):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    if MODO_REPLICA:
+        return replicador.estatisticas()
+    return {"modo": "primario", "feed_ligado": bool(REPLICACAO_TOKEN)}
+
 @router.get("/resultados", response_class=HTMLResponse)
 async def resultados_page(
     request: Request, 
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    eleicao: Optional[int] = None,
 ):
     if not current_user or not current_user.is_active:
         return RedirectResponse(url="/auth/login", status_code=status.HTTP_303_SEE_OTHER)
-    # Conta total de votos
-    total_votos_result = await db.execute(select(func.count(Voto.matricula)))
-    total_votos = total_votos_result.scalar() or 0
-
-    # Busca votos agrupados por chapa
-    votos_por_chapa_result = await db.execute(
-        select(Chapa.chapa_nome, func.count(Voto.matricula))
-        .join(Voto, Voto.chapa_id == Chapa.chapa_id)
-        .group_by(Chapa.chapa_id)
-    )
-    votos_por_chapa = votos_por_chapa_result.all()
+    eleicao = await cache_eleicoes.resolver(db, eleicao)
+    # Contagem mantida incrementalmente em ContagemChapa (O(nº de chapas da eleição))
+    contagens = await listar_contagens(db, eleicao.eleicao_id)
+    total_votos = sum(votos for _, _, votos in contagens)
 
     resultados = []
-    for chapa_nome, votos in votos_por_chapa:
+    for chapa_id, chapa_nome, votos in contagens:
         percentual = (votos / total_votos * 100) if total_votos > 0 else 0
         resultados.append({
+            "chapa_id": chapa_id,
             "chapa_nome": chapa_nome,
             "total_votos": votos,
             "percentual": round(percentual, 2)
         })
 
-    return templates.TemplateResponse(
-        "resultados.html",
-        {
-            "request": request,
-            "total_votos": total_votos,
-            "resultados": resultados
-        }
+    with render_segundos.medir("resultados.html"):
+        return templates.TemplateResponse(
+            "resultados.html",
+            {
+                "request": request,
+                "eleicao": eleicao,
+                "total_votos": total_votos,
+                "resultados": resultados
+            }
+        )
+
+@router.get("/participacao")
+async def participacao_json(
+    intervalo: str = "minuto",
+    eleicao: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    if intervalo not in INTERVALOS:
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Intervalo não suportado: use minuto ou hora")
+    eleicao = await cache_eleicoes.resolver(db, eleicao)
+    # votos por intervalo e acumulados, por chapa, a partir de VotosPorMinuto
+    return await participacao(db, intervalo, eleicao.eleicao_id)
+
+@router.get("/resultados/stream")
+async def resultados_stream(
+    request: Request,
+    eleicao: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    if not current_user or not current_user.is_active:
+        raise HTTPException(status_code=401, detail="Usuário não autorizado")
+
+    eleicao_id = (await cache_eleicoes.resolver(db, eleicao)).eleicao_id
+    # Sincroniza com o banco uma vez por conexão; depois disso só recebe deltas da eleição
+    transmissor.carregar(eleicao_id, await listar_contagens(db, eleicao_id))
+    fila = transmissor.assinar(eleicao_id)
+
+    async def eventos():
+        try:
+            yield f"data: {transmissor.snapshot(eleicao_id)}\n\n"
+            while True:
+                try:
+                    mensagem = await asyncio.wait_for(fila.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"  # mantém a conexão aberta em proxies
+                    continue
+                yield f"data: {mensagem}\n\n"
+        finally:
+            transmissor.cancelar(fila)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @router.get("/exportar-resultados")
 async def exportar_resultados(
+    formato: str = "xlsx",
+    eleicao: Optional[int] = None,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     if not current_user or not current_user.is_active:
         raise HTTPException(status_code=401, detail="Usuário não autorizado")
+    eleicao_id = (await cache_eleicoes.resolver(db, eleicao)).eleicao_id
 
-    # Busca todos os votos com informações das chapas
-    result = await db.execute(
-        select(
-            Voto.matricula,
-            Voto.horario,
-            Chapa.chapa_nome
+    # Os votos são lidos do banco em blocos (db.stream) e escritos aos poucos,
+    # sem montar a planilha inteira em memória
+    if formato == "csv":
+        return StreamingResponse(
+            exportar_csv(eleicao_id),
+            media_type="text/csv; charset=utf-8",
+            headers={
+                "Content-Disposition": f"attachment; filename=resultados_eleicao_{eleicao_id}.csv"
+            }
         )
-        .join(Chapa, Voto.chapa_id == Chapa.chapa_id)
-        .order_by(Voto.horario)
-    )
-    
-    votos = result.all()
-
-    # Cria DataFrame com os dados
-    df = pd.DataFrame(votos, columns=["Matrícula", "Horário", "Chapa"])
-
-    # Cria um buffer em memória para o arquivo Excel
-    output = io.BytesIO()
-    
-    # Usa o ExcelWriter para criar o arquivo
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Votos Detalhados', index=False)
-        
-        # Formata a planilha
-        workbook = writer.book
-        worksheet = writer.sheets['Votos Detalhados']
-        
-        # Formata o cabeçalho
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#366092',
-            'font_color': 'white',
-            'border': 1
-        })
-        
-        # Aplica formatação ao cabeçalho
-        for col_num, value in enumerate(df.columns.values):
-            worksheet.write(0, col_num, value, header_format)
-        
-        # Ajusta a largura das colunas
-        worksheet.set_column('A:A', 20)
-        worksheet.set_column('B:B', 25)
-        worksheet.set_column('C:C', 30)
+    if formato != "xlsx":
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail="Formato não suportado: use xlsx ou csv")
 
-    output.seek(0)
+    caminho = await gerar_xlsx(eleicao_id)
 
-    # Retorna o arquivo como download
-    return StreamingResponse(
-        output,
+    # Retorna o arquivo como download e apaga o temporário ao terminar
+    return FileResponse(
+        caminho,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={
-            "Content-Disposition": "attachment; filename=resultados_eleicao.xlsx"
-        }
+        filename=f"resultados_eleicao_{eleicao_id}.xlsx",
+        background=BackgroundTask(os.remove, caminho)
     )